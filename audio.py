@@ -0,0 +1,405 @@
+# -*- coding: utf-8 -*-
+
+"""
+ArithmeBricks -- sound pool
+
+Copyright (c) 2014 Jan Kaliszewski (zuo). All rights reserved.
+
+Licensed under GPL-3 (see the *LICENSE* file for details).
+
+All sound triggers go through one `SoundPool`, which:
+
+* plays each sample with one preloaded `Sound` object;
+* runs a single scheduler (one pending `Clock` event at a time,
+  instead of one event per triggered sound);
+* merges triggers of the same sample that land within a short time
+  window, and limits the number of simultaneously playing voices
+  (stopping the oldest one when another is needed);
+* mixes a sequence of overlapping sounds (such as the fanfare played
+  when a game is finished) into one output stream -- from the samples
+  decoded in memory once -- so that the audio backend has to play
+  just one sound instead of a burst of them;
+* can load the sounds lazily (see `load_lazily()`): one per frame,
+  starting after the first frame, in the order of priority -- where
+  a sound that is played before it is loaded jumps the queue (and
+  that trigger is dropped, unless the sound is ready before the
+  trigger is due); sequences are mixed in a background thread, and
+  the mixed sound is loaded on a later frame, once it is ready (see
+  `prepare_sequence()`).
+
+Mixing needs NumPy or (older Pythons') `audioop`; without any of them
+the sequence is played as separate triggers (still voice-limited).
+While the mixed sound is not ready yet, the sequence is not played at
+all -- rather than as a burst of triggers cut short by the voice limit.
+"""
+
+from __future__ import division, unicode_literals
+
+import hashlib
+import heapq
+import itertools
+import os
+import threading
+import timeit
+import wave
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+try:
+    import audioop
+except ImportError:
+    audioop = None
+
+from kivy.clock import Clock
+from kivy.core.audio import SoundLoader
+
+
+#
+# Constants
+
+MAX_SOUND_VOICES = 6
+
+# (triggers of the same sound that are due within this time, in
+# seconds, are merged into one)
+SOUND_MERGE_WINDOW = 0.05
+
+MIXED_SOUND_FILENAME_PATTERN = 'mixed-{0}.wav'
+
+# (how often, in seconds, it is checked whether the mixing threads have
+# finished -- to load their sounds)
+MIXED_SOUND_POLL_INTERVAL = 0.25
+
+
+#
+# Helper classes
+
+class SoundPool(object):
+
+    def __init__(self, symbol_to_filename, cache_dir,
+                 max_voices=MAX_SOUND_VOICES,
+                 merge_window=SOUND_MERGE_WINDOW):
+        self.symbol_to_filename = symbol_to_filename
+        self.cache_dir = cache_dir
+        self.max_voices = max_voices
+        self.merge_window = merge_window
+        self._symbol_to_voice = {
+            symbol: _Voice(filename)
+            for symbol, filename in symbol_to_filename.items()}
+        self._load_queue = []
+        self._samples = {}        # (decoded lazily, when mixing)
+        self._samples_lock = threading.Lock()
+        self._mixed_sounds = {}   # (key -> _Voice or None if impossible)
+        self._mixing_threads = {}
+        self._pending = []        # (heap of triggers)
+        self._trigger_counter = itertools.count()
+        self._scheduled_time = None
+        self._voices = []         # (playing sounds, the oldest first)
+
+    def load(self):
+        # (all sounds at once)
+        for voice in self._symbol_to_voice.values():
+            voice.load()
+
+    def load_lazily(self, priority_symbols=()):
+        # (the sounds for `priority_symbols` first, then the rest)
+        priority_symbols = [symbol for symbol in priority_symbols
+                            if symbol in self._symbol_to_voice]
+        self._load_queue = priority_symbols + sorted(
+            set(self._symbol_to_voice).difference(priority_symbols))
+        Clock.schedule_once(self._load_next, 0)
+
+    @property
+    def loaded(self):
+        return all(voice.loaded for voice in self._symbol_to_voice.values())
+
+    def play(self, symbol, delay=0, volume=1.0):
+        voice = self._symbol_to_voice.get(symbol)
+        if voice is not None:
+            if not voice.loaded:
+                self._demand(symbol)
+            self._add_trigger(voice, _timer() + delay, volume)
+
+    def play_sequence(self, symbols, delay=0, interval=0.1, volume=1.0):
+        # (the sounds start `interval` seconds one after another; only
+        # an already loaded mixed sound is played -- if it is not ready
+        # yet, the sequence is skipped, see `prepare_sequence()`)
+        symbols = list(symbols)
+        key = (tuple(symbols), interval, volume)
+        if key not in self._mixed_sounds:
+            self.prepare_sequence(symbols, interval, volume)
+            return
+        voice = self._mixed_sounds[key]
+        if voice is None:
+            # (mixing is impossible)
+            for i, symbol in enumerate(symbols):
+                self.play(symbol, delay + i * interval, volume)
+        elif voice.loaded:
+            self._add_trigger(voice, _timer() + delay, 1.0)
+
+    def prepare_sequence(self, symbols, interval=0.1, volume=1.0):
+        # (start mixing in the background; the mixed sound is loaded on
+        # a later frame, after the mixing is finished -- so that it is
+        # ready when `play_sequence()` is called with the same args)
+        key = (tuple(symbols), interval, volume)
+        if key in self._mixed_sounds or key in self._mixing_threads:
+            return
+        filename = self._get_mixed_filename(*key)
+        thread = self._mixing_threads[key] = threading.Thread(
+            target=self._make_mixed_file,
+            args=(filename,) + key,
+            name='SoundMixer')
+        thread.daemon = True
+        thread.start()
+        Clock.schedule_once(self._load_mixed_sounds,
+                            MIXED_SOUND_POLL_INTERVAL)
+
+    def stop(self):
+        Clock.unschedule(self._load_next)
+        Clock.unschedule(self._load_mixed_sounds)
+        del self._load_queue[:]
+        Clock.unschedule(self._dispatch)
+        self._scheduled_time = None
+        del self._pending[:]
+        for voice in self._voices:
+            voice.stop()
+        del self._voices[:]
+
+    # loading
+
+    def _load_next(self, dt):
+        # (one sound per frame)
+        queue = self._load_queue
+        while queue:
+            voice = self._symbol_to_voice[queue.pop(0)]
+            if not voice.loaded:
+                voice.load()
+                break
+        if queue:
+            Clock.schedule_once(self._load_next, 0)
+
+    def _load_mixed_sounds(self, dt):
+        # (one sound per frame, when its mixing thread has finished)
+        for key, thread in list(self._mixing_threads.items()):
+            if not thread.is_alive():
+                del self._mixing_threads[key]
+                voice = None
+                filename = self._get_mixed_filename(*key)
+                if os.path.exists(filename):
+                    voice = _Voice(filename)
+                    voice.load()
+                self._mixed_sounds[key] = voice
+                break
+        if self._mixing_threads:
+            Clock.schedule_once(self._load_mixed_sounds,
+                                MIXED_SOUND_POLL_INTERVAL)
+
+    def _demand(self, symbol):
+        queue = self._load_queue
+        if symbol in queue:
+            queue.remove(symbol)
+        elif not queue:
+            Clock.schedule_once(self._load_next, 0)
+        queue.insert(0, symbol)
+
+    # scheduling
+
+    def _add_trigger(self, voice, due_time, volume):
+        for i, (other_time, _, other_voice, other_volume) in enumerate(
+                self._pending):
+            if (other_voice is voice and
+                  abs(other_time - due_time) <= self.merge_window):
+                if volume > other_volume:
+                    self._pending[i] = self._pending[i][:3] + (volume,)
+                return
+        heapq.heappush(self._pending, (due_time,
+                                       next(self._trigger_counter),
+                                       voice,
+                                       volume))
+        self._reschedule()
+
+    def _reschedule(self):
+        if not self._pending:
+            return
+        due_time = self._pending[0][0]
+        if self._scheduled_time is not None:
+            if self._scheduled_time <= due_time:
+                return
+            Clock.unschedule(self._dispatch)
+        self._scheduled_time = due_time
+        Clock.schedule_once(self._dispatch, max(0, due_time - _timer()))
+
+    def _dispatch(self, dt):
+        self._scheduled_time = None
+        now = _timer()
+        pending = self._pending
+        while pending and pending[0][0] <= now + self.merge_window:
+            _, _, voice, volume = heapq.heappop(pending)
+            self._start_voice(voice, volume, now)
+        self._reschedule()
+
+    def _start_voice(self, voice, volume, now):
+        if not voice.loaded:
+            # (degrading gracefully: the sound is not ready, so it is
+            # not played this time)
+            return
+        voices = self._voices
+        voices[:] = [playing for playing in voices
+                     if playing is not voice and playing.end_time > now]
+        while len(voices) >= self.max_voices:
+            voices.pop(0).stop()
+        voice.play(volume, now)
+        voices.append(voice)
+
+    # mixing
+
+    def _get_mixed_filename(self, symbols, interval, volume):
+        digest = hashlib.md5(repr((symbols, interval, volume))
+                             .encode('utf-8')).hexdigest()[:16]
+        return os.path.join(self.cache_dir,
+                            MIXED_SOUND_FILENAME_PATTERN.format(digest))
+
+    def _make_mixed_file(self, filename, symbols, interval, volume):
+        # (called in a background thread; if the mixing is impossible,
+        # the file is not created)
+        if os.path.exists(filename):
+            return
+        samples = [self._get_sample(symbol) for symbol in symbols]
+        if not samples or None in samples:
+            return
+        params = samples[0].params
+        if any(sample.params[:3] != params[:3] for sample in samples):
+            return
+        frame_rate = params[2]
+        tracks = [(sample.frames, int(round(i * interval * frame_rate)))
+                  for i, sample in enumerate(samples)]
+        frames = mix_frames(params, tracks, volume)
+        if frames is None:
+            return
+        temp_filename = filename + '.tmp'
+        try:
+            write_wav(temp_filename, params, frames)
+            os.rename(temp_filename, filename)
+        except (IOError, OSError, wave.Error):
+            pass
+
+    def _get_sample(self, symbol):
+        with self._samples_lock:
+            if symbol not in self._samples:
+                filename = self.symbol_to_filename.get(symbol)
+                try:
+                    self._samples[symbol] = (_Sample.read(filename)
+                                             if filename is not None
+                                             else None)
+                except (IOError, OSError, EOFError, wave.Error):
+                    self._samples[symbol] = None
+            return self._samples[symbol]
+
+
+class _Sample(object):
+
+    # Decoded PCM frames of a WAV file.
+
+    __slots__ = ('params', 'frames')
+
+    def __init__(self, params, frames):
+        self.params = params
+        self.frames = frames
+
+    @classmethod
+    def read(cls, filename):
+        wav = wave.open(filename, 'rb')
+        try:
+            params = wav.getparams()
+            return cls(tuple(params)[:4], wav.readframes(wav.getnframes()))
+        finally:
+            wav.close()
+
+
+class _Voice(object):
+
+    # A sound (loaded on demand) with its duration known.
+
+    def __init__(self, filename):
+        self.filename = filename
+        self.sound = None
+        self.loaded = False
+        self.duration = 0
+        self.end_time = 0
+
+    def load(self):
+        # (if the sound cannot be loaded, it is just never played)
+        self.loaded = True
+        sound = self.sound = SoundLoader.load(self.filename)
+        if sound is None:
+            return
+        self.duration = sound.length
+        if not self.duration:
+            try:
+                wav = wave.open(self.filename, 'rb')
+                try:
+                    self.duration = wav.getnframes() / wav.getframerate()
+                finally:
+                    wav.close()
+            except (IOError, OSError, EOFError, wave.Error):
+                pass
+
+    def play(self, volume, now):
+        if self.sound is not None:
+            self.sound.volume = volume
+            self.sound.stop()
+            self.sound.play()
+            self.end_time = now + self.duration
+
+    def stop(self):
+        if self.sound is not None:
+            self.sound.stop()
+        self.end_time = 0
+
+
+#
+# Helper functions
+
+def mix_frames(params, tracks, volume):
+    # -> PCM frames being the sum of the `tracks` (pairs: frames, offset
+    #    in frames) scaled by `volume`, or None if the format or the lack
+    #    of NumPy/audioop makes mixing impossible
+    channels, sample_width = params[:2]
+    frame_size = channels * sample_width
+    length = max(offset * frame_size + len(frames)
+                 for frames, offset in tracks)
+    if numpy is not None and sample_width == 2:
+        mixed = numpy.zeros(length // 2, dtype=numpy.float32)
+        for frames, offset in tracks:
+            samples = numpy.frombuffer(frames, dtype='<i2')
+            start = offset * channels
+            mixed[start:start + len(samples)] += samples
+        mixed *= volume
+        numpy.clip(mixed, -32768, 32767, out=mixed)
+        return mixed.astype('<i2').tobytes()
+    if audioop is not None:
+        mixed = b'\0' * length
+        for frames, offset in tracks:
+            track = (b'\0' * (offset * frame_size) +
+                     audioop.mul(frames, sample_width, volume))
+            track += b'\0' * (length - len(track))
+            mixed = audioop.add(mixed, track, sample_width)
+        return mixed
+    return None
+
+
+def write_wav(filename, params, frames):
+    channels, sample_width, frame_rate = params[:3]
+    wav = wave.open(filename, 'wb')
+    try:
+        wav.setnchannels(channels)
+        wav.setsampwidth(sample_width)
+        wav.setframerate(frame_rate)
+        wav.writeframes(frames)
+    finally:
+        wav.close()
+
+
+_timer = timeit.default_timer
@@ -0,0 +1,228 @@
+# -*- coding: utf-8 -*-
+
+"""
+ArithmeBricks -- puzzle generation benchmark (no Kivy needed)
+
+Copyright (c) 2014 Jan Kaliszewski (zuo). All rights reserved.
+
+Licensed under GPL-3 (see the *LICENSE* file for details).
+
+Runs SymbolGenerator for N puzzles per difficulty level (with fixed
+seeds) and reports, as JSON, the throughput, latency percentiles and
+the number of generation attempts per accepted puzzle, as well as how
+many puzzles hit the generation budget.  The exit status is non-zero
+if, for any level, the p99.9 latency exceeds the limit
+(`engine.MAX_PUZZLE_SECONDS`, by default), or more than a small
+fraction of the puzzles were taken unchecked because the budget was
+used up -- or, if a previous report is given as the baseline, if any
+level got significantly slower.
+
+Note that, with a budget, the latency is cut off by it, so the p99.9
+limit is meaningful mostly for ``--budget-ms 0`` -- while the share of
+the puzzles over the budget shows how often the cut-off is needed.
+"""
+
+from __future__ import division, unicode_literals
+
+import argparse
+import json
+import platform
+import random
+import sys
+import timeit
+
+from engine import (
+    DEFAULT_GENERATION_BUDGET,
+    DIFFICULTY_LEVEL_LIMITS,
+    FAILED_EQUALITY_REASONS,
+    MAX_PUZZLE_SECONDS,
+    PUZZLE_REJECTION_REASONS,
+    SymbolGenerator,
+)
+
+
+#
+# Constants
+
+DEFAULT_PUZZLES_PER_LEVEL = 1000
+DEFAULT_SEED = 12345
+DEFAULT_MAX_SLOWDOWN = 1.25
+
+# (the maximum acceptable fraction of puzzles taken as they were because
+# the generation budget was used up)
+DEFAULT_MAX_OVER_BUDGET = 0.001
+
+REPORT_PERCENTILES = (50, 95, 99, 99.9)
+LIMITED_PERCENTILE = 'p99.9'
+
+
+#
+# Helper functions
+
+def percentile(sorted_values, percent):
+    # (the nearest-rank method)
+    if not sorted_values:
+        return None
+    rank = max(1, int(-(-percent * len(sorted_values) // 100)))
+    return sorted_values[rank - 1]
+
+
+def benchmark_level(level, limits, count, seed,
+                    budget=DEFAULT_GENERATION_BUDGET):
+    random.seed('{0}:{1}'.format(seed, level))
+    symbol_generator = SymbolGenerator(budget=budget)
+    timer = timeit.default_timer
+    latencies = []
+    start_time = timer()
+    for i in range(count):
+        t0 = timer()
+        symbol_generator(limits)
+        latencies.append(timer() - t0)
+    total_time = timer() - start_time
+    latencies.sort()
+    latency_ms = {
+        'p{0}'.format(percent): 1000 * percentile(latencies, percent)
+        for percent in REPORT_PERCENTILES}
+    latency_ms['max'] = 1000 * latencies[-1]
+    counts = symbol_generator.stats.get_level(limits).counts
+    candidates = counts['puzzles'] + sum(
+        counts[reason] for reason in PUZZLE_REJECTION_REASONS)
+    failed_equalities = sum(
+        counts[reason] for reason in FAILED_EQUALITY_REASONS)
+    return dict(
+        level=level,
+        limits=limits,
+        puzzles=count,
+        total_seconds=total_time,
+        puzzles_per_second=count / total_time if total_time else None,
+        latency_ms=latency_ms,
+        attempts_per_puzzle=candidates / count,
+        failed_equalities_per_puzzle=failed_equalities / count,
+        over_budget=counts['over_budget'],
+        generator_stats=symbol_generator.stats.get_level(limits).as_dict(),
+    )
+
+
+def run_benchmark(levels, count, seed, budget=DEFAULT_GENERATION_BUDGET):
+    return dict(
+        seed=seed,
+        puzzles_per_level=count,
+        budget_seconds=budget,
+        python=platform.python_version(),
+        levels=[benchmark_level(level,
+                                DIFFICULTY_LEVEL_LIMITS[level - 1],
+                                count,
+                                seed,
+                                budget)
+                for level in levels],
+    )
+
+
+def find_regressions(report, baseline, max_slowdown):
+    baseline_levels = {entry['level']: entry for entry in baseline['levels']}
+    for entry in report['levels']:
+        old = baseline_levels.get(entry['level'])
+        if old is None or old['limits'] != entry['limits']:
+            continue
+        for key in ('p50', 'p99'):
+            old_value = old['latency_ms'][key]
+            new_value = entry['latency_ms'][key]
+            if new_value > max_slowdown * old_value:
+                yield ('level {0}: {1} latency {2:.3f} ms -> {3:.3f} ms'
+                       .format(entry['level'], key, old_value, new_value))
+        # (unlike timings, attempt counts do not depend on machine
+        # load -- the seeds are fixed -- so they are compared too)
+        old_value = old['attempts_per_puzzle']
+        new_value = entry['attempts_per_puzzle']
+        if new_value > max_slowdown * old_value:
+            yield ('level {0}: attempts per puzzle {1:.3f} -> {2:.3f}'
+                   .format(entry['level'], old_value, new_value))
+
+
+def find_over_limit(report, max_ms):
+    for entry in report['levels']:
+        value = entry['latency_ms'].get(LIMITED_PERCENTILE)
+        if value is not None and value > max_ms:
+            yield ('level {0}: {1} latency {2:.3f} ms > {3:.3f} ms'
+                   .format(entry['level'], LIMITED_PERCENTILE,
+                           value, max_ms))
+
+
+def find_over_budget(report, max_fraction):
+    for entry in report['levels']:
+        fraction = entry['over_budget'] / entry['puzzles']
+        if fraction > max_fraction:
+            yield ('level {0}: {1} of {2} puzzles over budget '
+                   '({3:.2%} > {4:.2%})'.format(entry['level'],
+                                                entry['over_budget'],
+                                                entry['puzzles'],
+                                                fraction, max_fraction))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description='Benchmark ArithmeBricks puzzle generation.')
+    parser.add_argument(
+        '-n', '--count', type=int, default=DEFAULT_PUZZLES_PER_LEVEL,
+        help='number of puzzles per level (default: %(default)s)')
+    parser.add_argument(
+        '-s', '--seed', type=int, default=DEFAULT_SEED,
+        help='base random seed (default: %(default)s)')
+    parser.add_argument(
+        '-l', '--level', type=int, action='append', dest='levels',
+        choices=range(1, len(DIFFICULTY_LEVEL_LIMITS) + 1),
+        metavar='LEVEL',
+        help='level to benchmark (can be repeated; default: all levels)')
+    parser.add_argument(
+        '-o', '--output',
+        help='file to write the JSON report to (default: stdout)')
+    parser.add_argument(
+        '-b', '--baseline',
+        help='JSON report of a previous run to compare with')
+    parser.add_argument(
+        '--max-slowdown', type=float, default=DEFAULT_MAX_SLOWDOWN,
+        help=('maximum acceptable ratio of latencies and attempt '
+              'counts to the baseline ones (default: %(default)s)'))
+    parser.add_argument(
+        '--max-ms', type=float, default=1000 * MAX_PUZZLE_SECONDS,
+        help=('upper limit on the p99.9 latency of generating a puzzle, '
+              'in milliseconds (default: %(default)s)'))
+    parser.add_argument(
+        '--budget-ms', type=float,
+        default=1000 * DEFAULT_GENERATION_BUDGET,
+        help=('generation budget per puzzle, in milliseconds; 0 means '
+              'no budget (default: %(default)s)'))
+    parser.add_argument(
+        '--max-over-budget', type=float, default=DEFAULT_MAX_OVER_BUDGET,
+        help=('maximum acceptable fraction of puzzles that used up the '
+              'budget (default: %(default)s)'))
+    args = parser.parse_args(argv)
+    levels = args.levels or range(1, len(DIFFICULTY_LEVEL_LIMITS) + 1)
+    budget = args.budget_ms / 1000 if args.budget_ms > 0 else None
+    report = run_benchmark(levels, args.count, args.seed, budget)
+    report_json = json.dumps(report, indent=2, sort_keys=True)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(report_json + '\n')
+    else:
+        sys.stdout.write(report_json + '\n')
+    over_limit = list(find_over_limit(report, args.max_ms))
+    for msg in over_limit:
+        sys.stderr.write('OVER LIMIT: ' + msg + '\n')
+    over_budget = list(find_over_budget(report, args.max_over_budget))
+    for msg in over_budget:
+        sys.stderr.write('OVER BUDGET: ' + msg + '\n')
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        regressions = list(find_regressions(report, baseline,
+                                            args.max_slowdown))
+        for msg in regressions:
+            sys.stderr.write('REGRESSION: ' + msg + '\n')
+        if regressions:
+            return 1
+    return 1 if over_limit or over_budget else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,290 @@
+# -*- coding: utf-8 -*-
+
+"""
+ArithmeBricks -- board geometry bookkeeping (no Kivy dependency)
+
+Copyright (c) 2014 Jan Kaliszewski (zuo). All rights reserved.
+
+Licensed under GPL-3 (see the *LICENSE* file for details).
+"""
+
+from __future__ import division, unicode_literals
+
+import collections
+import math
+import random
+
+from expressions import is_equality
+
+
+#
+# Constants
+
+# (preferred slot size, relative to the item size -- so that
+# there are some gaps between items if there is enough room)
+SLOT_SPACING = 1.3
+
+
+#
+# Helper classes
+
+class SpatialGrid(object):
+
+    # A uniform grid of cells, each holding the items whose reference
+    # points lie within it -- so that the items near a given point can
+    # be found without scanning all of them.  Items are updated
+    # incrementally, as they move.
+
+    def __init__(self, cell_width=1, cell_height=1):
+        self._cells = collections.defaultdict(set)
+        self._item_to_cell = {}
+        self._item_to_point = {}
+        self.cell_width = self.cell_height = None
+        self.set_cell_size(cell_width, cell_height)
+
+    def __len__(self):
+        return len(self._item_to_cell)
+
+    def __contains__(self, item):
+        return item in self._item_to_cell
+
+    def __iter__(self):
+        return iter(list(self._item_to_cell))
+
+    def set_cell_size(self, cell_width, cell_height):
+        cell_width = max(cell_width, 1)
+        cell_height = max(cell_height, 1)
+        if (cell_width, cell_height) != (self.cell_width, self.cell_height):
+            self.cell_width = cell_width
+            self.cell_height = cell_height
+            self._cells.clear()
+            self._item_to_cell.clear()
+            for item, (x, y) in self._item_to_point.items():
+                self._put(item, x, y)
+
+    def move(self, item, x, y):
+        # (also used to insert new items)
+        self._item_to_point[item] = (x, y)
+        cell = self._get_cell(x, y)
+        old_cell = self._item_to_cell.get(item)
+        if cell != old_cell:
+            if old_cell is not None:
+                self._discard_from_cell(item, old_cell)
+            self._put(item, x, y, cell)
+
+    def remove(self, item):
+        cell = self._item_to_cell.pop(item, None)
+        if cell is not None:
+            self._discard_from_cell(item, cell)
+            del self._item_to_point[item]
+
+    def clear(self):
+        self._cells.clear()
+        self._item_to_cell.clear()
+        self._item_to_point.clear()
+
+    def iter_near(self, x, y, x_radius, y_radius):
+        # yield the items whose reference points *may* lie within the
+        # given distances from (x, y) -- i.e., all the items from the
+        # cells overlapping that rectangle (the caller is supposed to
+        # check exact distances)
+        min_col, min_row = self._get_cell(x - x_radius, y - y_radius)
+        max_col, max_row = self._get_cell(x + x_radius, y + y_radius)
+        cells = self._cells
+        for col in range(min_col, max_col + 1):
+            for row in range(min_row, max_row + 1):
+                cell = (col, row)
+                if cell in cells:
+                    for item in cells[cell]:
+                        yield item
+
+    def get_point(self, item):
+        return self._item_to_point[item]
+
+    def _get_cell(self, x, y):
+        return (int(math.floor(x / self.cell_width)),
+                int(math.floor(y / self.cell_height)))
+
+    def _put(self, item, x, y, cell=None):
+        if cell is None:
+            cell = self._get_cell(x, y)
+        self._cells[cell].add(item)
+        self._item_to_cell[item] = cell
+
+    def _discard_from_cell(self, item, cell):
+        items = self._cells[cell]
+        items.discard(item)
+        if not items:
+            del self._cells[cell]
+
+
+class SlotLayout(object):
+
+    # Positions for items (bricks) of the given size, covering the given
+    # area with a grid of slots -- each at least as large as an item --
+    # in a random order; every position is jittered within its slot, so
+    # items placed in different slots never overlap.  Building the
+    # layout is linear in the number of slots and taking a position is
+    # O(1).
+
+    def __init__(self, x, y, width, height, item_width, item_height,
+                 min_count=0, spacing=SLOT_SPACING):
+        cols, rows = self._get_grid_size(width, height,
+                                         item_width, item_height,
+                                         min_count, spacing)
+        self.capacity = cols * rows
+        slot_width = width / cols if cols else 0
+        slot_height = height / rows if rows else 0
+        self._free_positions = [
+            (x + col * slot_width +
+                 random.uniform(0, slot_width - item_width),
+             y + row * slot_height +
+                 random.uniform(0, slot_height - item_height))
+            for col in range(cols)
+            for row in range(rows)]
+        random.shuffle(self._free_positions)
+
+    def __len__(self):
+        return len(self._free_positions)
+
+    def take(self):
+        # -> (x, y) or None if there are no free slots
+        if self._free_positions:
+            return self._free_positions.pop()
+        return None
+
+    @staticmethod
+    def _get_grid_size(width, height, item_width, item_height,
+                       min_count, spacing):
+        if item_width <= 0 or item_height <= 0:
+            return 0, 0
+        max_cols = int(width // item_width)
+        max_rows = int(height // item_height)
+        # (use the preferred spacing unless it makes too few slots)
+        cols = min(max_cols, int(width // (item_width * spacing)))
+        rows = min(max_rows, int(height // (item_height * spacing)))
+        while cols * rows < min_count and (cols < max_cols or
+                                           rows < max_rows):
+            if rows < max_rows and (rows <= cols or cols >= max_cols):
+                rows += 1
+            else:
+                cols += 1
+        return cols, rows
+
+
+class BrickChain(object):
+
+    # A maximal sequence of attached bricks, with the sequence of their
+    # symbols and the result of the equality check cached.
+
+    __slots__ = ('bricks', 'symbols', 'is_equal')
+
+    def __init__(self, bricks, symbols):
+        self.bricks = bricks
+        self.symbols = symbols
+        self.is_equal = len(symbols) >= 3 and is_equality(symbols)
+
+    def __len__(self):
+        return len(self.bricks)
+
+    def __repr__(self):
+        return '<{0} {1!r}>'.format(self.__class__.__name__,
+                                    ''.join(self.symbols))
+
+
+class ChainModel(object):
+
+    # Keeps track of the chains of attached bricks -- updating them
+    # incrementally when a brick is attached or detached (no recursive
+    # re-collection, no re-evaluation of untouched chains) -- as well
+    # as of the number of bricks that belong to equal chains, so that
+    # checking whether *all* bricks form equalities is O(1).
+
+    def __init__(self):
+        self._brick_to_chain = {}
+        self.equal_brick_count = 0
+
+    def __len__(self):
+        return len(self._brick_to_chain)
+
+    def __contains__(self, brick):
+        return brick in self._brick_to_chain
+
+    @property
+    def all_equal(self):
+        return 0 < len(self._brick_to_chain) == self.equal_brick_count
+
+    def get_chain(self, brick):
+        return self._brick_to_chain[brick]
+
+    def iter_chains(self):
+        seen_ids = set()
+        for chain in self._brick_to_chain.values():
+            if id(chain) not in seen_ids:
+                seen_ids.add(id(chain))
+                yield chain
+
+    def add(self, brick):
+        self._set_chain(BrickChain([brick], (brick.symbol,)))
+
+    def remove(self, brick):
+        self.detach(brick)
+        self._unset_chain(self._brick_to_chain.pop(brick))
+
+    def clear(self):
+        self._brick_to_chain.clear()
+        self.equal_brick_count = 0
+
+    def attach(self, brick, left_brick=None, right_brick=None):
+        # (`brick` must be a lone one; `left_brick` must be the last
+        # one of its chain, `right_brick` -- the first one of its chain)
+        chain = self._brick_to_chain[brick]
+        assert len(chain) == 1
+        bricks = [brick]
+        symbols = chain.symbols
+        self._unset_chain(chain)
+        if left_brick is not None:
+            left_chain = self._brick_to_chain[left_brick]
+            assert left_chain.bricks[-1] is left_brick
+            self._unset_chain(left_chain)
+            bricks = left_chain.bricks + bricks
+            symbols = left_chain.symbols + symbols
+        if right_brick is not None:
+            right_chain = self._brick_to_chain[right_brick]
+            assert right_chain.bricks[0] is right_brick
+            self._unset_chain(right_chain)
+            bricks = bricks + right_chain.bricks
+            symbols = symbols + right_chain.symbols
+        new_chain = BrickChain(bricks, symbols)
+        self._set_chain(new_chain)
+        return new_chain
+
+    def detach(self, brick):
+        # -> list of the chains that remain on the left and on the
+        #    right of the detached brick (if any)
+        chain = self._brick_to_chain[brick]
+        if len(chain) == 1:
+            return []
+        i = chain.bricks.index(brick)
+        self._unset_chain(chain)
+        self._set_chain(BrickChain([brick], (chain.symbols[i],)))
+        remaining_chains = []
+        for bricks, symbols in ((chain.bricks[:i], chain.symbols[:i]),
+                                (chain.bricks[i+1:], chain.symbols[i+1:])):
+            if bricks:
+                remaining_chain = BrickChain(bricks, symbols)
+                self._set_chain(remaining_chain)
+                remaining_chains.append(remaining_chain)
+        return remaining_chains
+
+    def _set_chain(self, chain):
+        brick_to_chain = self._brick_to_chain
+        for brick in chain.bricks:
+            brick_to_chain[brick] = chain
+        if chain.is_equal:
+            self.equal_brick_count += len(chain)
+
+    def _unset_chain(self, chain):
+        # (the bricks are to be assigned to other chains by the caller)
+        if chain.is_equal:
+            self.equal_brick_count -= len(chain)
@@ -0,0 +1,952 @@
+# -*- coding: utf-8 -*-
+
+"""
+ArithmeBricks -- the core game engine (no Kivy dependency)
+
+Copyright (c) 2014 Jan Kaliszewski (zuo). All rights reserved.
+
+Licensed under GPL-3 (see the *LICENSE* file for details).
+"""
+
+from __future__ import division, unicode_literals
+
+import bisect
+import collections
+import json
+import random
+import timeit
+
+from expressions import is_equality
+
+
+#
+# Constants
+
+# (all symbols bricks can bear, in a fixed order
+# that is relied upon by some compact encodings)
+SYMBOLS = tuple('0123456789') + ('+', '-', '*', '/', '==')
+
+# (a symbol multiset -- e.g., a puzzle regardless of the order of its
+# symbols -- can be packed into one integer, with a fixed-width bit field
+# holding the count of each symbol, in the `SYMBOLS` order)
+SYMBOL_COUNT_BITS = 8
+MAX_SYMBOL_COUNT = (1 << SYMBOL_COUNT_BITS) - 1
+PACKED_SYMBOLS_BYTES = (len(SYMBOLS) * SYMBOL_COUNT_BITS + 7) // 8
+
+DIFFICULTY_LEVEL_LIMITS = [
+    dict(
+        equalities=1,
+        ops='+',
+        min_number=1,
+        max_number=4,
+        max_total_number=8,
+        max_symbols_per_equality=6,
+    ),
+    dict(
+        equalities=1,
+        ops='-',
+        min_number=1,
+        max_number=8,
+        max_total_number=8,
+        max_symbols_per_equality=6,
+    ),
+    dict(
+        equalities=1,
+        ops='+-',
+        min_number=0,
+        max_number=8,
+        max_total_number=10,
+        max_symbols_per_equality=7,
+    ),
+    dict(
+        equalities=1,
+        ops='*',
+        min_number=0,
+        max_number=4,
+        max_total_number=9,
+        max_symbols_per_equality=6,
+    ),
+    dict(
+        equalities=1,
+        ops='/',
+        min_number=0,
+        max_number=9,
+        max_total_number=9,
+        max_symbols_per_equality=6,
+    ),
+    dict(
+        equalities=1,
+        ops='+-*',
+        min_number=2,
+        max_number=10,
+        max_total_number=12,
+        max_symbols_per_equality=8,
+    ),
+    dict(
+        equalities=1,
+        ops='+-/',
+        min_number=0,
+        max_number=10,
+        max_total_number=12,
+        max_symbols_per_equality=9,
+    ),
+    dict(
+        equalities=1,
+        ops='+-*/',
+        min_number=0,
+        max_number=10,
+        max_total_number=12,
+        max_symbols_per_equality=10,
+    ),
+    dict(
+        equalities=1,
+        ops='+-*/',
+        min_number=0,
+        max_number=10,
+        max_total_number=20,
+        max_symbols_per_equality=11,
+    ),
+    dict(
+        equalities=1,
+        ops='+-*/',
+        min_number=0,
+        max_number=10,
+        max_total_number=50,
+        max_symbols_per_equality=12,
+    ),
+    dict(
+        equalities=1,
+        ops='+-*/',
+        min_number=0,
+        max_number=10,
+        max_total_number=100,
+        max_symbols_per_equality=13,
+    ),
+    dict(
+        equalities=2,
+        ops='+-*/',
+        min_number=0,
+        max_number=10,
+        max_total_number=40,
+        max_symbols_per_equality=8,
+    ),
+    dict(
+        equalities=2,
+        ops='+-*/',
+        min_number=0,
+        max_number=30,
+        max_total_number=100,
+        max_symbols_per_equality=9,
+    ),
+    dict(
+        equalities=3,
+        ops='+-*/',
+        min_number=0,
+        max_number=40,
+        max_total_number=1000,
+        max_symbols_per_equality=10,
+    ),
+    dict(
+        equalities=3,
+        ops='+-*/',
+        min_number=0,
+        max_number=50,
+        max_total_number=5000,
+        max_symbols_per_equality=12,
+    ),
+    # (large boards -- for tournaments)
+    dict(
+        equalities=10,
+        ops='+-*/',
+        min_number=0,
+        max_number=20,
+        max_total_number=200,
+        max_symbols_per_equality=10,
+    ),
+    dict(
+        equalities=20,
+        ops='+-*/',
+        min_number=0,
+        max_number=30,
+        max_total_number=500,
+        max_symbols_per_equality=11,
+    ),
+    dict(
+        equalities=30,
+        ops='+-*/',
+        min_number=0,
+        max_number=50,
+        max_total_number=1000,
+        max_symbols_per_equality=12,
+    ),
+]
+
+# (puzzles with at least that many equalities are generated equality
+# by equality -- see `SymbolGenerator.generate_large_board_symbols()`)
+LARGE_BOARD_MIN_EQUALITIES = 10
+
+MAX_RETRY = 40
+MAX_EQUALITY_ATTEMPTS = MAX_RETRY * MAX_RETRY
+
+# (the upper limit on the time of generating one puzzle -- for any
+# level, the largest boards included; checked, as the p99.9 latency,
+# by `benchmark.py`)
+MAX_PUZZLE_SECONDS = 0.1
+
+# (the default time budget of generating one puzzle, in seconds: when
+# it is used up, the candidate at hand is taken even if it is not quite
+# as wanted -- too easy or repeated too soon; the limit above leaves
+# room for finishing that candidate)
+DEFAULT_GENERATION_BUDGET = 0.05
+
+# (...and the maximum number of candidates, whatever time they take)
+MAX_PUZZLE_ATTEMPTS = MAX_RETRY * MAX_RETRY
+
+MUL_DIV_OPS = ('*', '/')
+
+# how many times, at most, an operand containing '0' is redrawn
+ZERO_AVOIDING_DRAWS = 4
+
+MIN_REPEATING_SYMBOL_COMBINATION_INTERVAL = 4
+
+# (names of reasons why the generator's work can be thrown away)
+FAILED_EQUALITY_REASONS = (
+    'left_number_too_long',
+    'no_left_side_operand',
+    'right_number_too_long',
+    'no_right_side_split',
+)
+PUZZLE_REJECTION_REASONS = (
+    'too_easy',
+    'repeated_too_soon',
+)
+
+
+#
+# Helper classes
+
+class LevelStats(object):
+
+    # Counters and timers of the generator's work for one level.
+    # `seconds` are *exclusive*, e.g. the time of a candidate puzzle
+    # rejected as too easy does not include the time of the failed
+    # equality attempts made while generating that candidate (these
+    # are accounted under their own reasons).
+
+    def __init__(self, level, limits):
+        self.level = level
+        self.limits = limits
+        self.counts = collections.Counter()
+        self.seconds = collections.Counter()
+        self.wasted_seconds = 0.0
+        self._last_puzzle_seconds = 0.0
+
+    def start(self):
+        return _timer(), self.wasted_seconds
+
+    def record_waste(self, reason, token):
+        seconds = self._own_seconds(token)
+        self.counts[reason] += 1
+        self.seconds[reason] += seconds
+        self.wasted_seconds += seconds
+
+    def record_puzzle(self, token):
+        seconds = self._last_puzzle_seconds = self._own_seconds(token)
+        self.counts['puzzles'] += 1
+        self.seconds['puzzles'] += seconds
+
+    def record_over_budget(self):
+        # (the most recently recorded puzzle was taken as it was, as the
+        # time or attempt budget was used up)
+        self.counts['over_budget'] += 1
+
+    def discard_puzzle(self, reason):
+        # the most recently recorded puzzle turned out to be unwanted
+        seconds = self._last_puzzle_seconds
+        self.counts['puzzles'] -= 1
+        self.seconds['puzzles'] -= seconds
+        self.counts[reason] += 1
+        self.seconds[reason] += seconds
+        self.wasted_seconds += seconds
+
+    def _own_seconds(self, token):
+        start_time, wasted_before = token
+        return _timer() - start_time - (self.wasted_seconds - wasted_before)
+
+    def as_dict(self):
+        total_seconds = sum(self.seconds.values())
+        return dict(
+            level=self.level,
+            limits=self.limits,
+            counts=dict(self.counts),
+            seconds=dict(self.seconds),
+            total_seconds=total_seconds,
+            wasted_fraction=(self.wasted_seconds / total_seconds
+                             if total_seconds else 0.0),
+        )
+
+
+class GeneratorStats(object):
+
+    def __init__(self):
+        self._levels = {}
+
+    def get_level(self, limits):
+        key = tuple(sorted(limits.items()))
+        level_stats = self._levels.get(key)
+        if level_stats is None:
+            level = (DIFFICULTY_LEVEL_LIMITS.index(limits) + 1
+                     if limits in DIFFICULTY_LEVEL_LIMITS else None)
+            level_stats = self._levels[key] = LevelStats(level, limits)
+        return level_stats
+
+    def reset(self):
+        self._levels.clear()
+
+    def update(self, other):
+        # add the numbers from another GeneratorStats instance
+        for other_level_stats in list(other._levels.values()):
+            level_stats = self.get_level(other_level_stats.limits)
+            level_stats.counts.update(other_level_stats.counts)
+            level_stats.seconds.update(other_level_stats.seconds)
+            level_stats.wasted_seconds += other_level_stats.wasted_seconds
+
+    def as_list(self):
+        return sorted(
+            (level_stats.as_dict() for level_stats in self._levels.values()),
+            key=lambda d: (d['level'] is None, d['level']))
+
+    def dump(self, filename):
+        with open(filename, 'w') as f:
+            json.dump(self.as_list(), f, indent=2, sort_keys=True)
+
+
+class SymbolGenerator(object):
+
+    class _FailedToMakeEquality(Exception):
+        pass
+
+    def __init__(self, puzzle_history=None,
+                 budget=DEFAULT_GENERATION_BUDGET):
+        self.recent_symbol_combinations = collections.deque(
+            maxlen=MIN_REPEATING_SYMBOL_COMBINATION_INTERVAL)
+        # (optional long-horizon memory of dealt puzzles, such as
+        # `history.PuzzleHistory` -- anything that supports `in` and
+        # `add()` for packed symbol multisets, see `pack_symbols()`)
+        self.puzzle_history = puzzle_history
+        # (time budget per puzzle, in seconds; None -- no time limit)
+        self.budget = budget
+        # (whether the budget was used up when the latest puzzle was
+        # generated -- so that it was taken as it was)
+        self.over_budget = False
+        self.stats = GeneratorStats()
+        self._limits_key_to_operand_tables = {}
+
+    def __call__(self, limits, deadline=None):
+        if deadline is None:
+            deadline = self.get_deadline()
+        history_hits = 0
+        while True:
+            generated_symbols = self.generate_puzzle(limits, deadline)
+            # (after so many history hits in a row, during this deal, we
+            # must assume that all combinations the level can give have
+            # been seen)
+            repetition = self._check_repetition(
+                generated_symbols,
+                check_history=history_hits < MAX_RETRY)
+            if repetition is None:
+                return iter(generated_symbols)
+            if repetition == 'history':
+                history_hits += 1
+            if _timer() >= deadline:
+                if not self.over_budget:
+                    self._note_over_budget()
+                return iter(generated_symbols)
+            self._level_stats.discard_puzzle('repeated_too_soon')
+
+    def get_deadline(self):
+        if self.budget is None:
+            return float('inf')
+        return _timer() + self.budget
+
+    def generate_puzzle(self, limits, deadline=None):
+        # (without checking whether the combination repeats too soon --
+        # useful when puzzles are generated in advance, e.g. for a bank)
+        if deadline is None:
+            deadline = self.get_deadline()
+        vars(self).update(limits)
+        level_stats = self._level_stats = self.stats.get_level(limits)
+        self.operand_tables = self.get_operand_tables(limits)
+        self.over_budget = False
+        if is_large_board(limits):
+            token = level_stats.start()
+            generated_symbols = self.generate_large_board_symbols(deadline)
+            level_stats.record_puzzle(token)
+            if self.over_budget:
+                level_stats.record_over_budget()
+            return generated_symbols
+        attempts = 0
+        while True:
+            token = level_stats.start()
+            generated_symbols = self.generate_symbols()
+            attempts += 1
+            if not self.are_too_easy(generated_symbols):
+                break
+            if attempts >= MAX_PUZZLE_ATTEMPTS or _timer() >= deadline:
+                self.over_budget = True
+                break
+            level_stats.record_waste('too_easy', token)
+        level_stats.record_puzzle(token)
+        if self.over_budget:
+            level_stats.record_over_budget()
+        return generated_symbols
+
+    def get_operand_tables(self, limits):
+        # (built once per level)
+        key = tuple(sorted(limits.items()))
+        tables = self._limits_key_to_operand_tables.get(key)
+        if tables is None:
+            tables = self._limits_key_to_operand_tables[key] = (
+                OperandTables(limits))
+        return tables
+
+    def generate_puzzles(self, limits, count):
+        # -> iterator of `count` puzzles (as from `generate_puzzle()`;
+        # see also `batchgen.BatchSymbolGenerator`)
+        for i in range(count):
+            yield self.generate_puzzle(limits)
+
+    def generate_symbols(self):
+        # (steered towards what `are_too_easy()` accepts: the last
+        # equality is made long enough for the puzzle not to be too
+        # short and, if there is no '*' or '/' yet, with one of them
+        # preferred)
+        symbols = []
+        for i in range(self.equalities):
+            if i < self.equalities - 1:
+                symbols.extend(self.make_equality())
+            else:
+                symbols.extend(self.make_equality(
+                    min_symbols=(self.max_symbols_per_equality - 3 -
+                                 len(symbols)),
+                    prefer_mul_div=self._lacks_mul_div(symbols)))
+        return symbols
+
+    def generate_large_board_symbols(self, deadline):
+        # the `are_too_easy()` rules are applied to each equality
+        # separately (applied to the whole puzzle, they would reject
+        # nearly any puzzle of that size), and the number of attempts
+        # per equality is limited (if all are rejected, the last one
+        # is taken anyway; after the deadline -- the first one) -- so
+        # that the time of generating a puzzle grows just linearly with
+        # the number of equalities
+        symbols = []
+        for i in range(self.equalities):
+            for attempt in range(MAX_RETRY):
+                token = self._level_stats.start()
+                equality = self.make_equality(
+                    min_symbols=self.max_symbols_per_equality - 3,
+                    prefer_mul_div=self._lacks_mul_div(()))
+                if not self.are_too_easy(equality, equalities=1):
+                    break
+                if _timer() >= deadline:
+                    self.over_budget = True
+                    break
+                self._level_stats.record_waste('too_easy', token)
+            symbols.extend(equality)
+        return symbols
+
+    def _lacks_mul_div(self, symbols):
+        return (any(op in self.ops for op in MUL_DIV_OPS) and
+                not any(op in symbols for op in MUL_DIV_OPS))
+
+    def _note_over_budget(self):
+        self.over_budget = True
+        self._level_stats.record_over_budget()
+
+    def make_equality(self, min_symbols=0, prefer_mul_div=False):
+        max_num_digits = len(str(self.max_number))
+        for i in range(MAX_EQUALITY_ATTEMPTS):
+            # (a left side needs at least 3 symbols)
+            left_max_symbols = random.randint(
+                  max(3, self.max_symbols_per_equality // 3),
+                  self.max_symbols_per_equality - 2)
+            right_max_symbols = (
+                  self.max_symbols_per_equality -
+                  left_max_symbols -
+                  1)
+            token = self._level_stats.start()
+            try:
+                # (the right side cannot be longer than its maximum, so
+                # the left one must make up for the rest of the minimum,
+                # and its value must fit in the right side)
+                equality, total_num = self.make_left_side(
+                    left_max_symbols, max_num_digits,
+                    min_symbols=min_symbols - 1 - right_max_symbols,
+                    max_total_number=_max_number_of_digits(
+                        right_max_symbols),
+                    prefer_mul_div=prefer_mul_div)
+                equality.append('==')
+                equality.extend(self.make_right_side(
+                    total_num, right_max_symbols, max_num_digits,
+                    min_symbols=min_symbols - len(equality),
+                    prefer_mul_div=(prefer_mul_div and
+                                    self._lacks_mul_div(equality))))
+            except self._FailedToMakeEquality as exc:
+                self._level_stats.record_waste(exc.args[0], token)
+                continue
+            assert is_equality(equality)
+            return equality
+        raise RuntimeError('cannot make an equality within the limits: '
+                           '{0!r}'.format(self._level_stats.limits))
+
+    def are_too_easy(self, generated_symbols, equalities=None):
+        # (`equalities` -- the number of equalities the symbols make,
+        # if other than the level's one)
+        if equalities is None:
+            equalities = self.equalities
+
+        # eliminate symbol combinations that include too few symbols
+        if len(generated_symbols) < self.max_symbols_per_equality - 3:
+            return True
+
+        ones = generated_symbols.count('1')
+
+        # eliminate boring symbol combinations that include too many '1'
+        if ones > max(2, len(generated_symbols) / (3 + equalities)):
+            return True
+
+        # when there are few symbols: often (but not always)
+        # eliminate lone multiplications/divisions by 1
+        if ones and len(generated_symbols) <= 5:
+            symbol_set = set(generated_symbols)
+            if ((random.randint(1, 8) < 8 and
+                   len(symbol_set.difference(('==', '*', '1'))) == 1) or
+                (random.randint(1, 3) < 3 and
+                   len(symbol_set.difference(('==', '/', '1'))) == 1)):
+                return True
+
+        muls_and_divs = (generated_symbols.count('*') +
+                         generated_symbols.count('/'))
+
+        # eliminate symbol combinations that include neither
+        # '*' nor '/' when any of that operators is available
+        if ('*' in self.ops or '/' in self.ops) and not muls_and_divs:
+            return True
+
+        # eliminate symbol combinations that are too easy because
+        # of possibility of tricks involving '0' combined with '*'
+        # or '/' and arbitrary digits (such as '2=2+0*17346348')
+        zeros = generated_symbols.count('0')
+        if not zeros:
+            return False
+        if not muls_and_divs:
+            return False
+        assert zeros > 0 and muls_and_divs
+        if zeros == 1 and not ('+' in generated_symbols or
+                               '-' in generated_symbols):
+            return False
+        if ((zeros == 1 or muls_and_divs == 1) and
+              equalities == 1 and
+              random.randint(1, 5) == 5):
+            # sometimes we are lenient :) (but never on harder levels)
+            return False
+        return True
+
+    def repeated_too_soon(self, generated_symbols):
+        # (if not, the combination is remembered as dealt; note: any
+        # combination found in the history is rejected here -- e.g.,
+        # when puzzles from the bank or the prefetch queue are probed)
+        return self._check_repetition(generated_symbols) is not None
+
+    def _check_repetition(self, generated_symbols, check_history=True):
+        # -> None (then the combination is remembered as dealt), or
+        #    where it was found: 'recent' or 'history'
+        symbol_combination = pack_symbols(generated_symbols)
+        if symbol_combination in self.recent_symbol_combinations:
+            return 'recent'
+        history = self.puzzle_history
+        if history is not None:
+            if check_history and symbol_combination in history:
+                return 'history'
+            history.add(symbol_combination)
+        self.recent_symbol_combinations.append(symbol_combination)
+        return None
+
+    def make_left_side(self, cur_max_symbols, max_num_digits,
+                       min_symbols=0, max_total_number=None,
+                       prefer_mul_div=False):
+        # (`max_total_number` -- if lower than the level's one -- applies
+        # to the value of the left side after each step)
+        if max_total_number is None:
+            max_total_number = self.max_total_number
+        max_total_number = min(max_total_number, self.max_total_number)
+        max_num = min(self.max_number,
+                      max_total_number,
+                      _max_number_of_digits(cur_max_symbols - 2))
+        if max_num < self.min_number:
+            raise self._FailedToMakeEquality('left_number_too_long')
+        num = self._draw_operand([(self.min_number, max_num)])
+        symbols = list(str(num))
+        # (the value of the left side is kept track of step by step: it
+        # is `base + sign * term` where `term` is the value of the last
+        # term -- the one the next '*' or '/' would apply to; the loop
+        # ends at the latest when no operand fits in `cur_max_symbols`)
+        base = 0
+        sign = 1
+        total_num = term = num
+        while True:
+            max_by_length = _max_number_of_digits(
+                cur_max_symbols - len(symbols) - 1)
+            stop_above = (cur_max_symbols -
+                          max_num_digits -
+                          random.randint(1, (self.equalities +
+                                             max_num_digits -
+                                             1)))
+            # (if wanted, '*' and '/' are preferred -- until one of
+            # them is used -- at every other step, on average, and
+            # always at the step that will surely be the last one)
+            preferred_ops = ()
+            if prefer_mul_div and self._lacks_mul_div(symbols):
+                if (len(symbols) + 2 > stop_above and
+                      len(symbols) + 2 >= min_symbols):
+                    preferred_ops = MUL_DIV_OPS
+                elif random.randint(0, 1):
+                    preferred_ops = MUL_DIV_OPS
+            op, num = self._draw_operation(
+                lambda op: self._get_left_side_candidates(
+                    op, total_num, base, sign, term, max_by_length,
+                    max_total_number),
+                preferred_ops)
+            if op is None:
+                raise self._FailedToMakeEquality('no_left_side_operand')
+            if op == '+':
+                base, sign, term = total_num, 1, num
+            elif op == '-':
+                base, sign, term = total_num, -1, num
+            elif op == '*':
+                term *= num
+            else:
+                assert term % num == 0
+                term //= num
+            total_num = base + sign * term
+            assert self.min_number <= total_num <= max_total_number
+            symbols.append(op)
+            symbols.extend(str(num))
+            if len(symbols) > stop_above and len(symbols) >= min_symbols:
+                break
+        return symbols, total_num
+
+    def make_right_side(self, total_num, cur_max_symbols, max_num_digits,
+                        min_symbols=0, prefer_mul_div=False):
+        assert total_num <= self.max_total_number
+        symbols = list(str(total_num))
+        if len(symbols) > cur_max_symbols:
+            raise self._FailedToMakeEquality('right_number_too_long')
+        if len(symbols) > (cur_max_symbols -
+                           max_num_digits -
+                           1):
+            if len(symbols) < min_symbols:
+                raise self._FailedToMakeEquality('no_right_side_split')
+            return symbols
+        op, num2 = self._draw_operation(
+            lambda op: self._get_right_side_candidates(op, total_num,
+                                                       cur_max_symbols,
+                                                       min_symbols),
+            MUL_DIV_OPS if prefer_mul_div else ())
+        if op is None:
+            raise self._FailedToMakeEquality('no_right_side_split')
+        if op == '+':
+            num1 = total_num - num2
+        elif op == '-':
+            num1 = total_num + num2
+        elif op == '*':
+            num1 = total_num // num2
+            assert num1 * num2 == total_num
+        else:
+            assert op == '/'
+            num1 = total_num * num2
+        symbols = list(str(num1))
+        symbols.append(op)
+        symbols.extend(str(num2))
+        assert (self.min_number <= num1 <= self.max_total_number and
+                self.min_number <= num2 <= self.max_number and
+                len(symbols) <= cur_max_symbols)
+        return symbols
+
+    # (candidates for an operand are given as a list of inclusive
+    # ranges -- (min, max) pairs -- and/or lone numbers, so that one
+    # can be drawn uniformly without trying any invalid ones)
+
+    def _draw_operation(self, get_candidates, preferred_ops=()):
+        # -> (operator, operand): the operator drawn from among those
+        #    for which there are any valid operands (the candidates for
+        #    each are computed only if it is drawn; the `preferred_ops`
+        #    are tried first), the operand drawn from among these; or
+        #    (None, None) if there are none at all
+        preferred = [op for op in self.ops if op in preferred_ops]
+        others = [op for op in self.ops if op not in preferred_ops]
+        for ops in (preferred, others):
+            while ops:
+                op = ops.pop(random.randrange(len(ops)))
+                candidates = get_candidates(op)
+                if _count_candidates(candidates):
+                    return op, self._draw_operand(candidates)
+        return None, None
+
+    def _draw_operand(self, candidates):
+        # (if '*' or '/' as well as '+' or '-' are available, operands
+        # containing '0' -- which would make `are_too_easy()` reject
+        # the equality -- are redrawn, a few times at most)
+        ops = set(self.ops)
+        avoid_zeros = bool(ops & set(MUL_DIV_OPS)) and bool(ops & set('+-'))
+        for _ in range(ZERO_AVOIDING_DRAWS):
+            num = _draw_candidate(candidates)
+            if not (avoid_zeros and '0' in str(num)):
+                break
+        return num
+
+    def _get_left_side_candidates(self, op, total_num, base, sign, term,
+                                  max_by_length, max_total_number):
+        if op == '+':
+            return [(self.min_number,
+                     min(self.max_number,
+                         max_total_number - total_num,
+                         max_by_length))]
+        elif op == '-':
+            return [(self.min_number,
+                     min(self.max_number,
+                         total_num - self.min_number,
+                         max_by_length))]
+        elif op == '*':
+            return [self._get_multiplier_range(base, sign, term,
+                                               max_by_length,
+                                               max_total_number)]
+        else:
+            assert op == '/'
+            return self._get_divisor_candidates(base, sign, term,
+                                                max_by_length,
+                                                max_total_number)
+
+    def _get_multiplier_range(self, base, sign, term, max_by_length,
+                              max_total_number):
+        # (for the left side: `term * num` -- the result being within
+        # the limits after adding it to/subtracting it from `base`)
+        min_num = self.min_number
+        if random.randint(0, 40) != 40:  # mostly avoid 0, often avoid 1...
+            min_num = max(min_num, random.randint(random.randint(1, 3), 4))
+        if term == 0:
+            return (min_num, min(self.max_number, max_by_length))
+        max_num = min(self.max_total_number // term, max_by_length)
+        if sign > 0:
+            max_num = min(max_num, (max_total_number - base) // term)
+            min_num = max(min_num, _ceil_div(self.min_number - base, term))
+        else:
+            max_num = min(max_num, (base - self.min_number) // term)
+            min_num = max(min_num, _ceil_div(base - max_total_number, term))
+        return (min_num, max_num)
+
+    def _get_divisor_candidates(self, base, sign, term, max_by_length,
+                                max_total_number):
+        # (for the left side: `term / num`, where `num` is a divisor of
+        # `term` -- the result being within the limits after adding it
+        # to/subtracting it from `base`)
+        min_num = max(1, self.min_number)
+        if random.randint(0, 40) != 40:  # mostly avoid 1
+            min_num = max(min_num, random.randint(2, 4))
+        max_num = min(term // 2 + 1, self.max_number, max_by_length)
+        if term == 0:
+            return [(min_num, max_num)]
+        return [num
+                for num in self.operand_tables.get_divisors(term,
+                                                            min_num,
+                                                            max_num)
+                if (self.min_number <=
+                      base + sign * (term // num) <=
+                      max_total_number)]
+
+    def _get_right_side_candidates(self, op, total_num, cur_max_symbols,
+                                   min_symbols=0):
+        # (for `num1 <op> num2` being equal to `total_num`: candidates
+        # for `num2`, grouped by the number of its digits -- as it
+        # limits the number of digits `num1` can have, both at most
+        # and, to make `min_symbols`, at least)
+        min_number = self.min_number
+        max_number = self.max_number
+        max_total_number = self.max_total_number
+        candidates = []
+        if op == '+':
+            for digits, low, high in _iter_digit_ranges(
+                    min_number, min(max_number, total_num - min_number)):
+                min_num1, max_num1 = self._get_num1_range(
+                    digits, cur_max_symbols, min_symbols)
+                candidates.append((max(low, total_num - max_num1),
+                                   min(high, total_num - min_num1)))
+        elif op == '-':
+            for digits, low, high in _iter_digit_ranges(
+                    min_number, min(max_number,
+                                    max_total_number - total_num)):
+                min_num1, max_num1 = self._get_num1_range(
+                    digits, cur_max_symbols, min_symbols)
+                candidates.append((max(low, min_num1 - total_num),
+                                   min(high, max_num1 - total_num)))
+        elif op == '*':
+            min_num = max(1, min_number)
+            if random.randint(0, 40) != 40:  # mostly avoid 1
+                min_num = max(min_num, random.randint(2, 4))
+            max_num = min(total_num // 2 + 1, max_number)
+            if total_num == 0:
+                divisors = range(min_num, max_num + 1)
+            else:
+                divisors = self.operand_tables.get_divisors(total_num,
+                                                            min_num,
+                                                            max_num)
+            candidates.extend(
+                num2 for num2 in divisors
+                if (min_number <= total_num // num2 and
+                      min_symbols <=
+                      len(str(total_num // num2)) + 1 + len(str(num2)) <=
+                      cur_max_symbols))
+        else:
+            assert op == '/'
+            min_num = max(1, min_number)
+            if random.randint(0, 40) != 40:  # mostly avoid 0, often 1...
+                min_num = max(min_num,
+                              random.randint(random.randint(1, 3), 4))
+            if total_num == 0:
+                # (then `num1` is 0 whatever `num2` is)
+                if min_number > 0 or cur_max_symbols < 3:
+                    return []
+                return [(max(min_num, _min_number_of_digits(
+                             min_symbols - 2)),
+                         min(max_number, _max_number_of_digits(
+                             cur_max_symbols - 2)))]
+            min_num = max(min_num, _ceil_div(min_number, total_num))
+            max_num = min(max_number, max_total_number // total_num)
+            for digits, low, high in _iter_digit_ranges(min_num, max_num):
+                min_num1, max_num1 = self._get_num1_range(
+                    digits, cur_max_symbols, min_symbols)
+                candidates.append((max(low, _ceil_div(min_num1, total_num)),
+                                   min(high, max_num1 // total_num)))
+        return candidates
+
+    @staticmethod
+    def _get_num1_range(num2_digits, cur_max_symbols, min_symbols):
+        # -> (min, max) of `num1` -- by its number of digits -- so that
+        #    `num1 <op> num2` has from `min_symbols` to `cur_max_symbols`
+        return (_min_number_of_digits(min_symbols - num2_digits - 1),
+                _max_number_of_digits(cur_max_symbols - num2_digits - 1))
+
+
+class OperandTables(object):
+
+    # Built once per level (see `SymbolGenerator.operand_tables`): the
+    # divisors of all numbers up to `max_total_number` -- made with a
+    # sieve -- so that the generator can draw a divisor from among the
+    # valid ones instead of guessing it.
+
+    def __init__(self, limits):
+        self.max_total_number = limits['max_total_number']
+        self.max_number = max_divisor = limits['max_number']
+        self._divisors = divisors = [
+            [] for _ in range(self.max_total_number + 1)]
+        for divisor in range(1, max_divisor + 1):
+            for multiple in range(divisor, self.max_total_number + 1,
+                                  divisor):
+                divisors[multiple].append(divisor)
+
+    def get_divisors(self, number, min_num, max_num):
+        # -> list of those divisors of (the positive) `number` that are
+        #    within the given range, in ascending order
+        if number <= self.max_total_number and max_num <= self.max_number:
+            divisors = self._divisors[number]
+        else:
+            divisors = [divisor
+                        for divisor in range(1, min(number, max_num) + 1)
+                        if number % divisor == 0]
+        return divisors[bisect.bisect_left(divisors, min_num):
+                        bisect.bisect_right(divisors, max_num)]
+
+
+#
+# Helper functions
+
+_SYMBOL_TO_SHIFT = {symbol: i * SYMBOL_COUNT_BITS
+                    for i, symbol in enumerate(SYMBOLS)}
+
+
+def _max_number_of_digits(digits):
+    # (-1 if no number can be written with that many digits)
+    return 10 ** digits - 1 if digits > 0 else -1
+
+
+def _min_number_of_digits(digits):
+    return 10 ** (digits - 1) if digits > 1 else 0
+
+
+def _ceil_div(a, b):
+    return -(-a // b)
+
+
+def _iter_digit_ranges(min_num, max_num):
+    # -> iterator of (number of digits, min, max) triples, splitting the
+    #    given (inclusive) range of non-negative numbers by their lengths
+    digits = len(str(min_num))
+    while min_num <= max_num:
+        high = min(max_num, 10 ** digits - 1)
+        yield digits, min_num, high
+        min_num = high + 1
+        digits += 1
+
+
+def _count_candidates(candidates):
+    return sum(
+        (max(0, candidate[1] - candidate[0] + 1)
+         if isinstance(candidate, tuple) else 1)
+        for candidate in candidates)
+
+
+def _draw_candidate(candidates):
+    # (uniformly)
+    i = random.randrange(_count_candidates(candidates))
+    for candidate in candidates:
+        if isinstance(candidate, tuple):
+            low, high = candidate
+            size = max(0, high - low + 1)
+            if i < size:
+                return low + i
+            i -= size
+        else:
+            if not i:
+                return candidate
+            i -= 1
+    raise AssertionError('candidate index out of range')
+
+
+def is_large_board(limits):
+    return limits['equalities'] >= LARGE_BOARD_MIN_EQUALITIES
+
+
+def pack_symbols(symbols):
+    # -> int being the canonical encoding of the multiset of `symbols`
+    #    (equal for any permutation of them)
+    counts = collections.Counter(symbols)
+    packed = 0
+    for symbol, count in counts.items():
+        if count > MAX_SYMBOL_COUNT:
+            raise ValueError('too many {0!r} symbols to pack them'
+                             .format(symbol))
+        packed |= count << _SYMBOL_TO_SHIFT[symbol]
+    return packed
+
+
+def unpack_symbols(packed):
+    # -> sorted (in the `SYMBOLS` order) list of symbols
+    symbols = []
+    for symbol in SYMBOLS:
+        symbols.extend([symbol] * (packed & MAX_SYMBOL_COUNT))
+        packed >>= SYMBOL_COUNT_BITS
+    return symbols
+
+
+_timer = timeit.default_timer
@@ -0,0 +1,289 @@
+# -*- coding: utf-8 -*-
+
+"""
+ArithmeBricks -- multi-core streaming puzzle export
+
+Copyright (c) 2014 Jan Kaliszewski (zuo). All rights reserved.
+
+Licensed under GPL-3 (see the *LICENSE* file for details).
+
+Generates N puzzles for each of the selected levels, using all CPU
+cores, and streams them to a file (or stdout) in one of the formats:
+
+* ``jsonl`` -- one JSON object per line: ``{"level": N, "symbols":
+  [...]}``;
+* ``binary`` -- a header: magic (4 bytes), format version (uint16);
+  then records: level (uint8), number of symbols (uint16), the
+  symbols (one byte each: an index into `engine.SYMBOLS`); all
+  integers little-endian.
+
+The work is split into chunks of puzzles of one level.  Each chunk is
+generated with its own random stream, seeded with the base seed, the
+level and the chunk number -- so the output depends on the seed only,
+not on the number of worker processes -- by a fresh `SymbolGenerator`
+called just like when the game deals a puzzle (but with no time
+budget, which would make the output depend on timing).  The chunks
+are written in order, with only a few of them kept in memory at any
+time.
+
+With ``--checkpoint FILE`` the progress is recorded after each chunk
+is written, so that an interrupted run with the same arguments
+resumes where it stopped.
+"""
+
+from __future__ import division, unicode_literals
+
+import argparse
+import io
+import json
+import multiprocessing
+import os
+import random
+import struct
+import sys
+
+from engine import DIFFICULTY_LEVEL_LIMITS, SymbolGenerator
+from puzzlebank import SYMBOL_TO_BYTE
+
+
+#
+# Constants
+
+DEFAULT_PUZZLES_PER_LEVEL = 10000
+DEFAULT_CHUNK_SIZE = 500
+DEFAULT_SEED = 12345
+
+# (how many chunks per worker can be generated ahead of the writing)
+CHUNKS_AHEAD_PER_WORKER = 2
+
+OUTPUT_FORMATS = ('jsonl', 'binary')
+
+BINARY_MAGIC = b'ABpx'
+BINARY_FORMAT_VERSION = 1
+BINARY_HEADER_STRUCT = struct.Struct(str('<4sH'))
+BINARY_RECORD_STRUCT = struct.Struct(str('<BH'))
+
+
+#
+# Helper classes
+
+class Checkpoint(object):
+
+    # The number of chunks written and the size of the output after
+    # them, together with the arguments the run was started with
+    # (resuming with other ones would mix incompatible outputs).
+
+    def __init__(self, filename, run_params):
+        self.filename = filename
+        self.run_params = run_params
+        self.chunks_done = 0
+        self.output_size = 0
+
+    def load(self):
+        # (returns false if there is nothing to resume)
+        try:
+            with open(self.filename) as f:
+                state = json.load(f)
+        except (IOError, OSError):
+            return False
+        if state['run_params'] != self.run_params:
+            raise ValueError('the checkpoint {0!r} was made by a run with '
+                             'other arguments'.format(self.filename))
+        self.chunks_done = state['chunks_done']
+        self.output_size = state['output_size']
+        return True
+
+    def save(self, chunks_done, output_size):
+        self.chunks_done = chunks_done
+        self.output_size = output_size
+        state = dict(run_params=self.run_params,
+                     chunks_done=chunks_done,
+                     output_size=output_size)
+        # (written aside and then renamed, so that an interrupted save
+        # does not spoil the previous checkpoint)
+        tmp_filename = self.filename + '.tmp'
+        with open(tmp_filename, 'w') as f:
+            json.dump(state, f, sort_keys=True)
+        _replace(tmp_filename, self.filename)
+
+
+#
+# Helper functions
+
+def iter_chunk_specs(levels, count, chunk_size, seed):
+    # -> iterator of (level, number of puzzles, chunk seed) triples
+    for level in levels:
+        for chunk, start in enumerate(range(0, count, chunk_size)):
+            yield (level,
+                   min(chunk_size, count - start),
+                   '{0}:{1}:{2}'.format(seed, level, chunk))
+
+
+def generate_chunk(chunk_spec):
+    # (in a worker process) -> (level, list of puzzles)
+    level, count, chunk_seed = chunk_spec
+    random.seed(chunk_seed)
+    limits = DIFFICULTY_LEVEL_LIMITS[level - 1]
+    symbol_generator = SymbolGenerator(budget=None)
+    return level, [list(symbol_generator(limits)) for i in range(count)]
+
+
+def encode_chunk(level, puzzles, output_format):
+    if output_format == 'jsonl':
+        return ''.join(
+            json.dumps({'level': level, 'symbols': symbols}) + '\n'
+            for symbols in puzzles).encode('utf-8')
+    assert output_format == 'binary'
+    return b''.join(
+        BINARY_RECORD_STRUCT.pack(level, len(symbols)) +
+        bytes(bytearray(SYMBOL_TO_BYTE[symbol] for symbol in symbols))
+        for symbols in puzzles)
+
+
+def encode_header(output_format):
+    if output_format == 'binary':
+        return BINARY_HEADER_STRUCT.pack(BINARY_MAGIC, BINARY_FORMAT_VERSION)
+    return b''
+
+
+def iter_generated_chunks(chunk_specs, jobs):
+    # -> iterator of the results of `generate_chunk()`, in order (at
+    #    most `jobs * CHUNKS_AHEAD_PER_WORKER` chunks being in progress
+    #    or waiting to be taken)
+    if jobs == 1:
+        for chunk_spec in chunk_specs:
+            yield generate_chunk(chunk_spec)
+        return
+    pool = multiprocessing.Pool(jobs)
+    try:
+        pending = []
+        max_pending = jobs * CHUNKS_AHEAD_PER_WORKER
+        chunk_specs = iter(chunk_specs)
+        for chunk_spec in chunk_specs:
+            pending.append(pool.apply_async(generate_chunk, (chunk_spec,)))
+            if len(pending) >= max_pending:
+                yield pending.pop(0).get()
+        while pending:
+            yield pending.pop(0).get()
+        pool.close()
+    finally:
+        pool.terminate()
+        pool.join()
+
+
+def export(output, levels, count, seed=DEFAULT_SEED,
+           output_format='jsonl', chunk_size=DEFAULT_CHUNK_SIZE,
+           jobs=None, checkpoint=None, log=None):
+    # (`output` -- a binary file object, positioned after what was
+    # written before the `checkpoint`, if any, was saved)
+    jobs = jobs or multiprocessing.cpu_count()
+    chunks_done = output_size = 0
+    if checkpoint is not None:
+        chunks_done = checkpoint.chunks_done
+        output_size = checkpoint.output_size
+    if not chunks_done:
+        header = encode_header(output_format)
+        output.write(header)
+        output_size += len(header)
+    chunk_specs = list(iter_chunk_specs(levels, count, chunk_size, seed))
+    for level, puzzles in iter_generated_chunks(chunk_specs[chunks_done:],
+                                                jobs):
+        data = encode_chunk(level, puzzles, output_format)
+        output.write(data)
+        output_size += len(data)
+        chunks_done += 1
+        if checkpoint is not None:
+            output.flush()
+            os.fsync(output.fileno())
+            checkpoint.save(chunks_done, output_size)
+        if log is not None:
+            log('chunk {0}/{1} (level {2}): {3} puzzles'.format(
+                chunks_done, len(chunk_specs), level, len(puzzles)))
+    output.flush()
+
+
+def open_output(filename, checkpoint):
+    # (with a checkpoint loaded: the output is truncated to the size
+    # recorded in it -- dropping any chunk written only partially)
+    if checkpoint is not None and checkpoint.chunks_done:
+        output = io.open(filename, 'r+b')
+        output.truncate(checkpoint.output_size)
+        output.seek(checkpoint.output_size)
+        return output
+    return io.open(filename, 'wb')
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description='Generate ArithmeBricks puzzles in bulk.')
+    parser.add_argument(
+        '-n', '--count', type=int, default=DEFAULT_PUZZLES_PER_LEVEL,
+        help='number of puzzles per level (default: %(default)s)')
+    parser.add_argument(
+        '-l', '--level', type=int, action='append', dest='levels',
+        choices=range(1, len(DIFFICULTY_LEVEL_LIMITS) + 1),
+        metavar='LEVEL',
+        help='level to generate puzzles for (can be repeated; '
+             'default: all levels)')
+    parser.add_argument(
+        '-s', '--seed', type=int, default=DEFAULT_SEED,
+        help='base random seed (default: %(default)s)')
+    parser.add_argument(
+        '-f', '--format', dest='output_format', choices=OUTPUT_FORMATS,
+        default='jsonl', help='output format (default: %(default)s)')
+    parser.add_argument(
+        '-o', '--output',
+        help='file to write the puzzles to (default: stdout)')
+    parser.add_argument(
+        '-j', '--jobs', type=int, default=None,
+        help='number of worker processes (default: number of CPUs)')
+    parser.add_argument(
+        '--chunk-size', type=int, default=DEFAULT_CHUNK_SIZE,
+        help='puzzles generated per worker task (default: %(default)s)')
+    parser.add_argument(
+        '--checkpoint',
+        help='file to record the progress in (and resume from)')
+    parser.add_argument(
+        '-q', '--quiet', action='store_true',
+        help='do not report the progress on stderr')
+    args = parser.parse_args(argv)
+    levels = args.levels or range(1, len(DIFFICULTY_LEVEL_LIMITS) + 1)
+    checkpoint = None
+    if args.checkpoint:
+        if not args.output:
+            parser.error('--checkpoint requires --output')
+        checkpoint = Checkpoint(args.checkpoint, dict(
+            levels=list(levels),
+            count=args.count,
+            seed=args.seed,
+            output_format=args.output_format,
+            chunk_size=args.chunk_size,
+            output=os.path.abspath(args.output)))
+        try:
+            checkpoint.load()
+        except ValueError as exc:
+            parser.error(str(exc))
+    def log(msg):
+        sys.stderr.write(msg + '\n')
+    if args.output:
+        output = open_output(args.output, checkpoint)
+    else:
+        output = getattr(sys.stdout, 'buffer', sys.stdout)
+    try:
+        export(output, levels, args.count,
+               seed=args.seed,
+               output_format=args.output_format,
+               chunk_size=args.chunk_size,
+               jobs=args.jobs,
+               checkpoint=checkpoint,
+               log=None if args.quiet else log)
+    finally:
+        if args.output:
+            output.close()
+
+
+_replace = getattr(os, 'replace', os.rename)  # (no `os.replace` in Py2)
+
+
+if __name__ == '__main__':
+    main()
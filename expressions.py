@@ -0,0 +1,205 @@
+# -*- coding: utf-8 -*-
+
+"""
+ArithmeBricks -- exact evaluation of brick symbol sequences
+
+Copyright (c) 2014 Jan Kaliszewski (zuo). All rights reserved.
+
+Licensed under GPL-3 (see the *LICENSE* file for details).
+
+Symbol sequences consist of the symbols bricks can bear: digits
+('0'...'9') and operators ('+', '-', '*', '/', '==').  They are
+evaluated in exact integer/rational arithmetic, following the rules
+of Python expressions (operator precedence, unary '+'/'-', chained
+'==', no leading zeros in non-zero numbers) -- but without compiling
+anything, and without floating-point round-trips.
+"""
+
+from __future__ import division, unicode_literals
+
+import collections
+import fractions
+
+
+#
+# Constants
+
+DIGITS = frozenset('0123456789')
+
+ADDITIVE_OPS = frozenset(['+', '-'])
+MULTIPLICATIVE_OPS = frozenset(['*', '/'])
+EQUALITY_OP = '=='
+
+EVALUATION_CACHE_SIZE = 4096
+
+
+#
+# Exceptions
+
+class InvalidExpression(ValueError):
+    pass
+
+
+#
+# Helper classes
+
+class LRUCache(object):
+
+    _missing = object()
+
+    def __init__(self, maxsize):
+        self.maxsize = maxsize
+        self._data = collections.OrderedDict()
+
+    def __len__(self):
+        return len(self._data)
+
+    def get(self, key, default=None):
+        data = self._data
+        value = data.pop(key, self._missing)
+        if value is self._missing:
+            return default
+        data[key] = value  # (now it is the most recently used one)
+        return value
+
+    def set(self, key, value):
+        data = self._data
+        data.pop(key, None)
+        data[key] = value
+        if len(data) > self.maxsize:
+            data.popitem(last=False)
+
+    def clear(self):
+        self._data.clear()
+
+
+_evaluation_cache = LRUCache(EVALUATION_CACHE_SIZE)
+
+
+#
+# Public functions
+
+def tokenize(symbols):
+    # numbers (as ints) and operators (as they are)
+    tokens = []
+    digits = []
+    for symbol in symbols:
+        if symbol in DIGITS:
+            digits.append(symbol)
+            continue
+        if digits:
+            tokens.append(_make_number(digits))
+            digits = []
+        if not (symbol in ADDITIVE_OPS or
+                symbol in MULTIPLICATIVE_OPS or
+                symbol == EQUALITY_OP):
+            raise InvalidExpression('unknown symbol: {0!r}'.format(symbol))
+        tokens.append(symbol)
+    if digits:
+        tokens.append(_make_number(digits))
+    return tokens
+
+
+def evaluate(symbols):
+    # evaluate an arithmetic expression (without '==')
+    sides = _evaluate_sides(tuple(symbols))
+    if sides is None:
+        raise InvalidExpression('not a valid expression')
+    if len(sides) != 1:
+        raise InvalidExpression('unexpected {0!r}'.format(EQUALITY_OP))
+    return sides[0]
+
+
+def is_equality(symbols):
+    # true if the symbols form a valid and true (possibly
+    # chained) equality, such as '2+10==15-3' or '2==4/2==1+1'
+    sides = _evaluate_sides(tuple(symbols))
+    if sides is None or len(sides) < 2:
+        return False
+    first = sides[0]
+    return all(value == first for value in sides[1:])
+
+
+def divide(dividend, divisor):
+    # exact division (resulting in an int whenever possible)
+    if divisor == 0:
+        raise ZeroDivisionError('division by zero')
+    if isinstance(dividend, int) and dividend % divisor == 0:
+        return dividend // divisor
+    result = fractions.Fraction(dividend, divisor)
+    if result.denominator == 1:
+        return result.numerator
+    return result
+
+
+#
+# Internal helpers
+
+def _make_number(digits):
+    # (the same rule as for Python 3 literals: '0', '00'... are
+    # OK but non-zero numbers must not start with '0')
+    if (len(digits) > 1 and digits[0] == '0' and
+          digits.count('0') < len(digits)):
+        raise InvalidExpression('leading zero in a number')
+    return int(''.join(digits))
+
+
+def _evaluate_sides(symbols):
+    # -> tuple of values of the '=='-separated sides
+    #    (or None if the expression is not valid)
+    sides = _evaluation_cache.get(symbols)
+    if sides is None:
+        try:
+            sides = _compute_sides(tokenize(symbols))
+        except (InvalidExpression, ZeroDivisionError):
+            sides = False
+        _evaluation_cache.set(symbols, sides)
+    return sides or None
+
+
+def _compute_sides(tokens):
+    sides = []
+    start = 0
+    for i, token in enumerate(tokens):
+        if token == EQUALITY_OP:
+            sides.append(_compute_arithmetic(tokens, start, i))
+            start = i + 1
+    sides.append(_compute_arithmetic(tokens, start, len(tokens)))
+    return tuple(sides)
+
+
+def _compute_arithmetic(tokens, start, stop):
+    total = 0
+    term = None
+    term_sign = 1
+    mul_op = None
+    i = start
+    while True:
+        # operand (possibly preceded by unary signs)
+        sign = 1
+        while i < stop and tokens[i] in ADDITIVE_OPS:
+            if tokens[i] == '-':
+                sign = -sign
+            i += 1
+        if i >= stop or not isinstance(tokens[i], int):
+            raise InvalidExpression('operand expected')
+        operand = sign * tokens[i]
+        i += 1
+        if term is None:
+            term = operand
+        elif mul_op == '*':
+            term *= operand
+        else:
+            term = divide(term, operand)
+        # binary operator (or the end)
+        if i >= stop:
+            return total + term_sign * term
+        op = tokens[i]
+        i += 1
+        if op in MULTIPLICATIVE_OPS:
+            mul_op = op
+        else:
+            total += term_sign * term
+            term = None
+            term_sign = -1 if op == '-' else 1
+
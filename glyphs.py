@@ -0,0 +1,80 @@
+# -*- coding: utf-8 -*-
+
+"""
+ArithmeBricks -- shared glyph textures for bricks
+
+Copyright (c) 2014 Jan Kaliszewski (zuo). All rights reserved.
+
+Licensed under GPL-3 (see the *LICENSE* file for details).
+
+There are only a few distinct brick texts (15 symbols and the letters
+of the title), so instead of each brick rendering its own texture,
+every glyph is rendered once per font size (and font) and the texture
+is shared by all bricks showing it -- in all games, until the size is
+changed so many times that the least recently used textures are
+dropped.
+
+The text color is not a part of the key: a (non-markup) label texture
+is rendered in white and tinted by the label's `Color` instruction.
+"""
+
+from __future__ import division, unicode_literals
+
+import collections
+
+from kivy.core.text import Label as CoreLabel
+
+
+#
+# Constants
+
+# (enough for all glyphs in several sizes)
+MAX_GLYPH_TEXTURES = 256
+
+
+#
+# Helper classes
+
+class GlyphAtlas(object):
+
+    def __init__(self, max_size=MAX_GLYPH_TEXTURES):
+        self.max_size = max_size
+        self._textures = collections.OrderedDict()
+        self.render_count = 0
+
+    def __len__(self):
+        return len(self._textures)
+
+    def get_texture(self, text, font_size, font_name, bold=False):
+        # -> Texture (or None if there is nothing to render)
+        if not text.strip():
+            return None
+        # (sub-pixel differences, e.g. during resizing, do not matter)
+        key = (text, int(round(font_size)), font_name, bool(bold))
+        textures = self._textures
+        try:
+            texture = textures.pop(key)
+        except KeyError:
+            texture = self._render(*key)
+            while len(textures) >= self.max_size:
+                textures.popitem(last=False)
+        textures[key] = texture
+        return texture
+
+    def clear(self):
+        self._textures.clear()
+
+    def _render(self, text, font_size, font_name, bold):
+        # (a label of its own for each glyph, so that no texture is ever
+        # re-rendered with another text)
+        label = CoreLabel(text=text,
+                          font_size=font_size,
+                          font_name=font_name,
+                          bold=bold)
+        label.refresh()
+        texture = label.texture
+        if texture is not None:
+            # (rendering now rather than when the texture is first drawn)
+            texture.bind()
+        self.render_count += 1
+        return texture
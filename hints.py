@@ -0,0 +1,329 @@
+# -*- coding: utf-8 -*-
+
+"""
+ArithmeBricks -- hints for the player (no Kivy dependency)
+
+Copyright (c) 2014 Jan Kaliszewski (zuo). All rights reserved.
+
+Licensed under GPL-3 (see the *LICENSE* file for details).
+
+The hint engine looks at the chains of attached bricks on the board
+(see `board.ChainModel`) and suggests the next move: which brick to
+put next to which one -- or which brick to take away, if a chain does
+not fit any known solution.
+
+The chains that already are equalities are kept (if possible); for
+the rest of the bricks the solution the puzzle was dealt with is tried
+first, then (if the player's equalities are not part of it) the ones
+found by the solver.  The solver runs in a separate thread (one at a
+time, limited in time and in the number of solutions, and cancelled
+when the bricks it was started for change) and the rest of the search
+is divided into small steps, so that it can be spread over many frames
+(see `BudgetedSearch`); the solutions found are kept and reused when
+the board changes.
+"""
+
+from __future__ import division, unicode_literals
+
+import threading
+import timeit
+
+from expressions import is_equality
+from solver import Solver
+
+
+#
+# Constants
+
+# (how much time the hint search can take per frame, in seconds)
+HINT_FRAME_BUDGET = 0.004
+
+# (how long to wait for the solver before falling back to the solutions
+# that are already known, in seconds -- the solver keeps working, so
+# its results may be used for later hints)
+HINT_SOLVER_PATIENCE = 2.0
+
+# (how long the solver can work for one set of bricks at most, in
+# seconds -- then the solutions found so far are used)
+HINT_SOLVER_TIME_LIMIT = 10.0
+
+# (for more equalities than that the solver is not started at all --
+# on large boards it could not finish anyway, and its thread would
+# just keep taking time from the game; the known solutions are used)
+HINT_SOLVER_MAX_EQUALITIES = 4
+
+# (how many candidate solutions are compared with the board at most --
+# and how many the solver looks for)
+HINT_MAX_TARGETS = 50
+
+
+#
+# Helper classes
+
+class Hint(object):
+
+    # Put `brick` on the `side` ('left' or 'right') of `neighbour` --
+    # or, if `neighbour` is None, just take `brick` away from where it
+    # is now.
+
+    __slots__ = ('brick', 'neighbour', 'side')
+
+    def __init__(self, brick, neighbour=None, side=None):
+        self.brick = brick
+        self.neighbour = neighbour
+        self.side = side
+
+    def __repr__(self):
+        return '<{0} {1!r} {2} {3!r}>'.format(self.__class__.__name__,
+                                              self.brick,
+                                              self.side,
+                                              self.neighbour)
+
+
+class HintEngine(object):
+
+    def __init__(self, symbols, equalities):
+        # `symbols` -- the symbols in the order they were dealt in
+        # (i.e., forming the equalities of the generated solution)
+        self.symbols = list(symbols)
+        self.equalities = equalities
+        self._known_solutions = []
+        dealt_solution = split_equalities(self.symbols, equalities)
+        if dealt_solution is not None:
+            self._known_solutions.append(dealt_solution)
+        self._solver_job = None
+
+    def search(self, chains):
+        # -> iterator that yields None until the search is done, then
+        #    a Hint (or None if no move can be suggested); `chains` --
+        #    a sequence of `board.BrickChain` objects (covering all the
+        #    bricks on the board)
+        equal_chains = [chain for chain in chains if chain.is_equal]
+        other_chains = [chain for chain in chains if not chain.is_equal]
+        equalities_left = self.equalities - len(equal_chains)
+        targets = self._get_targets(equal_chains)
+        if not targets and 0 < equalities_left <= HINT_SOLVER_MAX_EQUALITIES:
+            job = self._get_solver_job(other_chains, equalities_left)
+            deadline = _timer() + HINT_SOLVER_PATIENCE
+            while not job.done and _timer() < deadline:
+                yield None
+            if job.done:
+                self._add_known_solutions(equal_chains, job.solutions)
+                targets = self._get_targets(equal_chains)
+        if not targets:
+            # (the player's equalities cannot all be kept -- at least
+            # not in any of the known solutions -- so they are treated
+            # like any other chains)
+            other_chains = list(chains)
+            targets = self._get_targets([])
+        best_placement = None
+        for target in targets[:HINT_MAX_TARGETS]:
+            yield None
+            placement = _Placement(target, other_chains)
+            if best_placement is None or (
+                    placement.score > best_placement.score):
+                best_placement = placement
+        yield (best_placement.get_hint() if best_placement is not None
+               else None)
+
+    def cancel(self):
+        # (stops the solver, if it is working -- e.g., when the game is
+        # over)
+        if self._solver_job is not None:
+            self._solver_job.cancel()
+            self._solver_job = None
+
+    def _get_targets(self, equal_chains):
+        # -> list of the solutions for the bricks not belonging to
+        #    `equal_chains` (obtained from those known solutions that
+        #    include all of them)
+        equalities = [chain.symbols for chain in equal_chains]
+        targets = []
+        for solution in self._known_solutions:
+            rest = _subtract_equalities(solution, equalities)
+            if rest is not None and rest not in targets:
+                targets.append(rest)
+        return targets
+
+    def _get_solver_job(self, chains, equalities):
+        symbols = sorted(symbol
+                         for chain in chains
+                         for symbol in chain.symbols)
+        key = (tuple(symbols), equalities)
+        job = self._solver_job
+        if job is None or job.key != key:
+            # (the previous job is no longer needed: the bricks have
+            # changed since it was started)
+            self.cancel()
+            job = self._solver_job = _SolverJob(key, symbols, equalities)
+        return job
+
+    def _add_known_solutions(self, equal_chains, rest_solutions):
+        equalities = tuple(chain.symbols for chain in equal_chains)
+        for rest in rest_solutions[:HINT_MAX_TARGETS]:
+            solution = tuple(sorted(equalities + rest))
+            if solution not in self._known_solutions:
+                self._known_solutions.append(solution)
+
+
+class BudgetedSearch(object):
+
+    # Runs a search (an iterator yielding None until it is done, then
+    # the result) in slices, each taking no more than `budget` seconds
+    # (plus the duration of one step) -- e.g., one slice per frame.
+
+    def __init__(self, iterator, budget=HINT_FRAME_BUDGET):
+        self.iterator = iterator
+        self.budget = budget
+        self.done = False
+        self.result = None
+
+    def run_slice(self):
+        # -> true if the search is done (then see `result`)
+        deadline = _timer() + self.budget
+        for result in self.iterator:
+            if result is not None:
+                self.result = result
+                break
+            if _timer() >= deadline:
+                return False
+        self.done = True
+        return True
+
+
+class _SolverJob(object):
+
+    def __init__(self, key, symbols, equalities):
+        self.key = key
+        self.solutions = None
+        self._solver = Solver(symbols, equalities,
+                              max_solutions=HINT_MAX_TARGETS,
+                              time_limit=HINT_SOLVER_TIME_LIMIT)
+        self._thread = threading.Thread(target=self._run,
+                                        name='HintSolverJob')
+        self._thread.daemon = True
+        self._thread.start()
+
+    @property
+    def done(self):
+        return self.solutions is not None
+
+    def cancel(self):
+        # (the thread ends soon -- see `Solver.cancel()`)
+        self._solver.cancel()
+
+    def _run(self):
+        solutions = []
+        try:
+            solutions = self._solver.solve()
+        finally:
+            # (even if the solver failed, the job is done)
+            self.solutions = solutions
+
+
+class _Placement(object):
+
+    # The chains put (where possible) in the places where their symbols
+    # occur in the target equalities -- the longer chains first.
+
+    def __init__(self, target, chains):
+        self.rows = [[None] * len(equality) for equality in target]
+        self.misplaced_chains = []
+        self._brick_to_chain = {}
+        self.score = 0
+        lone_bricks = []
+        for chain in sorted(chains, key=len, reverse=True):
+            for brick in chain.bricks:
+                self._brick_to_chain[brick] = chain
+            if len(chain) == 1:
+                lone_bricks.append(chain.bricks[0])
+            elif self._put_chain(target, chain):
+                self.score += len(chain)
+            else:
+                self.misplaced_chains.append(chain)
+        for brick in lone_bricks:
+            self._put_lone_brick(target, brick)
+
+    def _put_chain(self, target, chain):
+        symbols = chain.symbols
+        length = len(symbols)
+        for equality, row in zip(target, self.rows):
+            for i in range(len(equality) - length + 1):
+                if (equality[i:i+length] == symbols and
+                      not any(row[i:i+length])):
+                    row[i:i+length] = chain.bricks
+                    return True
+        return False
+
+    def _put_lone_brick(self, target, brick):
+        symbol = self._brick_to_chain[brick].symbols[0]
+        for equality, row in zip(target, self.rows):
+            for i, cell in enumerate(row):
+                if cell is None and equality[i] == symbol:
+                    row[i] = brick
+                    return
+
+    def get_hint(self):
+        if self.misplaced_chains:
+            # (a misplaced chain needs to be taken apart)
+            chain = max(self.misplaced_chains, key=len)
+            return Hint(chain.bricks[-1])
+        lone_pair_hint = chain_pair_hint = None
+        for left_brick, right_brick in self._iter_unattached_pairs():
+            left_len = len(self._brick_to_chain[left_brick])
+            right_len = len(self._brick_to_chain[right_brick])
+            if right_len == 1 and left_len > 1:
+                # (extending an existing chain is the best move)
+                return Hint(right_brick, left_brick, 'right')
+            if left_len == 1 and right_len > 1:
+                return Hint(left_brick, right_brick, 'left')
+            if left_len == right_len == 1:
+                if lone_pair_hint is None:
+                    lone_pair_hint = Hint(right_brick, left_brick, 'right')
+            elif chain_pair_hint is None:
+                # (two chains that need to be joined: the first brick
+                # of the right one is to be moved -- the rest of that
+                # chain will be suggested by the next hints)
+                chain_pair_hint = Hint(right_brick, left_brick, 'right')
+        return lone_pair_hint or chain_pair_hint
+
+    def _iter_unattached_pairs(self):
+        # -> (left brick, right brick) pairs of the bricks that should
+        #    be attached to each other but are not (yet)
+        brick_to_chain = self._brick_to_chain
+        for row in self.rows:
+            for left_brick, right_brick in zip(row, row[1:]):
+                if left_brick is None or right_brick is None:
+                    continue
+                chain = brick_to_chain[left_brick]
+                if chain is not brick_to_chain[right_brick]:
+                    yield left_brick, right_brick
+
+
+#
+# Helper functions
+
+def split_equalities(symbols, equalities):
+    # -> tuple of the consecutive equalities `symbols` consist of
+    #    (or None if they cannot be split into that many of them)
+    if equalities == 1:
+        return (tuple(symbols),) if is_equality(symbols) else None
+    for i in range(3, len(symbols) - 2):
+        head = symbols[:i]
+        if is_equality(head):
+            rest = split_equalities(symbols[i:], equalities - 1)
+            if rest is not None:
+                return (tuple(head),) + rest
+    return None
+
+
+def _subtract_equalities(solution, equalities):
+    rest = list(solution)
+    for equality in equalities:
+        if equality not in rest:
+            return None
+        rest.remove(equality)
+    return tuple(rest)
+
+
+_timer = timeit.default_timer
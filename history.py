@@ -0,0 +1,190 @@
+# -*- coding: utf-8 -*-
+
+"""
+ArithmeBricks -- long-horizon memory of dealt puzzles
+
+Copyright (c) 2014 Jan Kaliszewski (zuo). All rights reserved.
+
+Licensed under GPL-3 (see the *LICENSE* file for details).
+
+Puzzles are remembered as packed symbol multisets (see
+`engine.pack_symbols()`), so that the same bricks dealt in another
+order are still recognized.  Membership is answered in O(1) either
+by an exact hash set or -- to remember hundreds of thousands of
+puzzles in well under a megabyte of memory -- by a Bloom filter (then
+a small fraction of never-dealt puzzles is taken for seen ones, which
+is harmless here).
+
+File layout (all integers little-endian):
+
+* header: magic (4 bytes), format version (uint16), record width
+  (uint16);
+* records: packed symbol multisets, each stored as `record width`
+  bytes, in the order they were added.
+
+New records are appended as soon as they are added; when the file is
+loaded, only the most recent `max_size` records are kept (the file is
+compacted if needed) and a truncated trailing record is ignored.
+"""
+
+from __future__ import division, unicode_literals
+
+import math
+import struct
+
+from engine import PACKED_SYMBOLS_BYTES
+
+
+#
+# Constants
+
+PUZZLE_HISTORY_FILENAME = 'puzzles.history'
+
+DEFAULT_HISTORY_MAX_SIZE = 200000
+DEFAULT_BLOOM_ERROR_RATE = 0.001
+
+MAGIC = b'ABph'
+FORMAT_VERSION = 1
+HEADER_STRUCT = struct.Struct(str('<4sHH'))
+
+_MASK64 = (1 << 64) - 1
+
+
+#
+# Helper classes
+
+class BloomFilter(object):
+
+    def __init__(self, capacity, error_rate=DEFAULT_BLOOM_ERROR_RATE):
+        # (the optimal number of bits and of hash functions
+        # for the given capacity and false positive rate)
+        bit_count = int(math.ceil(
+            -capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.bit_count = max(8, bit_count)
+        self.hash_count = max(1, int(round(
+            self.bit_count / max(1, capacity) * math.log(2))))
+        self._bits = bytearray((self.bit_count + 7) // 8)
+
+    def __contains__(self, packed):
+        bits = self._bits
+        return all(bits[i >> 3] & (1 << (i & 7))
+                   for i in self._iter_bit_indices(packed))
+
+    def add(self, packed):
+        bits = self._bits
+        for i in self._iter_bit_indices(packed):
+            bits[i >> 3] |= 1 << (i & 7)
+
+    def _iter_bit_indices(self, packed):
+        # (double hashing: the k indices are derived from two hashes)
+        folded = 0
+        while packed:
+            folded ^= packed & _MASK64
+            packed >>= 64
+        hash1 = _mix64(folded)
+        hash2 = _mix64(folded ^ 0x9e3779b97f4a7c15) | 1
+        bit_count = self.bit_count
+        for i in range(self.hash_count):
+            yield (hash1 + i * hash2) % bit_count
+
+
+class PuzzleHistory(object):
+
+    def __init__(self, filename=None, max_size=DEFAULT_HISTORY_MAX_SIZE,
+                 bloom_error_rate=None):
+        # (`filename` being None means: do not persist anything;
+        # `bloom_error_rate` being None means: use an exact set)
+        self.filename = filename
+        self.max_size = max_size
+        if bloom_error_rate is None:
+            self._members = set()
+        else:
+            self._members = BloomFilter(max_size, bloom_error_rate)
+        self._size = 0
+        self._file = None
+        if filename is not None:
+            for packed in self._load():
+                self._add_member(packed)
+
+    @classmethod
+    def open(cls, filename=PUZZLE_HISTORY_FILENAME, **kwargs):
+        # (if the file cannot be read or written, the returned history
+        # just does not persist -- the game is playable anyway)
+        try:
+            return cls(filename, **kwargs)
+        except (ValueError, EnvironmentError, struct.error):
+            return cls(None, **kwargs)
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def __len__(self):
+        # (the number of puzzles remembered -- not including the ones
+        # that a Bloom filter mistook for already remembered)
+        return self._size
+
+    def __contains__(self, packed):
+        return packed in self._members
+
+    def add(self, packed):
+        if packed in self._members:
+            return
+        self._add_member(packed)
+        if self._file is not None:
+            self._file.write(encode_record(packed))
+            self._file.flush()
+
+    def _add_member(self, packed):
+        self._members.add(packed)
+        self._size += 1
+
+    def _load(self):
+        # -> list of packed symbol multisets (the most recent ones)
+        #    read from the file (which is created if missing), leaving
+        #    the file open for appending
+        width = PACKED_SYMBOLS_BYTES
+        try:
+            with open(self.filename, 'rb') as f:
+                content = f.read()
+        except (IOError, OSError):
+            content = b''
+        records = []
+        if content:
+            magic, version, record_width = HEADER_STRUCT.unpack_from(content)
+            if (magic != MAGIC or version != FORMAT_VERSION or
+                  record_width != width):
+                raise ValueError('not a supported puzzle history file')
+            body = content[HEADER_STRUCT.size:]
+            record_count = len(body) // width
+            first = max(0, record_count - self.max_size)
+            records = [body[i*width:(i+1)*width]
+                       for i in range(first, record_count)]
+        if not content or len(records) * width != len(content) - (
+                HEADER_STRUCT.size):
+            # (new, too long or damaged -- to be (re)written)
+            with open(self.filename, 'wb') as f:
+                f.write(HEADER_STRUCT.pack(MAGIC, FORMAT_VERSION, width))
+                f.write(b''.join(records))
+        self._file = open(self.filename, 'ab')
+        return [decode_record(record) for record in records]
+
+
+#
+# Helper functions
+
+def encode_record(packed):
+    return bytes(bytearray((packed >> (8 * i)) & 0xff
+                           for i in range(PACKED_SYMBOLS_BYTES)))
+
+
+def decode_record(record):
+    return sum(byte << (8 * i) for i, byte in enumerate(bytearray(record)))
+
+
+def _mix64(value):
+    # (the SplitMix64 finalizer)
+    value = ((value ^ (value >> 30)) * 0xbf58476d1ce4e5b9) & _MASK64
+    value = ((value ^ (value >> 27)) * 0x94d049bb133111eb) & _MASK64
+    return value ^ (value >> 31)
@@ -0,0 +1,205 @@
+# -*- coding: utf-8 -*-
+
+"""
+ArithmeBricks -- opt-in latency instrumentation
+
+Copyright (c) 2014 Jan Kaliszewski (zuo). All rights reserved.
+
+Licensed under GPL-3 (see the *LICENSE* file for details).
+
+`LatencyRecorder` times chosen functions/methods (by temporarily
+replacing them with timing wrappers -- so that nothing is paid when
+the instrumentation is off) as well as the intervals between frames.
+The samples are kept in a fixed-size ring buffer (flat arrays: section
+id, start time, duration), so that recording never allocates and old
+samples are just overwritten.
+
+`LatencyHud` is an overlay that shows the number of samples and the
+p50/p99 durations per section.
+
+The samples can be exported to a file in the Trace Event Format (as
+understood by, e.g., *chrome://tracing* or Perfetto) for offline
+analysis.
+"""
+
+from __future__ import division, unicode_literals
+
+import array
+import functools
+import json
+import math
+import timeit
+
+from kivy.clock import Clock
+from kivy.uix.label import Label
+
+
+#
+# Constants
+
+DEFAULT_RING_SIZE = 8192
+
+FRAME_SECTION = 'frame'
+
+HUD_REFRESH_INTERVAL = 0.5
+
+LATENCY_TRACE_FILENAME = 'latency-trace.json'
+
+
+#
+# Helper classes
+
+class LatencyRecorder(object):
+
+    def __init__(self, capacity=DEFAULT_RING_SIZE):
+        self.capacity = capacity
+        self.section_names = []
+        self._section_ids = {}
+        self._section_column = array.array(str('H'), [0] * capacity)
+        self._start_column = array.array(str('d'), [0.0] * capacity)
+        self._duration_column = array.array(str('d'), [0.0] * capacity)
+        self._count = 0           # (all samples ever recorded)
+        self._origin = _timer()
+        self._wrapped = []        # (triples: owner, name, original)
+        self.enabled = False
+
+    def __len__(self):
+        # (the number of samples kept)
+        return min(self._count, self.capacity)
+
+    def start(self, targets):
+        # (`targets` -- triples: owner -- a class or a module, name of
+        # its function/method, name of the section)
+        if self.enabled:
+            return
+        self.enabled = True
+        for owner, name, section in targets:
+            self._wrap(owner, name, section)
+        Clock.schedule_interval(self._on_frame, 0)
+
+    def stop(self):
+        if not self.enabled:
+            return
+        self.enabled = False
+        Clock.unschedule(self._on_frame)
+        while self._wrapped:
+            owner, name, original = self._wrapped.pop()
+            setattr(owner, name, original)
+
+    def record(self, section, start, duration):
+        section_id = self._section_ids.get(section)
+        if section_id is None:
+            section_id = self._section_ids[section] = len(self.section_names)
+            self.section_names.append(section)
+        i = self._count % self.capacity
+        self._section_column[i] = section_id
+        self._start_column[i] = start
+        self._duration_column[i] = duration
+        self._count += 1
+
+    def iter_samples(self):
+        # -> iterator of (section, start, duration) triples, the oldest
+        #    first (start times being relative to the recorder creation)
+        capacity = self.capacity
+        first = max(0, self._count - capacity)
+        for n in range(first, self._count):
+            i = n % capacity
+            yield (self.section_names[self._section_column[i]],
+                   self._start_column[i] - self._origin,
+                   self._duration_column[i])
+
+    def get_stats(self, percents=(50, 99)):
+        # -> list of (section, number of samples, [percentile values])
+        section_to_durations = {}
+        for section, _, duration in self.iter_samples():
+            section_to_durations.setdefault(section, []).append(duration)
+        stats = []
+        for section in self.section_names:
+            durations = section_to_durations.get(section)
+            if durations:
+                durations.sort()
+                stats.append((section, len(durations),
+                              [get_percentile(durations, percent)
+                               for percent in percents]))
+        return stats
+
+    def format_stats(self):
+        return '\n'.join(
+            '{0}: n={1} p50={2:.1f}ms p99={3:.1f}ms'.format(
+                section, count, p50 * 1000, p99 * 1000)
+            for section, count, (p50, p99) in self.get_stats((50, 99)))
+
+    def export_trace(self, filename):
+        events = [
+            {'name': section,
+             'ph': 'X',
+             'ts': round(start * 1e6, 1),
+             'dur': round(duration * 1e6, 1),
+             'pid': 0,
+             'tid': 0}
+            for section, start, duration in self.iter_samples()]
+        with open(filename, 'w') as f:
+            json.dump({'traceEvents': events, 'displayTimeUnit': 'ms'}, f)
+
+    def _wrap(self, owner, name, section):
+        original = owner.__dict__[name]
+        record = self.record
+
+        @functools.wraps(original)
+        def timed(*args, **kwargs):
+            start = _timer()
+            try:
+                return original(*args, **kwargs)
+            finally:
+                record(section, start, _timer() - start)
+
+        self._wrapped.append((owner, name, original))
+        setattr(owner, name, timed)
+
+    def _on_frame(self, dt):
+        # (the interval since the previous frame)
+        self.record(FRAME_SECTION, _timer() - dt, dt)
+
+
+class LatencyHud(Label):
+
+    def __init__(self, recorder, **kwargs):
+        kwargs.setdefault('color', (1, 1, 0.3, 1))
+        kwargs.setdefault('halign', 'left')
+        kwargs.setdefault('valign', 'top')
+        super(LatencyHud, self).__init__(**kwargs)
+        self.recorder = recorder
+        self.bind(size=self._update_text_size)
+
+    def show(self):
+        # (imported here, as importing it creates the window)
+        from kivy.core.window import Window
+        if self.parent is None:
+            Window.add_widget(self)
+            self.size = Window.size
+            self.font_size = max(10, Window.height / 45)
+            Clock.schedule_interval(self.refresh, HUD_REFRESH_INTERVAL)
+            self.refresh()
+
+    def hide(self):
+        if self.parent is not None:
+            Clock.unschedule(self.refresh)
+            self.parent.remove_widget(self)
+
+    def refresh(self, *args):
+        self.text = self.recorder.format_stats()
+
+    def _update_text_size(self, instance, size):
+        self.text_size = (size[0] - 20, size[1] - 20)
+
+
+#
+# Helper functions
+
+def get_percentile(sorted_values, percent):
+    # (the nearest-rank method)
+    rank = int(math.ceil(percent / 100 * len(sorted_values)))
+    return sorted_values[min(len(sorted_values), max(1, rank)) - 1]
+
+
+_timer = timeit.default_timer
@@ -0,0 +1,140 @@
+# -*- coding: utf-8 -*-
+
+"""
+ArithmeBricks -- batched movement of widgets towards their targets
+
+Copyright (c) 2014 Jan Kaliszewski (zuo). All rights reserved.
+
+Licensed under GPL-3 (see the *LICENSE* file for details).
+
+Instead of one `Animation` object (with its own clock event and
+per-step dispatching) per moving brick, one `MotionDriver` moves all
+widgets: the start positions, the distances to cover and the start
+times are kept in flat arrays, updated together by a single clock
+callback per frame -- scheduled only while anything is moving.
+"""
+
+from __future__ import division, unicode_literals
+
+import array
+import timeit
+
+from kivy.animation import AnimationTransition
+from kivy.clock import Clock
+
+
+#
+# Constants
+
+DEFAULT_MOVE_DURATION = 0.1
+DEFAULT_MOVE_TRANSITION = 'out_bounce'
+
+
+#
+# Helper classes
+
+class MotionDriver(object):
+
+    def __init__(self, duration=DEFAULT_MOVE_DURATION,
+                 transition=DEFAULT_MOVE_TRANSITION):
+        self.duration = duration
+        self.transition = getattr(AnimationTransition, transition)
+        self._widgets = []
+        self._widget_to_index = {}
+        self._start_x = array.array(str('d'))
+        self._start_y = array.array(str('d'))
+        self._delta_x = array.array(str('d'))
+        self._delta_y = array.array(str('d'))
+        self._start_time = array.array(str('d'))
+        # (the `ClockEvent` of `_tick()`, while it is scheduled -- kept
+        # to be cancelled, as `Clock.unschedule(self._tick)` would not
+        # match it if `_tick` were replaced meanwhile, e.g. wrapped by
+        # the latency probes)
+        self._tick_event = None
+
+    def __len__(self):
+        # (the number of widgets being moved)
+        return len(self._widgets)
+
+    def __contains__(self, widget):
+        return widget in self._widget_to_index
+
+    def move(self, widget, target_pos):
+        # (from the current position; replaces any unfinished move)
+        x, y = widget.pos
+        target_x, target_y = target_pos
+        values = (x, y, target_x - x, target_y - y, _timer())
+        index = self._widget_to_index.get(widget)
+        if index is None:
+            self._widget_to_index[widget] = len(self._widgets)
+            self._widgets.append(widget)
+            for column, value in zip(self._columns, values):
+                column.append(value)
+        else:
+            for column, value in zip(self._columns, values):
+                column[index] = value
+        if self._tick_event is None:
+            self._tick_event = Clock.schedule_interval(self._tick, 0)
+
+    def stop(self, widget):
+        # (the widget is left where it is)
+        index = self._widget_to_index.pop(widget, None)
+        if index is not None:
+            self._remove_at(index)
+
+    def stop_all(self):
+        for widget in list(self._widgets):
+            self.stop(widget)
+
+    def finish_all(self):
+        # (the widgets are put at their targets at once)
+        for i, widget in enumerate(self._widgets):
+            widget.pos = (self._start_x[i] + self._delta_x[i],
+                          self._start_y[i] + self._delta_y[i])
+        self.stop_all()
+
+    @property
+    def _columns(self):
+        return (self._start_x, self._start_y,
+                self._delta_x, self._delta_y,
+                self._start_time)
+
+    def _remove_at(self, index):
+        # (moving the last entry into the freed place)
+        widgets = self._widgets
+        last = len(widgets) - 1
+        if index != last:
+            widgets[index] = widgets[last]
+            self._widget_to_index[widgets[index]] = index
+            for column in self._columns:
+                column[index] = column[last]
+        del widgets[last]
+        for column in self._columns:
+            del column[last]
+        if not widgets and self._tick_event is not None:
+            self._tick_event.cancel()
+            self._tick_event = None
+
+    def _tick(self, dt):
+        now = _timer()
+        duration = self.duration
+        transition = self.transition
+        start_x = self._start_x
+        start_y = self._start_y
+        delta_x = self._delta_x
+        delta_y = self._delta_y
+        start_time = self._start_time
+        finished = []
+        for i, widget in enumerate(self._widgets):
+            progress = (now - start_time[i]) / duration
+            if progress >= 1:
+                progress = 1
+                finished.append(widget)
+            step = transition(progress)
+            widget.pos = (start_x[i] + delta_x[i] * step,
+                          start_y[i] + delta_y[i] * step)
+        for widget in finished:
+            self.stop(widget)
+
+
+_timer = timeit.default_timer
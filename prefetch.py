@@ -0,0 +1,119 @@
+# -*- coding: utf-8 -*-
+
+"""
+ArithmeBricks -- background puzzle prefetching
+
+Copyright (c) 2014 Jan Kaliszewski (zuo). All rights reserved.
+
+Licensed under GPL-3 (see the *LICENSE* file for details).
+"""
+
+from __future__ import division, unicode_literals
+
+import collections
+import threading
+
+from engine import SymbolGenerator, pack_symbols
+
+
+#
+# Constants
+
+PREFETCH_QUEUE_SIZE = 3
+
+# (how many levels below and above the current one are prefetched)
+PREFETCH_LEVEL_SPREAD = 1
+
+# (how long to wait for the worker when stopping, in seconds)
+PREFETCH_STOP_TIMEOUT = 1.0
+
+
+#
+# Helper classes
+
+class PuzzlePrefetcher(object):
+
+    # A worker thread keeps small queues of ready-to-deal puzzles for
+    # the current level and its neighbours.  The queued puzzles are
+    # *not* checked against the recently dealt ones (that is done when
+    # a puzzle is taken -- see the `reject` argument of `take()`), so
+    # the de-duplication of dealt puzzles still works as without
+    # prefetching; the worker only avoids queuing the same symbol
+    # combination twice for a level.
+
+    def __init__(self, level_limits, queue_size=PREFETCH_QUEUE_SIZE):
+        self.level_limits = level_limits
+        self.queue_size = queue_size
+        # (used by worker only; off the main thread there is no need
+        # for a time budget)
+        self.symbol_generator = SymbolGenerator(budget=None)
+        self._queues = collections.defaultdict(collections.deque)
+        self._wanted_levels = []
+        self._stopped = False
+        self._condition = threading.Condition()
+        self._thread = threading.Thread(target=self._work,
+                                        name='PuzzlePrefetcher')
+        self._thread.daemon = True
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        with self._condition:
+            self._stopped = True
+            self._condition.notify()
+        if self._thread.is_alive():
+            self._thread.join(PREFETCH_STOP_TIMEOUT)
+
+    def set_level(self, level):
+        # `level` is an index in `level_limits`
+        spread = PREFETCH_LEVEL_SPREAD
+        wanted_levels = [level]
+        for distance in range(1, spread + 1):
+            wanted_levels.extend(
+                lvl for lvl in (level + distance, level - distance)
+                if 0 <= lvl < len(self.level_limits))
+        with self._condition:
+            self._wanted_levels = wanted_levels
+            self._condition.notify()
+
+    def take(self, level, reject=None):
+        # -> list of symbols or None (if no suitable puzzle is ready);
+        # `reject`, if given, should be a function that takes a list
+        # of symbols and returns true if the puzzle is unwanted
+        with self._condition:
+            queue = self._queues[level]
+            try:
+                while queue:
+                    symbols = queue.popleft()
+                    if reject is None or not reject(symbols):
+                        return symbols
+                return None
+            finally:
+                self._condition.notify()
+
+    def _work(self):
+        while True:
+            with self._condition:
+                level = self._get_level_to_refill()
+                while level is None and not self._stopped:
+                    self._condition.wait()
+                    level = self._get_level_to_refill()
+                if self._stopped:
+                    return
+            # (generating is done without holding the lock)
+            symbols = self.symbol_generator.generate_puzzle(
+                self.level_limits[level])
+            symbol_combination = pack_symbols(symbols)
+            with self._condition:
+                queue = self._queues[level]
+                if (len(queue) < self.queue_size and
+                      all(pack_symbols(queued) != symbol_combination
+                          for queued in queue)):
+                    queue.append(symbols)
+
+    def _get_level_to_refill(self):
+        for level in self._wanted_levels:
+            if len(self._queues[level]) < self.queue_size:
+                return level
+        return None
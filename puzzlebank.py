@@ -0,0 +1,265 @@
+# -*- coding: utf-8 -*-
+
+"""
+ArithmeBricks -- precomputed puzzle bank
+
+Copyright (c) 2014 Jan Kaliszewski (zuo). All rights reserved.
+
+Licensed under GPL-3 (see the *LICENSE* file for details).
+
+The bank is built offline (run this module as a script) and then used
+by the game to deal puzzles without running the generator at all.
+
+File layout (all integers little-endian):
+
+* header: magic (4 bytes), format version (uint16),
+  number of level sections (uint16);
+* level section table, one entry per level: checksum of the level
+  limits (uint32), record width (uint16), reserved (uint16), number
+  of records (uint32), offset of the first record (uint32);
+* records: each record is a puzzle stored as `record width` bytes;
+  every byte is an index into `engine.SYMBOLS`, unused trailing
+  bytes are filled with `PADDING_BYTE`.
+
+Thanks to fixed-width records any puzzle can be read in O(1) directly
+from the memory-mapped file.
+"""
+
+from __future__ import division, unicode_literals
+
+import argparse
+import json
+import mmap
+import random
+import struct
+import sys
+import zlib
+
+try:
+    from math import gcd
+except ImportError:  # Python 2
+    from fractions import gcd
+
+from engine import (
+    DIFFICULTY_LEVEL_LIMITS,
+    MAX_RETRY,
+    SYMBOLS,
+    SymbolGenerator,
+)
+
+
+#
+# Constants
+
+PUZZLE_BANK_FILENAME = 'puzzles.bank'
+
+DEFAULT_PUZZLES_PER_LEVEL = 10000
+
+MAGIC = b'ABpb'
+FORMAT_VERSION = 1
+HEADER_STRUCT = struct.Struct(str('<4sHH'))
+SECTION_STRUCT = struct.Struct(str('<IHHII'))
+
+PADDING_BYTE = 0xff
+
+SYMBOL_TO_BYTE = {symbol: i for i, symbol in enumerate(SYMBOLS)}
+
+
+#
+# Helper classes
+
+class PuzzleBank(object):
+
+    class _Section(object):
+
+        def __init__(self, width, count, offset):
+            self.width = width
+            self.count = count
+            self.offset = offset
+            self.drawn = 0
+            self.start = self.stride = None
+
+        def next_index(self):
+            # Walking through the records with a random stride coprime
+            # with their number visits each of them exactly once (in a
+            # shuffled order) -- without materializing any permutation.
+            count = self.count
+            if self.drawn >= count:
+                return None
+            if self.start is None:
+                self.start = random.randrange(count)
+                self.stride = 1
+                if count > 2:
+                    while True:
+                        self.stride = random.randrange(1, count)
+                        if gcd(self.stride, count) == 1:
+                            break
+            index = (self.start + self.drawn * self.stride) % count
+            self.drawn += 1
+            return index
+
+    def __init__(self, file_obj):
+        self._file = file_obj
+        self._mmap = mmap.mmap(file_obj.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            self._sections = self._read_section_table()
+        except Exception:
+            self.close()
+            raise
+
+    @classmethod
+    def open(cls, filename=PUZZLE_BANK_FILENAME):
+        # (returns None if the bank is missing or unusable
+        # -- then the caller is supposed to generate puzzles live)
+        try:
+            file_obj = open(filename, 'rb')
+        except (IOError, OSError):
+            return None
+        try:
+            return cls(file_obj)
+        except (ValueError, EnvironmentError, struct.error):
+            file_obj.close()
+            return None
+
+    def close(self):
+        self._mmap.close()
+        self._file.close()
+
+    def _read_section_table(self):
+        magic, version, section_num = HEADER_STRUCT.unpack_from(self._mmap)
+        if magic != MAGIC or version != FORMAT_VERSION:
+            raise ValueError('not a supported puzzle bank file')
+        sections = {}
+        table_offset = HEADER_STRUCT.size
+        for i in range(section_num):
+            (checksum,
+             width, _,
+             count,
+             offset) = SECTION_STRUCT.unpack_from(self._mmap, table_offset)
+            if offset + width * count > len(self._mmap):
+                raise ValueError('truncated puzzle bank file')
+            if count:
+                sections[checksum] = self._Section(width, count, offset)
+            table_offset += SECTION_STRUCT.size
+        return sections
+
+    def __len__(self):
+        return sum(section.count for section in self._sections.values())
+
+    def remaining(self, limits):
+        section = self._sections.get(limits_checksum(limits))
+        if section is None:
+            return 0
+        return section.count - section.drawn
+
+    def draw(self, limits, reject=None):
+        # (returns None if there are no unused puzzles for the
+        # given limits; `reject`, if given, should be a function
+        # that takes a list of symbols and returns true if the
+        # puzzle is unwanted, e.g. because it was dealt recently)
+        section = self._sections.get(limits_checksum(limits))
+        if section is None:
+            return None
+        for i in range(MAX_RETRY):
+            index = section.next_index()
+            if index is None:
+                return None
+            symbols = self.get(section, index)
+            if reject is None or not reject(symbols):
+                return symbols
+        return None
+
+    def get(self, section, index):
+        start = section.offset + index * section.width
+        record = bytearray(self._mmap[start:start + section.width])
+        return [SYMBOLS[byte] for byte in record if byte != PADDING_BYTE]
+
+
+#
+# Helper functions
+
+def limits_checksum(limits):
+    canonical_repr = json.dumps(limits, sort_keys=True).encode('ascii')
+    return zlib.crc32(canonical_repr) & 0xffffffff
+
+
+def encode_symbols(symbols, width):
+    record = bytearray(SYMBOL_TO_BYTE[symbol] for symbol in symbols)
+    if len(record) > width:
+        raise ValueError('too many symbols for the record width')
+    record.extend([PADDING_BYTE] * (width - len(record)))
+    return bytes(record)
+
+
+def generate_level_puzzles(limits, count, symbol_generator):
+    for symbols in symbol_generator.generate_puzzles(limits, count):
+        assert symbols.count('==') == limits['equalities']
+        yield symbols
+
+
+def build_bank(filename, level_limits, count, seed=None, log=None,
+               batch=False):
+    # (`batch` -- whether to use the vectorized batch generator, which
+    # is faster for most levels if NumPy is installed, but draws the
+    # puzzles with a somewhat different distribution than the game's
+    # generator does; by default the puzzles are generated one by one,
+    # just like in the game)
+    # (no time budget, as it would make the results depend on timing
+    # and not only on the seed)
+    random.seed(seed)
+    if batch:
+        # (imported here, as it imports NumPy -- not needed by the game
+        # which only reads the bank)
+        from batchgen import BatchSymbolGenerator
+        symbol_generator = BatchSymbolGenerator(budget=None)
+    else:
+        symbol_generator = SymbolGenerator(budget=None)
+    sections = []
+    for level, limits in enumerate(level_limits, 1):
+        width = limits['max_symbols_per_equality'] * limits['equalities']
+        records = [
+            encode_symbols(symbols, width)
+            for symbols in generate_level_puzzles(limits,
+                                                  count,
+                                                  symbol_generator)]
+        sections.append((limits_checksum(limits), width, records))
+        if log is not None:
+            log('level {0}: {1} puzzles generated'.format(level, count))
+    offset = HEADER_STRUCT.size + SECTION_STRUCT.size * len(sections)
+    with open(filename, 'wb') as f:
+        f.write(HEADER_STRUCT.pack(MAGIC, FORMAT_VERSION, len(sections)))
+        for checksum, width, records in sections:
+            f.write(SECTION_STRUCT.pack(checksum,
+                                        width, 0,
+                                        len(records),
+                                        offset))
+            offset += width * len(records)
+        for _, _, records in sections:
+            f.write(b''.join(records))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description='Pre-generate the ArithmeBricks puzzle bank.')
+    parser.add_argument(
+        '-n', '--count', type=int, default=DEFAULT_PUZZLES_PER_LEVEL,
+        help='number of puzzles per level (default: %(default)s)')
+    parser.add_argument(
+        '-s', '--seed', type=int, default=None,
+        help='random seed (to make the build reproducible)')
+    parser.add_argument(
+        '-o', '--output', default=PUZZLE_BANK_FILENAME,
+        help='output file (default: %(default)s)')
+    parser.add_argument(
+        '--batch', action='store_true',
+        help='use the (NumPy-vectorized) batch generator -- faster, '
+             'but its puzzles are distributed a bit differently')
+    args = parser.parse_args(argv)
+    def log(msg):
+        sys.stderr.write(msg + '\n')
+    build_bank(args.output, DIFFICULTY_LEVEL_LIMITS, args.count,
+               seed=args.seed, log=log, batch=args.batch)
+
+
+if __name__ == '__main__':
+    main()
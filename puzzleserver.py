@@ -0,0 +1,390 @@
+# -*- coding: utf-8 -*-
+
+"""
+ArithmeBricks -- local puzzle-serving daemon
+
+Copyright (c) 2014 Jan Kaliszewski (zuo). All rights reserved.
+
+Licensed under GPL-3 (see the *LICENSE* file for details).
+
+Serves puzzles to many clients (e.g., classroom tablets) over plain
+HTTP/1.1 (keep-alive supported -- also for HTTP/1.0 clients that ask
+for it with ``Connection: keep-alive``):
+
+* ``GET /puzzle?level=N&client=ID`` -- a puzzle for level N (1-based),
+  as JSON: ``{"level": N, "symbols": [...]}``; ``client`` is optional
+  (by default, the client's IP address is used);
+* ``GET /stats`` -- counters and buffer sizes per level, as JSON.
+
+A pool of worker processes generates puzzles in batches and the event
+loop keeps per-level buffers of them warm, so that a request is
+normally answered without waiting for the generator at all.  Like
+`SymbolGenerator.repeated_too_soon()` does for one player, the server
+remembers the symbol combinations recently served to each client and
+does not serve them to that client again too soon.
+
+Requires Python 3 (*asyncio*); Kivy is not needed.
+"""
+
+from __future__ import division, unicode_literals
+
+import argparse
+import asyncio
+import collections
+import concurrent.futures
+import json
+import os
+import random
+import sys
+import urllib.parse
+
+from engine import (
+    DIFFICULTY_LEVEL_LIMITS,
+    MAX_RETRY,
+    MIN_REPEATING_SYMBOL_COMBINATION_INTERVAL,
+    SymbolGenerator,
+    pack_symbols,
+)
+
+
+#
+# Constants
+
+DEFAULT_HOST = '127.0.0.1'
+DEFAULT_PORT = 8642
+
+# (puzzles kept ready per level, and how many are generated by one
+# worker task -- a refill is started when the buffer and the pending
+# batches together would hold fewer than `PUZZLE_BUFFER_SIZE`)
+PUZZLE_BUFFER_SIZE = 64
+PUZZLE_BATCH_SIZE = 16
+
+# (added to the niceness of the worker processes)
+WORKER_NICENESS = 10
+
+# (the least recently seen clients are forgotten above that number)
+MAX_TRACKED_CLIENTS = 10000
+
+HTTP_REASONS = {
+    200: 'OK',
+    400: 'Bad Request',
+    404: 'Not Found',
+    405: 'Method Not Allowed',
+    503: 'Service Unavailable',
+}
+
+
+#
+# Helper classes
+
+class ClientHistory(object):
+
+    # The symbol combinations (see `engine.pack_symbols()`) recently
+    # served to each client -- the per-client counterpart of
+    # `SymbolGenerator.recent_symbol_combinations`.
+
+    def __init__(self, max_clients=MAX_TRACKED_CLIENTS,
+                 interval=MIN_REPEATING_SYMBOL_COMBINATION_INTERVAL):
+        self.max_clients = max_clients
+        self.interval = interval
+        self._client_to_recent = collections.OrderedDict()
+
+    def __len__(self):
+        # (the number of clients tracked)
+        return len(self._client_to_recent)
+
+    def repeated_too_soon(self, client, symbol_combination):
+        recent = self._client_to_recent.get(client)
+        return recent is not None and symbol_combination in recent
+
+    def add(self, client, symbol_combination):
+        client_to_recent = self._client_to_recent
+        recent = client_to_recent.pop(client, None)
+        if recent is None:
+            recent = collections.deque(maxlen=self.interval)
+            if len(client_to_recent) >= self.max_clients:
+                client_to_recent.popitem(last=False)
+        client_to_recent[client] = recent
+        recent.append(symbol_combination)
+
+
+class PuzzleServer(object):
+
+    def __init__(self, level_limits=DIFFICULTY_LEVEL_LIMITS,
+                 workers=None,
+                 buffer_size=PUZZLE_BUFFER_SIZE,
+                 batch_size=PUZZLE_BATCH_SIZE):
+        self.level_limits = level_limits
+        self.workers = workers or os.cpu_count() or 1
+        self.buffer_size = buffer_size
+        self.batch_size = batch_size
+        self.client_history = ClientHistory()
+        # (per level index: deque of (symbol combination, symbols))
+        self._buffers = [collections.deque() for _ in level_limits]
+        self._pending_batches = [0] * len(level_limits)
+        self._batch_failed = [False] * len(level_limits)
+        self._waiters = [0] * len(level_limits)
+        self._refilled = None
+        self._counts = [collections.Counter() for _ in level_limits]
+        self._executor = None
+        self._server = None
+
+    async def start(self, host=DEFAULT_HOST, port=DEFAULT_PORT):
+        self._refilled = [asyncio.Condition() for _ in self.level_limits]
+        self._executor = concurrent.futures.ProcessPoolExecutor(
+            max_workers=self.workers,
+            initializer=_init_worker)
+        for level in range(len(self.level_limits)):
+            self._refill(level)
+        self._server = await asyncio.start_server(self._handle_connection,
+                                                  host, port)
+        return self._server
+
+    async def stop(self):
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+            self._server = None
+        if self._executor is not None:
+            self._executor.shutdown(wait=False)
+            self._executor = None
+
+    async def get_puzzle(self, level, client=None):
+        # -> list of symbols; `level` is an index in `level_limits`
+        buffer = self._buffers[level]
+        counts = self._counts[level]
+        history = self.client_history
+        waits = 0
+        while True:
+            for i, (symbol_combination, symbols) in enumerate(buffer):
+                # (after so many refills in vain we must assume that
+                # the client has just seen everything the level can
+                # give)
+                if (waits >= MAX_RETRY or
+                      not history.repeated_too_soon(client,
+                                                    symbol_combination)):
+                    del buffer[i]
+                    history.add(client, symbol_combination)
+                    counts['served'] += 1
+                    self._refill(level)
+                    return symbols
+            counts['waits'] += 1
+            waits += 1
+            condition = self._refilled[level]
+            async with condition:
+                self._waiters[level] += 1
+                try:
+                    self._refill(level)
+                    await condition.wait()
+                finally:
+                    self._waiters[level] -= 1
+            if self._batch_failed[level]:
+                raise RuntimeError('puzzle generation failed')
+
+    def get_stats(self):
+        return {
+            'clients': len(self.client_history),
+            'workers': self.workers,
+            'levels': [
+                dict(self._counts[level],
+                     level=level + 1,
+                     buffered=len(self._buffers[level]),
+                     pending_batches=self._pending_batches[level],
+                     waiting=self._waiters[level])
+                for level in range(len(self.level_limits))],
+        }
+
+    def _refill(self, level):
+        # (batches are started until the buffered and pending puzzles
+        # make up for the buffer size plus the number of requests
+        # waiting -- but, not to starve the other levels, with no more
+        # pending batches per level than there are workers)
+        batch_size = self.batch_size
+        missing = (self.buffer_size +
+                   self._waiters[level] -
+                   len(self._buffers[level]) -
+                   self._pending_batches[level] * batch_size)
+        while missing > 0 and self._pending_batches[level] < self.workers:
+            self._pending_batches[level] += 1
+            missing -= batch_size
+            future = asyncio.get_running_loop().run_in_executor(
+                self._executor, _generate_batch,
+                self.level_limits[level], batch_size)
+            future.add_done_callback(
+                lambda future: asyncio.ensure_future(
+                    self._on_batch_done(level, future)))
+
+    async def _on_batch_done(self, level, future):
+        # (the buffer may contain repeated symbol combinations: whether
+        # a puzzle is acceptable depends on the client it is served to)
+        self._pending_batches[level] -= 1
+        counts = self._counts[level]
+        try:
+            batch = future.result()
+        except Exception as exc:
+            counts['failed_batches'] += 1
+            sys.stderr.write('level {0}: batch failed: {1!r}\n'
+                             .format(level + 1, exc))
+            batch = None
+        self._batch_failed[level] = batch is None
+        if batch is not None:
+            self._buffers[level].extend(
+                (pack_symbols(symbols), symbols) for symbols in batch)
+            counts['generated'] += len(batch)
+        condition = self._refilled[level]
+        async with condition:
+            condition.notify_all()
+        if batch is not None and self._executor is not None:
+            self._refill(level)
+
+    async def _handle_connection(self, reader, writer):
+        peer = writer.get_extra_info('peername')
+        default_client = peer[0] if peer else None
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                keep_alive = await self._read_headers(
+                    reader, _get_http_version(request_line))
+                status, body = await self._respond(request_line,
+                                                   default_client)
+                writer.write(_format_response(status, body, keep_alive))
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError,
+                asyncio.LimitOverrunError, ValueError):
+            pass
+        finally:
+            writer.close()
+
+    @staticmethod
+    async def _read_headers(reader, http_version):
+        # -> whether the connection is to be kept alive (by default,
+        #    only for HTTP/1.1 -- an HTTP/1.0 client may be reading the
+        #    response until the connection is closed)
+        keep_alive = http_version == 'HTTP/1.1'
+        while True:
+            line = await reader.readline()
+            if line in (b'\r\n', b'\n', b''):
+                return keep_alive
+            name, _, value = line.decode('latin-1').partition(':')
+            if name.strip().lower() == 'connection':
+                tokens = [token.strip().lower()
+                          for token in value.split(',')]
+                if 'close' in tokens:
+                    keep_alive = False
+                elif 'keep-alive' in tokens:
+                    keep_alive = True
+
+    async def _respond(self, request_line, default_client):
+        # -> (HTTP status, JSON-serializable body)
+        try:
+            method, target, _ = request_line.decode('latin-1').split()
+        except ValueError:
+            return 400, {'error': 'malformed request line'}
+        if method != 'GET':
+            return 405, {'error': 'only GET is supported'}
+        url = urllib.parse.urlsplit(target)
+        query = urllib.parse.parse_qs(url.query)
+        if url.path == '/stats':
+            return 200, self.get_stats()
+        if url.path != '/puzzle':
+            return 404, {'error': 'unknown path'}
+        try:
+            level = int(query['level'][0])
+        except (KeyError, ValueError):
+            return 400, {'error': '"level" (integer) is required'}
+        if not 1 <= level <= len(self.level_limits):
+            return 400, {'error': 'no such level'}
+        client = query.get('client', [default_client])[0]
+        try:
+            symbols = await self.get_puzzle(level - 1, client)
+        except RuntimeError as exc:
+            return 503, {'error': str(exc)}
+        return 200, {'level': level, 'symbols': symbols}
+
+
+#
+# Helper functions
+
+_worker_generator = None
+
+
+def _init_worker():
+    # (in each worker process: its own random state -- a forked one
+    # would repeat the parent's sequence in every worker)
+    # (and a lower priority than the event loop's, so that serving
+    # does not wait for generating on a busy machine)
+    global _worker_generator
+    if hasattr(os, 'nice'):
+        os.nice(WORKER_NICENESS)
+    random.seed()
+    _worker_generator = SymbolGenerator(budget=None)
+
+
+def _generate_batch(limits, count):
+    # (in a worker process)
+    return [_worker_generator.generate_puzzle(limits) for _ in range(count)]
+
+
+def _get_http_version(request_line):
+    # -> e.g. 'HTTP/1.1' (or None if the request line is malformed)
+    parts = request_line.decode('latin-1').split()
+    if len(parts) == 3:
+        return parts[2].upper()
+    return None
+
+
+def _format_response(status, body, keep_alive):
+    payload = json.dumps(body, sort_keys=True).encode('utf-8')
+    head = ('HTTP/1.1 {0} {1}\r\n'
+            'Content-Type: application/json\r\n'
+            'Content-Length: {2}\r\n'
+            'Connection: {3}\r\n'
+            '\r\n').format(status, HTTP_REASONS[status], len(payload),
+                           'keep-alive' if keep_alive else 'close')
+    return head.encode('latin-1') + payload
+
+
+async def serve(server, host, port):
+    await server.start(host, port)
+    sys.stderr.write('serving puzzles on http://{0}:{1}/ ({2} workers)\n'
+                     .format(host, port, server.workers))
+    try:
+        await asyncio.Event().wait()  # (i.e., until cancelled)
+    finally:
+        await server.stop()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description='Serve ArithmeBricks puzzles over HTTP.')
+    parser.add_argument(
+        '--host', default=DEFAULT_HOST,
+        help='address to listen on (default: %(default)s)')
+    parser.add_argument(
+        '-p', '--port', type=int, default=DEFAULT_PORT,
+        help='port to listen on (default: %(default)s)')
+    parser.add_argument(
+        '-w', '--workers', type=int, default=None,
+        help='number of worker processes (default: number of CPUs)')
+    parser.add_argument(
+        '--buffer-size', type=int, default=PUZZLE_BUFFER_SIZE,
+        help='puzzles kept ready per level (default: %(default)s)')
+    parser.add_argument(
+        '--batch-size', type=int, default=PUZZLE_BATCH_SIZE,
+        help='puzzles generated per worker task (default: %(default)s)')
+    args = parser.parse_args(argv)
+    server = PuzzleServer(workers=args.workers,
+                          buffer_size=args.buffer_size,
+                          batch_size=args.batch_size)
+    try:
+        asyncio.run(serve(server, args.host, args.port))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main()
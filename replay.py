@@ -0,0 +1,420 @@
+# -*- coding: utf-8 -*-
+
+"""
+ArithmeBricks -- headless touch replay (board logic benchmark and test)
+
+Copyright (c) 2014 Jan Kaliszewski (zuo). All rights reserved.
+
+Licensed under GPL-3 (see the *LICENSE* file for details).
+
+Builds `ArithmeBricksGame` without any window, lays out its bricks,
+replays touch down/move/up streams against it (dispatching them the
+way Kivy does, including the grabbed touches) and reports, as JSON,
+the throughput and the latency percentiles of the touch handlers --
+as well as whether the final chains are the expected ones (if not,
+the exit status is non-zero, so it can be used as a regression test).
+
+The streams are either synthetic -- each equality of a dealt puzzle is
+built, brick by brick, with the drop points slightly jittered, either
+from left to right (`sequential`) or with the bricks put into their
+places in random order (`shuffled`: then bricks are often dropped
+between two others, which exercises `can_attach_to_both()` and
+`should_attach_to_left()`) -- or recorded: `--record` saves the
+scenarios (boards, events and the resulting chains) to a JSON file,
+`--replay` replays them, expecting the same results.
+
+By default, Kivy's mock GL backend and SDL's offscreen video driver
+are used, so no display is needed.
+"""
+
+from __future__ import division, unicode_literals
+
+import argparse
+import json
+import os
+import platform
+import random
+import sys
+import timeit
+
+os.environ.setdefault('KIVY_NO_ARGS', '1')
+os.environ.setdefault('KIVY_NO_CONSOLELOG', '1')
+# (so that Kivy does not capture stderr -- for the report of failures)
+os.environ.setdefault('KIVY_LOG_MODE', 'MIXED')
+os.environ.setdefault('KIVY_GL_BACKEND', 'mock')
+# (Kivy widgets import the window module, which creates the window)
+os.environ.setdefault('SDL_VIDEODRIVER', 'offscreen')
+
+from kivy.app import App
+from kivy.input.motionevent import MotionEvent
+from kivy.lang import Builder
+
+from benchmark import percentile
+from engine import DIFFICULTY_LEVEL_LIMITS, SymbolGenerator
+from hints import split_equalities
+from ui import (
+    KV_FILENAME,
+    MAX_TOUCH_EVENT_SECONDS,
+    ArithmeBricksApp,
+    ArithmeBricksGame,
+)
+
+
+#
+# Constants
+
+DEFAULT_BOARD_SIZE = (1300, 1500)
+DEFAULT_GAMES = 20
+DEFAULT_LEVEL = 8
+DEFAULT_SEED = 12345
+DEFAULT_MOVE_STEPS = 4
+
+ORDERS = ('sequential', 'shuffled')
+
+# (relative to the brick size)
+DROP_JITTER = 0.1
+POOL_SPACING = 1.05
+ROW_SPACING = 1.5
+EQUALITY_SPACING = 1.5
+
+REPORT_PERCENTILES = (50, 95, 99)
+
+EVENT_TYPE_TO_HANDLER = {
+    'down': 'on_touch_down',
+    'move': 'on_touch_move',
+    'up': 'on_touch_up',
+}
+
+
+#
+# Helper classes
+
+class ReplayTouch(MotionEvent):
+
+    def __init__(self, *args, **kwargs):
+        super(ReplayTouch, self).__init__(*args, **kwargs)
+        self.is_touch = True
+        self.profile = ['pos']
+
+    def depack(self, args):
+        self.sx, self.sy = args
+        super(ReplayTouch, self).depack(args)
+
+
+class ReplayApp(ArithmeBricksApp):
+
+    # (silent, and not run -- just needed by the kv rules)
+
+    def play_sound(self, *args, **kwargs):
+        pass
+
+    def play_finish_sounds(self, *args, **kwargs):
+        pass
+
+
+class ReplayHarness(object):
+
+    _kv_loaded = False
+
+    def __init__(self, size=DEFAULT_BOARD_SIZE):
+        if not ReplayHarness._kv_loaded:
+            Builder.load_file(os.path.join(os.path.dirname(
+                os.path.abspath(__file__)), KV_FILENAME))
+            ReplayHarness._kv_loaded = True
+        self.app = ReplayApp()
+        App._running_app = self.app
+        game = self.game = ArithmeBricksGame(size=size)
+        self.app.root = game
+        game.puzzle_prefetcher.stop()
+        if game.puzzle_bank is not None:
+            game.puzzle_bank.close()
+            game.puzzle_bank = None
+        self.latencies = {event_type: [] for event_type in
+                          EVENT_TYPE_TO_HANDLER}
+        self._touches = {}
+
+    def set_up_board(self, level, bricks):
+        # (`bricks` -- list of (symbol, x, y))
+        game = self.game
+        game.playing = game.finished = False
+        game.clear_bricks()
+        game.ids.difficulty_level_slider.value = level
+        new_bricks = game.provide_bricks([symbol for symbol, _, _ in bricks])
+        game.brick_mover.stop_all()
+        for brick, (_, x, y) in zip(new_bricks, bricks):
+            brick.target_pos = (x, y)
+            game.brick_mover.stop(brick)
+            brick.pos = (x, y)
+        game.playing = True
+
+    def replay(self, events):
+        # (`events` -- list of (event type, touch id, x, y))
+        timer = timeit.default_timer
+        for event_type, touch_id, x, y in events:
+            start = timer()
+            self.dispatch(event_type, touch_id, x, y)
+            self.latencies[event_type].append(timer() - start)
+            if event_type == 'up':
+                # (no need to wait for the movement animations)
+                self.game.brick_mover.finish_all()
+
+    def dispatch(self, event_type, touch_id, x, y):
+        game = self.game
+        width, height = game.size
+        args = (x / width, y / height)
+        if event_type == 'down':
+            touch = self._touches[touch_id] = ReplayTouch(
+                'replay', touch_id, args)
+        else:
+            touch = self._touches[touch_id]
+            touch.move(args)
+        touch.scale_for_screen(width, height)
+        handler = EVENT_TYPE_TO_HANDLER[event_type]
+        game.dispatch(handler, touch)
+        # (like Kivy's event loop: dispatching to the grabbing widgets)
+        if event_type != 'down':
+            for widget_ref in touch.grab_list[:]:
+                widget = widget_ref()
+                if widget is None:
+                    touch.grab_list.remove(widget_ref)
+                    continue
+                touch.grab_current = widget
+                widget.dispatch(handler, touch)
+                touch.grab_current = None
+        if hasattr(touch, 'dispatch_done'):
+            # (Kivy >= 2.1: the previous position is kept until then)
+            touch.dispatch_done()
+        if event_type == 'up':
+            del self._touches[touch_id]
+
+    def get_chains(self):
+        # -> sorted list of the chains of attached bricks (as strings)
+        return sorted(''.join(chain.symbols)
+                      for chain in self.game.chains.iter_chains()
+                      if len(chain) > 1)
+
+    def get_result(self):
+        return dict(chains=self.get_chains(), finished=self.game.finished)
+
+
+#
+# Helper functions
+
+def make_synthetic_scenario(harness, level, order, steps, rnd):
+    # -> scenario dict: the bricks of a dealt puzzle laid out in a pool
+    #    at the bottom of the board, and the touch events that build
+    #    the equalities in rows above it
+    game = harness.game
+    limits = DIFFICULTY_LEVEL_LIMITS[level - 1]
+    symbols = list(SymbolGenerator()(limits))
+    # (setting up the level to get the brick size)
+    harness.set_up_board(level, [(symbol, 0, 0) for symbol in symbols])
+    width, height = game.width, game.height
+    brick_width, brick_height = game.brick_width, game.brick_height
+    equalities = split_equalities(symbols, limits['equalities'])
+
+    bricks = []
+    x0 = 5
+    y0 = game.panel_height + 5
+    cols = max(1, int((width - 2 * x0) // (POOL_SPACING * brick_width)))
+    # (in random order, so that the bricks that were not moved as
+    # intended cannot happen to form the expected chains in the pool)
+    pool_places = list(range(len(symbols)))
+    rnd.shuffle(pool_places)
+    for symbol, place in zip(symbols, pool_places):
+        row, col = divmod(place, cols)
+        bricks.append((symbol,
+                       x0 + col * POOL_SPACING * brick_width,
+                       y0 + row * POOL_SPACING * brick_height))
+    pool_top = max(y for _, _, y in bricks) + brick_height
+    # (the equalities are built in rows above the pool -- as many of
+    # them in one row as fit, which matters for large boards)
+    equality_places = []
+    x = x0
+    y = pool_top + brick_height
+    for equality in equalities:
+        if x > x0 and x + len(equality) * brick_width > width - x0:
+            x = x0
+            y += ROW_SPACING * brick_height
+        equality_places.append((x, y))
+        x += (len(equality) + EQUALITY_SPACING) * brick_width
+    if y + brick_height > height:
+        raise ValueError('the board is too small for the scenario '
+                         '(the height of at least {0:.0f} is needed)'
+                         .format(y + brick_height))
+
+    events = []
+    touch_id = 0
+    i = 0
+    for equality, (row_x, row_y) in zip(equalities, equality_places):
+        places = list(range(len(equality)))
+        if order == 'shuffled':
+            rnd.shuffle(places)
+        for place in places:
+            _, x, y = bricks[i + place]
+            start = (x + brick_width / 2, y + brick_height / 2)
+            end = (row_x + (place + 0.5 + rnd.uniform(-DROP_JITTER,
+                                                      DROP_JITTER))
+                   * brick_width,
+                   row_y + (0.5 + rnd.uniform(-DROP_JITTER, DROP_JITTER))
+                   * brick_height)
+            touch_id += 1
+            events.append(('down', touch_id) + start)
+            for step in range(1, steps + 1):
+                events.append(
+                    ('move', touch_id) +
+                    tuple(a + (b - a) * step / steps
+                          for a, b in zip(start, end)))
+            events.append(('up', touch_id) + end)
+        i += len(equality)
+    expected = dict(chains=sorted(''.join(equality)
+                                  for equality in equalities),
+                    finished=True)
+    return dict(level=level,
+                size=[width, height],
+                bricks=bricks,
+                events=events,
+                expected=expected)
+
+
+def run_scenarios(harness, scenarios):
+    # -> list of (scenario, result) pairs
+    results = []
+    for scenario in scenarios:
+        harness.game.size = scenario['size']
+        harness.set_up_board(scenario['level'],
+                             [tuple(brick) for brick in scenario['bricks']])
+        harness.replay([tuple(event) for event in scenario['events']])
+        results.append((scenario, harness.get_result()))
+    return results
+
+
+def make_report(harness, results, total_time,
+                max_event_seconds=MAX_TOUCH_EVENT_SECONDS):
+    event_count = sum(len(latencies)
+                      for latencies in harness.latencies.values())
+    handlers = {}
+    for event_type, latencies in sorted(harness.latencies.items()):
+        latencies = sorted(latencies)
+        if not latencies:
+            continue
+        latency_ms = {
+            'p{0}'.format(percent): 1000 * percentile(latencies, percent)
+            for percent in REPORT_PERCENTILES}
+        latency_ms['max'] = 1000 * latencies[-1]
+        handlers[EVENT_TYPE_TO_HANDLER[event_type]] = dict(
+            events=len(latencies),
+            latency_ms=latency_ms)
+    failures = [
+        dict(game=i, expected=scenario['expected'], actual=result)
+        for i, (scenario, result) in enumerate(results)
+        if result != scenario['expected']]
+    # (the p99 latencies, not the maximum ones, are compared with the
+    # limit -- a single event may be delayed by, e.g., the garbage
+    # collector)
+    limit_ms = 1000 * max_event_seconds
+    over_limit = sorted(
+        handler for handler, entry in handlers.items()
+        if entry['latency_ms']['p99'] > limit_ms)
+    return dict(
+        python=platform.python_version(),
+        games=len(results),
+        events=event_count,
+        total_seconds=total_time,
+        events_per_second=event_count / total_time if total_time else None,
+        handlers=handlers,
+        failures=failures,
+        limit_ms=limit_ms,
+        over_limit=over_limit,
+    )
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description=('Replay touch streams against a headless '
+                     'ArithmeBricks board.'))
+    parser.add_argument(
+        '-n', '--games', type=int, default=DEFAULT_GAMES,
+        help='number of synthetic games (default: %(default)s)')
+    parser.add_argument(
+        '-l', '--level', type=int, default=DEFAULT_LEVEL,
+        choices=range(1, len(DIFFICULTY_LEVEL_LIMITS) + 1),
+        metavar='LEVEL',
+        help='level of the synthetic games (default: %(default)s)')
+    parser.add_argument(
+        '--order', choices=ORDERS, default=ORDERS[0],
+        help='order of putting bricks into their places (default: '
+             '%(default)s)')
+    parser.add_argument(
+        '--steps', type=int, default=DEFAULT_MOVE_STEPS,
+        help='number of move events per drag (default: %(default)s)')
+    parser.add_argument(
+        '--size', type=int, nargs=2, default=list(DEFAULT_BOARD_SIZE),
+        metavar=('WIDTH', 'HEIGHT'),
+        help='board size (default: %(default)s)')
+    parser.add_argument(
+        '-s', '--seed', type=int, default=DEFAULT_SEED,
+        help='random seed (default: %(default)s)')
+    parser.add_argument(
+        '--record',
+        help='file to save the synthetic scenarios (with the actual '
+             'results as the expected ones) to')
+    parser.add_argument(
+        '--replay',
+        help='file of recorded scenarios to replay (instead of '
+             'synthetic ones)')
+    parser.add_argument(
+        '--max-ms', type=float, default=1000 * MAX_TOUCH_EVENT_SECONDS,
+        help='upper limit on the p99 latency of each touch handler, in '
+             'milliseconds (default: %(default).1f)')
+    parser.add_argument(
+        '-o', '--output',
+        help='file to write the JSON report to (default: stdout)')
+    args = parser.parse_args(argv)
+
+    random.seed(args.seed)
+    if args.replay:
+        with open(args.replay) as f:
+            scenarios = json.load(f)
+        harness = ReplayHarness(scenarios[0]['size'] if scenarios
+                                else args.size)
+    else:
+        harness = ReplayHarness(args.size)
+        rnd = random.Random(args.seed)
+        scenarios = [make_synthetic_scenario(harness, args.level,
+                                             args.order, args.steps, rnd)
+                     for _ in range(args.games)]
+        harness.latencies = {event_type: [] for event_type in
+                             EVENT_TYPE_TO_HANDLER}
+
+    start_time = timeit.default_timer()
+    results = run_scenarios(harness, scenarios)
+    total_time = timeit.default_timer() - start_time
+    report = make_report(harness, results, total_time,
+                         max_event_seconds=args.max_ms / 1000)
+
+    if args.record:
+        recorded = [dict(scenario, expected=result)
+                    for scenario, result in results]
+        with open(args.record, 'w') as f:
+            json.dump(recorded, f, indent=1, sort_keys=True)
+    report_json = json.dumps(report, indent=2, sort_keys=True)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(report_json + '\n')
+    else:
+        sys.stdout.write(report_json + '\n')
+    for failure in report['failures']:
+        sys.stderr.write('FAILURE: game {0}: expected {1}, got {2}\n'.format(
+            failure['game'], failure['expected'], failure['actual']))
+    for handler in report['over_limit']:
+        sys.stderr.write('OVER LIMIT: {0}: p99 latency {1:.1f} ms > '
+                         '{2:.1f} ms\n'.format(
+                             handler,
+                             report['handlers'][handler]['latency_ms']['p99'],
+                             report['limit_ms']))
+    return 1 if report['failures'] or report['over_limit'] else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,693 @@
+# -*- coding: utf-8 -*-
+
+"""
+ArithmeBricks -- exhaustive puzzle solver (no Kivy dependency)
+
+Copyright (c) 2014 Jan Kaliszewski (zuo). All rights reserved.
+
+Licensed under GPL-3 (see the *LICENSE* file for details).
+
+Given a multiset of brick symbols and the number of equalities, the
+solver finds every set of valid equalities (in the sense of
+`expressions.is_equality()`) that uses all the bricks and can be
+built on the board -- where an operator brick can only be attached to
+a digit brick, so no two operators can be adjacent (then a unary sign
+can only begin an equality).  An equality is a tuple of symbols, a
+solution is a sorted tuple of equalities.
+
+The search is a backtracking over the symbol counts (so bricks bearing
+the same symbol are never tried in different orders), with:
+
+* lazy generation -- of the partitions of the symbols, of the
+  equalities and of the numbers that can be made of the remaining
+  digits -- so that the search can stop at any moment;
+* memoization, in LRU caches of bounded sizes -- of the dead ends
+  (states of a partially built equality, or multisets of the remaining
+  symbols, that lead to no solution) and of the tables used by pruning;
+* incremental evaluation of the expression being built (no symbol
+  sequence is evaluated twice);
+* pruning: a part of the symbols made of digits, '+' and '-' only is
+  rejected at once if its digits cannot be divided into two groups of
+  sums equal modulo 9 (as each number is congruent to the sum of its
+  digits); and a side of an equality is abandoned as soon as its value
+  cannot be made equal to the value of the first side (no expression
+  made of some digits can be, in absolute value, greater than the
+  largest number those digits can form; and for the last few symbols
+  all the possible endings of a side are known in advance).
+
+The number of solutions grows quickly with the number of symbols (each
+of the equalities can usually be rearranged in many ways), so, for the
+top levels, the search should be limited: `Solver` accepts
+`max_solutions` and `time_limit`, and can be cancelled (from another
+thread) with `cancel()`; then `Solver.complete` tells whether all the
+solutions have been found.
+"""
+
+from __future__ import division, unicode_literals
+
+import argparse
+import itertools
+import re
+import sys
+import timeit
+
+from engine import DIFFICULTY_LEVEL_LIMITS, SYMBOLS, SymbolGenerator
+from expressions import ADDITIVE_OPS, EQUALITY_OP, LRUCache, divide
+
+
+#
+# Constants
+
+DIGIT_INDICES = tuple(range(10))
+PLUS_INDEX = SYMBOLS.index('+')
+MINUS_INDEX = SYMBOLS.index('-')
+MUL_INDEX = SYMBOLS.index('*')
+DIV_INDEX = SYMBOLS.index('/')
+EQUALITY_INDEX = SYMBOLS.index(EQUALITY_OP)
+
+SYMBOL_TO_INDEX = {symbol: i for i, symbol in enumerate(SYMBOLS)}
+
+# (for how many remaining symbols at most all the possible endings of
+# a side -- such as '*5+2*3-4' -- are examined in advance, to check
+# whether the side can still be completed, before going into details)
+ENDING_TABLE_MAX_SYMBOLS = 7
+
+# (the maximum number of entries in each of the solver's caches)
+SOLVER_CACHE_SIZE = 20000
+
+# (for how many remaining symbols at most the completions of a partially
+# built equality are cached -- not only whether there are any)
+SUFFIX_CACHE_MAX_SYMBOLS = 8
+
+# (every how many search steps the time limit and the cancellation
+# are checked)
+BUDGET_CHECK_INTERVAL = 256
+
+# (the kinds of states of a partially built equality)
+OPERAND_STATE = 'operand'
+OPERATOR_STATE = 'operator'
+
+
+#
+# Helper classes
+
+class Solver(object):
+
+    # The search is done in two stages:
+    #
+    # * the symbols are partitioned into parts, one per equality (the
+    #   parts are enumerated in a canonical order -- from the smallest
+    #   one -- so that each partition is found once);
+    # * for each part, the equalities that use exactly its symbols are
+    #   generated (see `_iter_equalities()`) -- unless the rest of the
+    #   partition turned out to be impossible.
+    #
+    # Everything is generated lazily (so that the search can stop as
+    # soon as `max_solutions` are found); what is remembered -- in LRU
+    # caches of bounded sizes -- are the dead ends (the states of the
+    # search that lead to no solution) and the tables used by pruning.
+
+    class _OutOfBudget(Exception):
+        pass
+
+    def __init__(self, symbols, equalities, max_solutions=None,
+                 time_limit=None, cache_size=SOLVER_CACHE_SIZE):
+        # (`time_limit` -- in seconds, from the start of `solve()`)
+        self.symbols = list(symbols)
+        self.equalities = equalities
+        self.max_solutions = max_solutions
+        self.time_limit = time_limit
+        # (set by `solve()`: whether the solutions found are all there
+        # are -- false if the search was stopped by a limit or by
+        # `cancel()`)
+        self.complete = None
+        self._cancelled = False
+        self._deadline = None
+        self._steps = 0
+        self._dead_ends = LRUCache(cache_size)
+        self._suffix_cache = LRUCache(cache_size)
+        self._feasibility_cache = LRUCache(cache_size)
+        self._max_number_cache = LRUCache(cache_size)
+        self._factor_cache = LRUCache(cache_size)
+        self._term_cache = LRUCache(cache_size)
+        self._tail_value_cache = LRUCache(cache_size)
+        self._ending_cache = LRUCache(cache_size)
+
+    def solve(self):
+        # -> sorted list of solutions (see also `complete`)
+        self.complete = False
+        if self.time_limit is not None:
+            self._deadline = _timer() + self.time_limit
+        counts = count_symbols(self.symbols)
+        solutions = set()
+        if counts[EQUALITY_INDEX] >= self.equalities:
+            try:
+                for solution in self._iter_solutions(counts,
+                                                     self.equalities, ()):
+                    solutions.add(solution)
+                    if (self.max_solutions is not None and
+                          len(solutions) >= self.max_solutions):
+                        break
+                else:
+                    self.complete = True
+            except self._OutOfBudget:
+                pass
+        else:
+            self.complete = True
+        return sorted(solutions)
+
+    def cancel(self):
+        # (can be called from another thread: then `solve()` returns
+        # soon, with the solutions found so far)
+        self._cancelled = True
+
+    def _step(self):
+        self._steps += 1
+        if not self._steps % BUDGET_CHECK_INTERVAL and (
+                self._cancelled or
+                (self._deadline is not None and
+                   _timer() >= self._deadline)):
+            raise self._OutOfBudget
+
+    def _iter_solutions(self, counts, equalities, min_part_key):
+        # -> solutions for the given remaining symbols, such that all
+        #    their parts are not "smaller" than `min_part_key` (note
+        #    that some of them may be generated more than once)
+        if equalities == 1:
+            if (_get_part_key(counts) >= min_part_key and
+                  _could_be_equality(counts)):
+                for equality in self._iter_equalities(counts):
+                    yield (equality,)
+            return
+        for part in self._iter_parts(counts, equalities, min_part_key):
+            rest = tuple(a - b for a, b in zip(counts, part))
+            part_key = _get_part_key(part)
+            if not self._has_solutions(rest, equalities - 1, part_key):
+                continue
+            for equality in self._iter_equalities(part):
+                for sub_solution in self._iter_solutions(
+                        rest, equalities - 1, part_key):
+                    yield tuple(sorted(sub_solution + (equality,)))
+
+    def _has_solutions(self, counts, equalities, min_part_key):
+        key = ('solutions', counts, equalities, min_part_key)
+        result = self._feasibility_cache.get(key)
+        if result is None:
+            result = next(self._iter_solutions(counts, equalities,
+                                               min_part_key),
+                          None) is not None
+            self._feasibility_cache.set(key, result)
+        return result
+
+    def _has_equalities(self, counts):
+        key = ('equalities', counts)
+        result = self._feasibility_cache.get(key)
+        if result is None:
+            result = next(self._iter_equalities(counts), None) is not None
+            self._feasibility_cache.set(key, result)
+        return result
+
+    def _iter_parts(self, counts, equalities, min_part_key):
+        # -> candidate parts (for the smallest of the equalities)
+        max_size = sum(counts) // equalities
+        equality_num = counts[EQUALITY_INDEX]
+        for part in _iter_sub_counts(list(counts), 0, max_size):
+            self._step()
+            if (1 <= part[EQUALITY_INDEX] <=
+                    equality_num - (equalities - 1) and
+                  _get_part_key(part) >= min_part_key and
+                  _could_be_equality(part) and
+                  self._has_equalities(part)):
+                yield part
+
+    def _iter_equalities(self, counts):
+        # -> the (distinct) equalities made of exactly the given symbols
+        # Only the equalities whose first side is not longer than the
+        # other ones are searched for -- the rest of them are obtained
+        # by reordering the sides.
+        side_num = counts[EQUALITY_INDEX] + 1
+        max_first_len = (sum(counts) - side_num + 1) // side_num
+        seen = set()
+        for equality in self._iter_operand_suffixes(
+                counts, max_first_len, None, 0, None, None, None):
+            sides = tuple(_split_sides(equality))
+            for reordered_sides in itertools.permutations(sides):
+                # (a sign can only begin the whole equality)
+                if not any(side[0] in ADDITIVE_OPS
+                           for side in reordered_sides[1:]):
+                    equality = _join_sides(reordered_sides)
+                    if equality not in seen:
+                        seen.add(equality)
+                        yield equality
+
+    # The two mutually recursive methods below generate symbol sequences
+    # (tuples) that complete the equality being built, using all the
+    # symbols whose counts are given.  The arguments describe the state
+    # of the search:
+    #
+    # * `max_len` -- the number of symbols the first side can still
+    #   take (None when the first side is complete);
+    # * `target` -- the value of the first side (None while the first
+    #   side is being built; 0 if no more sides can follow, as then it
+    #   is not needed any more);
+    # * `total` -- the sum of the completed terms of the current side
+    #   (minus `target` -- except for the first side, of course);
+    # * `term` -- the value of the current term (already multiplied by
+    #   the sign of the term; None if there is no term yet);
+    # * `mul_op` -- the pending multiplicative operator (symbol index);
+    # * `sign` -- the sign of the operand (None at the beginning of a
+    #   side, where a unary sign may be placed).
+    #
+    # For a state with few symbols left all its suffixes are remembered;
+    # for any other one -- only whether it is a dead end (i.e., nothing
+    # was generated for it, after it was examined completely).
+
+    def _iter_operand_suffixes(self, counts, max_len,
+                               target, total, term, mul_op, sign):
+        if target and not counts[EQUALITY_INDEX]:
+            target = 0
+        key = (OPERAND_STATE, counts, max_len,
+               target, total, term, mul_op, sign)
+        return self._iter_suffixes(key, counts, self._gen_operand_suffixes,
+                                   (counts, max_len, target, total, term,
+                                    mul_op, sign))
+
+    def _iter_operator_suffixes(self, counts, max_len, target, total, term):
+        if target and not counts[EQUALITY_INDEX]:
+            target = 0
+        key = (OPERATOR_STATE, counts, max_len, target, total, term)
+        return self._iter_suffixes(key, counts, self._gen_operator_suffixes,
+                                   (counts, max_len, target, total, term))
+
+    def _iter_suffixes(self, key, counts, gen_suffixes, args):
+        if sum(counts) <= SUFFIX_CACHE_MAX_SYMBOLS:
+            suffixes = self._suffix_cache.get(key)
+            if suffixes is None:
+                suffixes = list(gen_suffixes(*args))
+                self._suffix_cache.set(key, suffixes)
+            return iter(suffixes)
+        if self._dead_ends.get(key):
+            return iter(())
+        return self._iter_unless_dead_end(key, gen_suffixes(*args))
+
+    def _iter_unless_dead_end(self, key, suffixes):
+        found = False
+        for suffix in suffixes:
+            found = True
+            yield suffix
+        if not found:
+            self._dead_ends.set(key, True)
+
+    def _gen_operand_suffixes(self, counts, max_len,
+                              target, total, term, mul_op, sign):
+        self._step()
+        if ((max_len is None or max_len >= 1) and
+              any(counts[i] for i in DIGIT_INDICES)):
+            if sign is None:
+                sign = 1
+                for op_index, op_sign in ((PLUS_INDEX, 1),
+                                          (MINUS_INDEX, -1)):
+                    if counts[op_index] and max_len != 1:
+                        op_symbol = SYMBOLS[op_index]
+                        for suffix in self._iter_operand_suffixes(
+                                _take(counts, op_index),
+                                _shorten(max_len, 1),
+                                target, total, term, mul_op, op_sign):
+                            yield (op_symbol,) + suffix
+            max_number = self._get_max_operand(counts, target, total,
+                                               term, mul_op)
+            for digits, number, rest in _iter_numbers(counts, max_len,
+                                                      max_number):
+                operand = sign * number
+                if term is None:
+                    new_term = operand
+                elif mul_op == MUL_INDEX:
+                    new_term = term * operand
+                elif operand:
+                    new_term = divide(term, operand)
+                else:
+                    continue
+                for suffix in self._iter_operator_suffixes(
+                        rest, _shorten(max_len, len(digits)),
+                        target, total, new_term):
+                    yield digits + suffix
+
+    def _gen_operator_suffixes(self, counts, max_len, target, total, term):
+        self._step()
+        value = total + term
+        digit_num = sum(counts[i] for i in DIGIT_INDICES)
+        if target is not None:
+            if value == 0:
+                if not any(counts):
+                    yield ()
+                    return
+            elif not (self._can_reach(counts, -value, term, digit_num) and
+                      self._could_end(counts, total, term)):
+                return
+        if not digit_num:
+            return
+        next_max_len = _shorten(max_len, 1)
+        # (the current term continues)
+        for op_index in (MUL_INDEX, DIV_INDEX):
+            if counts[op_index]:
+                op_symbol = SYMBOLS[op_index]
+                for suffix in self._iter_operand_suffixes(
+                        _take(counts, op_index), next_max_len,
+                        target, total, term, op_index, 1):
+                    yield (op_symbol,) + suffix
+        # (a new term begins)
+        for op_index, op_sign in ((PLUS_INDEX, 1), (MINUS_INDEX, -1)):
+            if counts[op_index]:
+                op_symbol = SYMBOLS[op_index]
+                for suffix in self._iter_operand_suffixes(
+                        _take(counts, op_index), next_max_len,
+                        target, value, None, None, op_sign):
+                    yield (op_symbol,) + suffix
+        # (a new side begins)
+        if counts[EQUALITY_INDEX] and (target is None or value == 0):
+            if target is None:
+                target = value
+            for suffix in self._iter_operand_suffixes(
+                    _take(counts, EQUALITY_INDEX), None,
+                    target, -target, None, None, None):
+                yield (EQUALITY_OP,) + suffix
+
+    def _get_max_operand(self, counts, target, total, term, mul_op):
+        # -> the greatest number that can still be the operand, or None
+        #    if it is not known -- when no more '*' and '/' follow, the
+        #    absolute value of the term (made by adding/multiplying by
+        #    the operand) must not be greater than the absolute value of
+        #    `total` plus what the rest of the side can compensate (no
+        #    more than the largest number the digits can form)
+        if (target is None or counts[MUL_INDEX] or counts[DIV_INDEX] or
+              mul_op == DIV_INDEX):
+            return None
+        limit = abs(total) + self._get_max_number(counts)
+        if term is None:
+            return limit
+        if term:
+            return int(limit / abs(term))
+        return None
+
+    def _can_reach(self, counts, difference, term, digit_num):
+        # can the current side's value still change by `difference`?
+        if not digit_num:
+            return False
+        max_number = self._get_max_number(counts)
+        reach = 0
+        if counts[MUL_INDEX] or counts[DIV_INDEX]:
+            reach += abs(term) * (max_number + 1)
+        if counts[PLUS_INDEX] or counts[MINUS_INDEX]:
+            reach += max_number
+        return abs(difference) <= reach
+
+    def _could_end(self, counts, total, term):
+        # can the remaining symbols make the current side's value 0?
+        if (counts[EQUALITY_INDEX] or
+              sum(counts) > ENDING_TABLE_MAX_SYMBOLS):
+            return True
+        for multiplier, tail_values in self._get_endings(counts).items():
+            if -(total + term * multiplier) in tail_values:
+                return True
+        return False
+
+    def _get_endings(self, counts):
+        # -> dict that maps the multipliers the current term can still
+        #    get (by '*' or '/') to the sets of values of the tails that
+        #    can follow (made of the rest of the given symbols)
+        endings = self._ending_cache.get(counts)
+        if endings is None:
+            endings = {}
+            endings[1] = (self._get_tail_values(counts) if any(counts)
+                          else set([0]))
+            for op_index in (MUL_INDEX, DIV_INDEX):
+                if not counts[op_index]:
+                    continue
+                for factor, rest in self._get_factors(
+                        _take(counts, op_index)):
+                    if op_index == MUL_INDEX:
+                        multiplier = factor
+                    elif factor:
+                        multiplier = divide(1, factor)
+                    else:
+                        continue
+                    for sub_multiplier, tail_values in (
+                            self._get_endings(rest).items()):
+                        endings.setdefault(
+                            multiplier * sub_multiplier,
+                            set()).update(tail_values)
+            self._ending_cache.set(counts, endings)
+        return endings
+
+    def _get_tail_values(self, counts):
+        # -> set of values of the tails made of exactly the given symbols
+        values = self._tail_value_cache.get(counts)
+        if values is None:
+            values = set()
+            for op_index, op_sign in ((PLUS_INDEX, 1), (MINUS_INDEX, -1)):
+                if counts[op_index]:
+                    for term, rest in self._get_terms(
+                            _take(counts, op_index)):
+                        if not any(rest):
+                            values.add(op_sign * term)
+                        else:
+                            values.update(
+                                op_sign * term + tail
+                                for tail in self._get_tail_values(rest))
+            self._tail_value_cache.set(counts, values)
+        return values
+
+    def _get_terms(self, counts):
+        # -> list of (<value>, <remaining counts>) for
+        #    all terms that can be made of the given symbols
+        terms = self._term_cache.get(counts)
+        if terms is None:
+            terms = []
+            for factor, rest in self._get_factors(counts):
+                self._collect_terms(terms, factor, rest)
+            self._term_cache.set(counts, terms)
+        return terms
+
+    def _collect_terms(self, terms, term, counts):
+        terms.append((term, counts))
+        for op_index in (MUL_INDEX, DIV_INDEX):
+            if counts[op_index]:
+                for factor, rest in self._get_factors(
+                        _take(counts, op_index)):
+                    if op_index == MUL_INDEX:
+                        self._collect_terms(terms, term * factor, rest)
+                    elif factor:
+                        self._collect_terms(terms,
+                                            divide(term, factor), rest)
+
+    def _get_factors(self, counts):
+        # -> list of (<value>, <remaining counts>) for
+        #    all numbers that can be made of the given symbols
+        factors = self._factor_cache.get(counts)
+        if factors is None:
+            factors = [(number, rest)
+                       for _, number, rest in _iter_numbers(counts)]
+            self._factor_cache.set(counts, factors)
+        return factors
+
+    def _get_max_number(self, counts):
+        # the largest number that can be made of the remaining digits
+        digit_counts = counts[:10]
+        max_number = self._max_number_cache.get(digit_counts)
+        if max_number is None:
+            max_number = int(''.join(
+                SYMBOLS[digit] * digit_counts[digit]
+                for digit in reversed(DIGIT_INDICES)) or '0')
+            self._max_number_cache.set(digit_counts, max_number)
+        return max_number
+
+
+#
+# Helper functions
+
+def count_symbols(symbols):
+    # -> tuple of the numbers of occurrences of `SYMBOLS`
+    counts = [0] * len(SYMBOLS)
+    for symbol in symbols:
+        counts[SYMBOL_TO_INDEX[symbol]] += 1
+    return tuple(counts)
+
+
+def _shorten(max_len, symbol_num):
+    return max_len - symbol_num if max_len is not None else None
+
+
+def _get_part_key(counts):
+    # (defines the order in which the parts are enumerated)
+    return (sum(counts), counts)
+
+
+def _iter_sub_counts(counts, index, max_size):
+    # -> all sub-multisets (as count tuples) of at most `max_size` symbols
+    if index == len(counts):
+        yield ()
+        return
+    for count in range(min(counts[index], max_size) + 1):
+        for rest in _iter_sub_counts(counts, index + 1, max_size - count):
+            yield (count,) + rest
+
+
+def _could_be_equality(counts):
+    # (cheap necessary conditions: every side needs a number, and
+    # every '*' and '/' needs one more; and, if there are no '*' and
+    # '/', the digit sums must allow for the equality modulo 9 -- see
+    # `_could_balance_modulo_9()`)
+    digit_num = sum(counts[i] for i in DIGIT_INDICES)
+    if digit_num < (counts[EQUALITY_INDEX] + 1 +
+                    counts[MUL_INDEX] + counts[DIV_INDEX]):
+        return False
+    if counts[MUL_INDEX] or counts[DIV_INDEX]:
+        return True
+    return _could_balance_modulo_9(counts[:10])
+
+
+def _could_balance_modulo_9(digit_counts):
+    # With '+' and '-' only, an equality means that the numbers added
+    # (on the left side, or subtracted on the right one) sum up to the
+    # same value as the rest of them; and, as each number is congruent
+    # to the sum of its digits modulo 9, whatever their order is, the
+    # digits must be divisible into two groups whose sums are equal
+    # modulo 9, i.e., some group must sum up to (total * 5) mod 9
+    # (5 being the inverse of 2 modulo 9).
+    wanted = 5 * sum(digit * count
+                     for digit, count in enumerate(digit_counts)) % 9
+    residues = set([0])
+    for digit, count in enumerate(digit_counts):
+        for i in range(min(count, 9)):
+            residues.update([(residue + digit) % 9
+                             for residue in residues])
+    return wanted in residues
+
+
+def _iter_numbers(counts, max_len=None, max_value=None):
+    # -> (<digit symbols>, <number>, <remaining counts>) for all numbers
+    #    that can be made of the available digits (and are not longer
+    #    than `max_len` and not greater than `max_value`, if specified)
+    #    -- generated lazily, as there may be lots of them
+    digit_counts = list(counts[:10])
+    other_counts = counts[10:]
+    if max_len is None:
+        max_len = sum(digit_counts)
+    for item in _collect_numbers(digit_counts, (), 0, max_len, max_value,
+                                 other_counts):
+        yield item
+
+
+def _collect_numbers(digit_counts, digits, value, max_len, max_value,
+                     other_counts):
+    if len(digits) >= max_len:
+        return
+    for digit in DIGIT_INDICES:
+        if not digit_counts[digit]:
+            continue
+        if digits and digits[0] == '0' and digit != 0:
+            # (no leading zeros in non-zero numbers)
+            break
+        new_value = value * 10 + digit
+        if max_value is not None and new_value > max_value:
+            # (the next digits, as well as any longer numbers, would
+            # give even greater values)
+            break
+        digit_counts[digit] -= 1
+        new_digits = digits + (SYMBOLS[digit],)
+        yield new_digits, new_value, tuple(digit_counts) + other_counts
+        for item in _collect_numbers(digit_counts, new_digits, new_value,
+                                     max_len, max_value, other_counts):
+            yield item
+        digit_counts[digit] += 1
+
+
+def _split_sides(equality):
+    side = []
+    for symbol in equality:
+        if symbol == EQUALITY_OP:
+            yield tuple(side)
+            side = []
+        else:
+            side.append(symbol)
+    yield tuple(side)
+
+
+def _join_sides(sides):
+    equality = list(sides[0])
+    for side in sides[1:]:
+        equality.append(EQUALITY_OP)
+        equality.extend(side)
+    return tuple(equality)
+
+
+def _take(counts, index):
+    # -> `counts` with one symbol of the given index less
+    return counts[:index] + (counts[index] - 1,) + counts[index+1:]
+
+
+def solve(symbols, equalities, **kwargs):
+    return Solver(symbols, equalities, **kwargs).solve()
+
+
+def parse_symbols(text):
+    return re.findall(r'==|[0-9+*/-]', text)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description='Find all solutions of ArithmeBricks puzzles.')
+    parser.add_argument(
+        'puzzles', nargs='*', metavar='PUZZLE',
+        help="puzzle symbols, e.g. '12+3==15' (in any order)")
+    parser.add_argument(
+        '-e', '--equalities', type=int, default=None,
+        help="number of equalities (default: the number of '==')")
+    parser.add_argument(
+        '-l', '--level', type=int,
+        choices=range(1, len(DIFFICULTY_LEVEL_LIMITS) + 1),
+        metavar='LEVEL',
+        help='solve puzzles generated for the given level')
+    parser.add_argument(
+        '-n', '--count', type=int, default=10,
+        help='number of puzzles to generate (default: %(default)s)')
+    parser.add_argument(
+        '-m', '--max-solutions', type=int, default=None,
+        help='stop after finding that many solutions of a puzzle')
+    parser.add_argument(
+        '-t', '--time-limit', type=float, default=None,
+        help='stop solving a puzzle after that many seconds')
+    parser.add_argument(
+        '-q', '--quiet', action='store_true',
+        help='print only the numbers of solutions')
+    args = parser.parse_args(argv)
+    puzzles = [parse_symbols(text) for text in args.puzzles]
+    if args.level is not None:
+        limits = DIFFICULTY_LEVEL_LIMITS[args.level - 1]
+        symbol_generator = SymbolGenerator()
+        puzzles.extend(list(symbol_generator(limits))
+                       for i in range(args.count))
+    for symbols in puzzles:
+        equalities = args.equalities or symbols.count(EQUALITY_OP)
+        solver = Solver(symbols, equalities,
+                        max_solutions=args.max_solutions,
+                        time_limit=args.time_limit)
+        start_time = _timer()
+        solutions = solver.solve()
+        elapsed = _timer() - start_time
+        sys.stdout.write('{0}: {1}{2} solution(s) [{3:.1f} ms]\n'.format(
+            ''.join(symbols), len(solutions),
+            '' if solver.complete else ' (or more)',
+            1000 * elapsed))
+        if not args.quiet:
+            for solution in solutions:
+                sys.stdout.write('    {0}\n'.format(
+                    '   '.join(''.join(equality) for equality in solution)))
+    return 0
+
+
+_timer = timeit.default_timer
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,203 @@
+# -*- coding: utf-8 -*-
+
+"""
+ArithmeBricks -- startup instrumentation and precompiled kv rules
+
+Copyright (c) 2014 Jan Kaliszewski (zuo). All rights reserved.
+
+Licensed under GPL-3 (see the *LICENSE* file for details).
+
+`StartupTimer` records the wall time of the startup phases (imports,
+Config, kv rules, sounds, building the game, the first frame); the
+report is logged and appended to a log file, one line per launch.
+
+`load_kv_rules()` loads a kv file like `Builder.load_file()` does, but
+it keeps the parsed rules -- with their expressions already compiled --
+in a cache file, so that the next launches do not parse the kv file
+again (the cache is keyed by the kv file content as well as by the
+Kivy and Python versions, so any change of them invalidates it).  Only
+files consisting of rules and dynamic classes are cached; any other
+file is just loaded with `Builder.load_file()` -- and so is every file
+if the Kivy internals the cached rules are installed with are missing
+(e.g., after a Kivy upgrade).
+"""
+
+from __future__ import division, unicode_literals
+
+import contextlib
+import glob
+import hashlib
+import marshal
+import os
+import pickle
+import sys
+import time
+import timeit
+import types
+
+try:
+    import copyreg
+except ImportError:  # Python 2
+    import copy_reg as copyreg
+
+import kivy
+from kivy.factory import Factory
+from kivy.lang import Builder, Parser
+
+
+#
+# Constants
+
+STARTUP_LOG_FILENAME = 'startup.log'
+
+KV_CACHE_FILENAME_PATTERN = 'kvcache-{0}.pickle'
+
+# (the `Builder` and `Parser` internals `load_kv_rules()` relies on)
+KV_BUILDER_INTERNALS = ('rules', 'files', '_clear_matchcache')
+KV_PARSER_INTERNALS = ('execute_directives',)
+
+
+#
+# Helper classes
+
+class StartupTimer(object):
+
+    def __init__(self, start_time=None):
+        self.start_time = (timeit.default_timer() if start_time is None
+                           else start_time)
+        self.phases = []          # (list of pairs: name, seconds)
+        self.notes = {}           # (phase name -> short remark)
+        self._last_time = self.start_time
+
+    @contextlib.contextmanager
+    def phase(self, name):
+        start = timeit.default_timer()
+        try:
+            yield
+        finally:
+            self._add(name, start)
+
+    def mark(self, name):
+        # (records a phase that lasted since the previous one ended)
+        self._add(name, self._last_time)
+
+    def note(self, name, remark):
+        self.notes[name] = remark
+
+    @property
+    def total(self):
+        return self._last_time - self.start_time
+
+    def format_report(self):
+        parts = []
+        for name, seconds in self.phases:
+            remark = self.notes.get(name)
+            parts.append('{0} {1:.3f}s{2}'.format(
+                name, seconds, ' ({0})'.format(remark) if remark else ''))
+        return '{0}; total {1:.3f}s'.format(', '.join(parts), self.total)
+
+    def write_log(self, filename):
+        # (failures are ignored -- it is just a diagnostic aid)
+        line = '{0} {1}\n'.format(time.strftime('%Y-%m-%d %H:%M:%S'),
+                                  self.format_report())
+        try:
+            with open(filename, 'a') as f:
+                f.write(line)
+        except (IOError, OSError):
+            pass
+
+    def _add(self, name, start):
+        end = timeit.default_timer()
+        self.phases.append((name, end - start))
+        self._last_time = max(self._last_time, end)
+
+
+#
+# Helper functions
+
+def load_kv_rules(filename, cache_dir):
+    # -> True if the rules were loaded from the cache
+    if not _can_install_rules():
+        Builder.load_file(filename)
+        return False
+    with open(filename, 'rb') as f:
+        content = f.read()
+    cache_filename = os.path.join(
+        cache_dir, KV_CACHE_FILENAME_PATTERN.format(
+            _get_kv_cache_key(content)))
+    parser = _read_kv_cache(cache_filename)
+    from_cache = parser is not None
+    if not from_cache:
+        parser = Parser(content=content.decode('utf-8'), filename=filename)
+        if parser.root is not None or parser.templates:
+            # (not supported here, so just the regular way)
+            Builder.load_file(filename)
+            return False
+        _write_kv_cache(cache_filename, parser)
+    else:
+        # (the `#:` directives, such as imports, need to take effect)
+        parser.execute_directives()
+    Builder.rules.extend(parser.rules)
+    Builder._clear_matchcache()
+    for name, baseclasses in parser.dynamic_classes.items():
+        Factory.register(name, baseclasses=baseclasses, filename=filename)
+    if parser.rules or parser.dynamic_classes:
+        Builder.files.append(filename)
+    return from_cache
+
+
+def _can_install_rules():
+    return (all(hasattr(Builder, name) for name in KV_BUILDER_INTERNALS) and
+            all(hasattr(Parser, name) for name in KV_PARSER_INTERNALS))
+
+
+def _get_kv_cache_key(content):
+    # (compiled code is specific to the Python version, and the parsed
+    # structure -- to the Kivy version)
+    digest = hashlib.md5(content)
+    digest.update(repr((kivy.__version__, sys.version)).encode('utf-8'))
+    return digest.hexdigest()[:16]
+
+
+def _read_kv_cache(cache_filename):
+    # -> kivy.lang.Parser instance (or None if no usable cache)
+    try:
+        with open(cache_filename, 'rb') as f:
+            parser = pickle.load(f)
+    except Exception:
+        # (missing, damaged or incompatible -- to be made again)
+        return None
+    return parser if isinstance(parser, Parser) else None
+
+
+def _write_kv_cache(cache_filename, parser):
+    # (stale cache files are removed; failures are ignored)
+    pattern = os.path.join(os.path.dirname(cache_filename),
+                           KV_CACHE_FILENAME_PATTERN.format('*'))
+    temp_filename = cache_filename + '.tmp'
+    try:
+        for stale_filename in glob.glob(pattern):
+            os.remove(stale_filename)
+        with open(temp_filename, 'wb') as f:
+            pickler = pickle.Pickler(f, pickle.HIGHEST_PROTOCOL)
+            # (a dispatch table of its own, not to change how code
+            # objects are pickled elsewhere in the process; note: with
+            # no support for that, as in Python 2, pickling the code
+            # objects just fails -- and there is no cache)
+            pickler.dispatch_table = _KV_CACHE_DISPATCH_TABLE
+            pickler.dump(parser)
+        os.rename(temp_filename, cache_filename)
+    except Exception:
+        try:
+            os.remove(temp_filename)
+        except OSError:
+            pass
+
+
+def _reduce_code(code):
+    return marshal.loads, (marshal.dumps(code),)
+
+
+# (kv rule expressions are compiled code objects)
+_KV_CACHE_DISPATCH_TABLE = copyreg.dispatch_table.copy()
+_KV_CACHE_DISPATCH_TABLE[types.CodeType] = _reduce_code
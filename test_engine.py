@@ -0,0 +1,136 @@
+# -*- coding: utf-8 -*-
+
+"""
+ArithmeBricks -- tests of the puzzle generator
+
+Copyright (c) 2014 Jan Kaliszewski (zuo). All rights reserved.
+
+Licensed under GPL-3 (see the *LICENSE* file for details).
+
+The contract of the generation budget of `engine.SymbolGenerator`
+(the deadline is honoured, a puzzle taken because of it is flagged --
+and still valid) and the divisor tables of `engine.OperandTables`.
+
+Run with: python -m unittest test_engine (or with pytest).
+"""
+
+from __future__ import division, unicode_literals
+
+import random
+import timeit
+import unittest
+
+from engine import (
+    DIFFICULTY_LEVEL_LIMITS,
+    MAX_PUZZLE_SECONDS,
+    OperandTables,
+    SymbolGenerator,
+)
+from hints import split_equalities
+
+
+#
+# Constants
+
+SEED = 12345
+
+PUZZLES_PER_LEVEL = 50
+
+# (a budget short enough to be used up often)
+TINY_BUDGET = 0.0005
+
+
+#
+# Tests
+
+class BudgetTest(unittest.TestCase):
+
+    def setUp(self):
+        random.seed(SEED)
+
+    def test_deadline_is_honoured(self):
+        symbol_generator = SymbolGenerator(budget=TINY_BUDGET)
+        for level, limits in enumerate(DIFFICULTY_LEVEL_LIMITS, 1):
+            for i in range(PUZZLES_PER_LEVEL):
+                start_time = _timer()
+                symbols = list(symbol_generator(limits))
+                elapsed = _timer() - start_time
+                self.assertLess(elapsed, MAX_PUZZLE_SECONDS,
+                                'level {0}'.format(level))
+                self._check_puzzle(symbols, limits, level)
+
+    def test_over_budget_is_flagged(self):
+        symbol_generator = SymbolGenerator()
+        for level, limits in enumerate(DIFFICULTY_LEVEL_LIMITS, 1):
+            flagged = 0
+            for i in range(PUZZLES_PER_LEVEL):
+                # (the deadline has already passed)
+                symbols = list(symbol_generator(limits, deadline=0))
+                if symbol_generator.over_budget:
+                    flagged += 1
+                self._check_puzzle(symbols, limits, level)
+            counts = symbol_generator.stats.get_level(limits).counts
+            self.assertEqual(counts['over_budget'], flagged,
+                             'level {0}'.format(level))
+        self.assertTrue(any(
+            symbol_generator.stats.get_level(limits).counts['over_budget']
+            for limits in DIFFICULTY_LEVEL_LIMITS))
+
+    def test_no_budget(self):
+        symbol_generator = SymbolGenerator(budget=None)
+        for level, limits in enumerate(DIFFICULTY_LEVEL_LIMITS, 1):
+            for i in range(PUZZLES_PER_LEVEL):
+                symbols = list(symbol_generator(limits))
+                self.assertFalse(symbol_generator.over_budget)
+                self._check_puzzle(symbols, limits, level)
+            counts = symbol_generator.stats.get_level(limits).counts
+            self.assertEqual(counts['over_budget'], 0)
+
+    def _check_puzzle(self, symbols, limits, level):
+        msg = 'level {0}: {1}'.format(level, ''.join(symbols))
+        self.assertIsNotNone(split_equalities(symbols, limits['equalities']),
+                             msg)
+        for symbol in symbols:
+            self.assertTrue(symbol.isdigit() or symbol == '==' or
+                            symbol in limits['ops'], msg)
+
+
+class OperandTablesTest(unittest.TestCase):
+
+    def test_get_divisors(self):
+        for limits in DIFFICULTY_LEVEL_LIMITS:
+            tables = OperandTables(limits)
+            max_number = limits['max_number']
+            max_total_number = limits['max_total_number']
+            for number in _sample_numbers(max_total_number):
+                for min_num, max_num in [(1, max_number),
+                                         (2, max_number // 2),
+                                         (max_number // 3, max_number),
+                                         (1, max_number + 7)]:
+                    self.assertEqual(
+                        tables.get_divisors(number, min_num, max_num),
+                        [divisor
+                         for divisor in range(max(1, min_num), max_num + 1)
+                         if number % divisor == 0],
+                        (limits, number, min_num, max_num))
+
+
+#
+# Helper functions
+
+def _sample_numbers(max_total_number):
+    # (small ones, the ones near the limit -- also beyond it, where the
+    # tables are not used -- and some random ones)
+    rng = random.Random(SEED)
+    numbers = set(range(1, 50))
+    numbers.update(range(max(1, max_total_number - 5),
+                         max_total_number + 6))
+    numbers.update(rng.randint(1, max_total_number) for i in range(50))
+    return sorted(numbers)
+
+
+_timer = timeit.default_timer
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,197 @@
+# -*- coding: utf-8 -*-
+
+"""
+ArithmeBricks -- tests of the exact evaluation of symbol sequences
+
+Copyright (c) 2014 Jan Kaliszewski (zuo). All rights reserved.
+
+Licensed under GPL-3 (see the *LICENSE* file for details).
+
+`expressions.is_equality()` and `expressions.evaluate()` are compared
+with the former `eval()`-based check -- on generated puzzles (their
+slices and shuffled arrangements) as well as on the edge cases.
+
+Run with: python -m unittest test_expressions (or with pytest).
+"""
+
+from __future__ import division, unicode_literals
+
+import fractions
+import random
+import re
+import unittest
+
+from engine import DIFFICULTY_LEVEL_LIMITS, SymbolGenerator, is_large_board
+from expressions import InvalidExpression, evaluate, is_equality
+
+
+#
+# Constants
+
+PUZZLES_PER_LEVEL = 20
+SHUFFLES_PER_PUZZLE = 20
+LARGE_BOARD_SLICES_PER_PUZZLE = 200
+SEED = 12345
+
+
+#
+# Reference implementation
+
+def eval_expression(symbols):
+    # (the former, `eval()`-based, evaluation -- but with the numbers
+    # made `Fraction`s, as float division is not exact, e.g.
+    # 1/49*49 != 1; the syntax, e.g. no leading zeros, is checked by
+    # compiling the original expression)
+    expr_str = ''.join(symbols)
+    compile(expr_str, '<bricks>', 'eval')
+    exact_expr_str = re.sub(r'\d+',
+                            lambda match: 'F({0})'.format(int(match.group())),
+                            expr_str)
+    return eval(exact_expr_str, {'F': fractions.Fraction})
+
+
+def eval_is_equality(symbols):
+    # (like the former `Brick.is_equality()`)
+    if '==' not in symbols:
+        return False
+    try:
+        return eval_expression(symbols) is True
+    except (SyntaxError, ArithmeticError):
+        return False
+
+
+#
+# Tests
+
+class EdgeCasesTest(unittest.TestCase):
+
+    EQUALITY_CASES = [
+        # (expression, is it a valid and true equality)
+        ('2+10==15-3', True),
+        ('2==4/2==1+1', True),
+        ('2==2==3', False),
+        ('1==1==1==1', True),
+        ('==', False),
+        ('1==', False),
+        ('==1', False),
+        ('1+==1', False),
+        ('1*/1==1', False),
+        ('12', False),
+        ('1+1', False),
+        ('1=1', False),
+        # leading zeros: allowed only for zero itself
+        ('00==0', True),
+        ('000+1==1', True),
+        ('01==1', False),
+        ('1==01', False),
+        ('10==10', True),
+        # unary signs
+        ('-1==0-1', True),
+        ('--2==2', True),
+        ('2==+-+-2', True),
+        ('2*-1==-2', True),
+        ('1--1==2', True),
+        ('1-+1==0', True),
+        ('2*', False),
+        ('*2==2', False),
+        # exact division
+        ('1/3*3==1', True),
+        ('1/49*49==1', True),
+        ('7/2==3', False),
+        ('7/2*2==7', True),
+        ('1/3+1/3+1/3==1', True),
+        ('1/0==1', False),
+        ('0/0==0', False),
+        ('1==1/0', False),
+        ('0*1/0==0', False),
+        ('2/4==1/2', True),
+        # precedence
+        ('2+3*4==14', True),
+        ('2+3*4==20', False),
+        ('8-4-2==2', True),
+        ('8/4/2==1', True),
+        ('2*3-4/2==4', True),
+    ]
+
+    def test_is_equality(self):
+        for expr_str, expected in self.EQUALITY_CASES:
+            symbols = _to_symbols(expr_str)
+            self.assertEqual(is_equality(symbols), expected, expr_str)
+            self.assertEqual(eval_is_equality(symbols), expected, expr_str)
+
+    def test_evaluate(self):
+        for expr_str, expected in [
+                ('0', 0),
+                ('00', 0),
+                ('-3', -3),
+                ('2+3*4', 14),
+                ('7/2', fractions.Fraction(7, 2)),
+                ('1/49*49', 1),
+                ('8/4', 2)]:
+            symbols = _to_symbols(expr_str)
+            self.assertEqual(evaluate(symbols), expected, expr_str)
+            self.assertEqual(eval_expression(symbols), expected, expr_str)
+
+    def test_evaluate_exact_quotient_is_int(self):
+        self.assertIs(type(evaluate(_to_symbols('8/4'))), int)
+
+    def test_evaluate_invalid(self):
+        for expr_str in ['', '01', '1+', '*1', '1==1', '1/0', '0/0']:
+            with self.assertRaises((InvalidExpression, ZeroDivisionError)):
+                evaluate(_to_symbols(expr_str))
+
+
+class GeneratedPuzzlesTest(unittest.TestCase):
+
+    def test_agrees_with_eval(self):
+        rng = random.Random(SEED)
+        random.seed(SEED)
+        symbol_generator = SymbolGenerator(budget=None)
+        for level, limits in enumerate(DIFFICULTY_LEVEL_LIMITS, 1):
+            for i in range(PUZZLES_PER_LEVEL):
+                symbols = symbol_generator.generate_puzzle(limits)
+                for candidate in _iter_candidates(symbols, limits, rng):
+                    self.assertEqual(
+                        is_equality(candidate),
+                        eval_is_equality(candidate),
+                        'level {0}: {1}'.format(level, ''.join(candidate)))
+
+    def test_generated_equalities_are_true(self):
+        random.seed(SEED)
+        symbol_generator = SymbolGenerator(budget=None)
+        for limits in DIFFICULTY_LEVEL_LIMITS:
+            symbol_generator.generate_puzzle(limits)
+            for i in range(PUZZLES_PER_LEVEL):
+                equality = symbol_generator.make_equality()
+                self.assertTrue(is_equality(equality), ''.join(equality))
+                self.assertTrue(eval_is_equality(equality),
+                                ''.join(equality))
+
+
+#
+# Helper functions
+
+def _to_symbols(expr_str):
+    return re.findall(r'==|.', expr_str)
+
+
+def _iter_candidates(symbols, limits, rng):
+    # (slices -- among them the equalities the puzzle was made of --
+    # and shuffled arrangements of the puzzle's symbols)
+    length = len(symbols)
+    if is_large_board(limits):
+        for i in range(LARGE_BOARD_SLICES_PER_PUZZLE):
+            start = rng.randrange(length)
+            yield symbols[start:rng.randint(start + 1, length)]
+    else:
+        for start in range(length):
+            for stop in range(start + 1, length + 1):
+                yield symbols[start:stop]
+    for i in range(SHUFFLES_PER_PUZZLE):
+        shuffled = list(symbols)
+        rng.shuffle(shuffled)
+        yield shuffled
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,122 @@
+# -*- coding: utf-8 -*-
+
+"""
+ArithmeBricks -- tests of the long-horizon memory of dealt puzzles
+
+Copyright (c) 2014 Jan Kaliszewski (zuo). All rights reserved.
+
+Licensed under GPL-3 (see the *LICENSE* file for details).
+
+`history.PuzzleHistory` used by `engine.SymbolGenerator`: a puzzle
+found in the history is rejected whenever it is probed (e.g., when
+drawn from the bank or from the prefetch queue), and only the
+generator itself -- after `MAX_RETRY` history hits in a row during
+one deal -- gives up and deals a known puzzle.
+
+Run with: python -m unittest test_history (or with pytest).
+"""
+
+from __future__ import division, unicode_literals
+
+import os
+import random
+import shutil
+import tempfile
+import unittest
+
+from engine import (
+    DIFFICULTY_LEVEL_LIMITS,
+    MAX_RETRY,
+    SymbolGenerator,
+    pack_symbols,
+)
+from history import PuzzleHistory
+
+
+#
+# Constants
+
+SEED = 12345
+
+SEEN_SYMBOLS = ['1', '2', '+', '3', '==', '1', '5']
+NEW_SYMBOLS = ['2', '*', '3', '==', '6']
+
+
+#
+# Tests
+
+class PuzzleHistoryTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def test_persistence(self):
+        filename = os.path.join(self.tmp_dir, 'puzzles.history')
+        history = PuzzleHistory(filename)
+        history.add(pack_symbols(SEEN_SYMBOLS))
+        history.close()
+        history = PuzzleHistory(filename)
+        try:
+            self.assertIn(pack_symbols(SEEN_SYMBOLS), history)
+            self.assertNotIn(pack_symbols(NEW_SYMBOLS), history)
+            self.assertEqual(len(history), 1)
+        finally:
+            history.close()
+
+
+class SymbolGeneratorHistoryTest(unittest.TestCase):
+
+    def setUp(self):
+        random.seed(SEED)
+        history = PuzzleHistory()
+        history.add(pack_symbols(SEEN_SYMBOLS))
+        self.symbol_generator = SymbolGenerator(puzzle_history=history,
+                                                budget=None)
+        self.limits = DIFFICULTY_LEVEL_LIMITS[0]
+
+    def test_probes_always_reject_seen_puzzles(self):
+        # (like `PuzzleBank.draw()` and `PuzzlePrefetcher.take()` do,
+        # probing more than `MAX_RETRY` candidates in a row)
+        reject = self.symbol_generator.repeated_too_soon
+        for i in range(2 * MAX_RETRY + 1):
+            self.assertTrue(reject(SEEN_SYMBOLS), i)
+        self.assertFalse(reject(NEW_SYMBOLS))
+        # (now it has been dealt)
+        self.assertTrue(reject(NEW_SYMBOLS))
+
+    def test_generator_gives_up_within_one_deal(self):
+        calls = self._make_generator_repeat(SEEN_SYMBOLS)
+        symbols = list(self.symbol_generator(self.limits))
+        self.assertEqual(symbols, SEEN_SYMBOLS)
+        self.assertEqual(len(calls), MAX_RETRY + 1)
+
+    def test_probes_do_not_count_against_the_deal(self):
+        reject = self.symbol_generator.repeated_too_soon
+        for i in range(MAX_RETRY):
+            self.assertTrue(reject(SEEN_SYMBOLS), i)
+        calls = self._make_generator_repeat(SEEN_SYMBOLS)
+        self.symbol_generator(self.limits)
+        self.assertEqual(len(calls), MAX_RETRY + 1)
+        # (and a later probe still rejects the seen puzzle)
+        self.symbol_generator.recent_symbol_combinations.clear()
+        self.assertTrue(reject(SEEN_SYMBOLS))
+
+    def _make_generator_repeat(self, repeated_symbols):
+        # (every generated puzzle is replaced with `repeated_symbols`)
+        calls = []
+        generate_puzzle = self.symbol_generator.generate_puzzle
+
+        def fake_generate_puzzle(limits, deadline=None):
+            calls.append(limits)
+            generate_puzzle(limits, deadline)
+            return list(repeated_symbols)
+
+        self.symbol_generator.generate_puzzle = fake_generate_puzzle
+        return calls
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,171 @@
+# -*- coding: utf-8 -*-
+
+"""
+ArithmeBricks -- tests of the puzzle solver
+
+Copyright (c) 2014 Jan Kaliszewski (zuo). All rights reserved.
+
+Licensed under GPL-3 (see the *LICENSE* file for details).
+
+The solutions of small puzzles are compared with the ones found by
+brute force; for the top levels (12-15) it is checked that the solver,
+limited like when it looks for hints, returns within the stated time
+budget, with valid solutions and with its caches not overgrown.
+
+Run with: python -m unittest test_solver (or with pytest).
+"""
+
+from __future__ import division, unicode_literals
+
+import collections
+import itertools
+import random
+import threading
+import timeit
+import unittest
+
+from engine import DIFFICULTY_LEVEL_LIMITS, SymbolGenerator
+from expressions import ADDITIVE_OPS, is_equality
+from solver import SOLVER_CACHE_SIZE, Solver
+
+
+#
+# Constants
+
+SEED = 12345
+
+# (puzzles of at most that many symbols are solved by brute force)
+BRUTE_FORCE_MAX_SYMBOLS = 8
+BRUTE_FORCE_PUZZLES_PER_LEVEL = 5
+
+# (the budget of a solver working for hints: at most that many
+# solutions, found in at most that many seconds -- plus the time that
+# may pass before the solver notices that the time is up)
+BUDGET_MAX_SOLUTIONS = 50
+BUDGET_TIME_LIMIT = 1.0
+BUDGET_TOLERANCE = 0.25
+BUDGET_LEVELS = (12, 13, 14, 15)
+BUDGET_PUZZLES_PER_LEVEL = 3
+
+
+#
+# Tests
+
+class SolverTest(unittest.TestCase):
+
+    def test_small_puzzle(self):
+        solver = Solver(['1', '2', '+', '3', '==', '1', '5'], 1)
+        solutions = solver.solve()
+        self.assertTrue(solver.complete)
+        self.assertIn((('1', '2', '+', '3', '==', '1', '5'),), solutions)
+        self.assertEqual(solutions,
+                         _brute_force(['1', '2', '+', '3', '==', '1', '5']))
+
+    def test_agrees_with_brute_force(self):
+        random.seed(SEED)
+        symbol_generator = SymbolGenerator(budget=None)
+        for level, limits in enumerate(DIFFICULTY_LEVEL_LIMITS, 1):
+            if limits['equalities'] != 1:
+                continue
+            for i in range(BRUTE_FORCE_PUZZLES_PER_LEVEL):
+                symbols = symbol_generator.generate_puzzle(limits)
+                if len(symbols) > BRUTE_FORCE_MAX_SYMBOLS:
+                    continue
+                self.assertEqual(Solver(symbols, 1).solve(),
+                                 _brute_force(symbols),
+                                 'level {0}: {1}'.format(level,
+                                                         ''.join(symbols)))
+
+    def test_max_solutions(self):
+        symbols = ['1', '2', '+', '3', '==', '1', '5']
+        solver = Solver(symbols, 1, max_solutions=3)
+        self.assertEqual(len(solver.solve()), 3)
+        self.assertFalse(solver.complete)
+
+    def test_no_solutions(self):
+        solver = Solver(['1', '+', '1', '==', '3'], 1)
+        self.assertEqual(solver.solve(), [])
+        self.assertTrue(solver.complete)
+
+    def test_cancel(self):
+        limits = DIFFICULTY_LEVEL_LIMITS[BUDGET_LEVELS[-1] - 1]
+        symbols = _generate_puzzles(limits, 1)[0]
+        solver = Solver(symbols, limits['equalities'])
+        thread = threading.Thread(target=solver.solve)
+        thread.daemon = True
+        thread.start()
+        thread.join(0.1)
+        solver.cancel()
+        thread.join(BUDGET_TOLERANCE)
+        self.assertFalse(thread.is_alive())
+        self.assertIs(solver.complete, False)
+
+
+class BudgetTest(unittest.TestCase):
+
+    def test_top_levels_within_budget(self):
+        for level in BUDGET_LEVELS:
+            limits = DIFFICULTY_LEVEL_LIMITS[level - 1]
+            for symbols in _generate_puzzles(limits,
+                                             BUDGET_PUZZLES_PER_LEVEL):
+                msg = 'level {0}: {1}'.format(level, ''.join(symbols))
+                solver = Solver(symbols, limits['equalities'],
+                                max_solutions=BUDGET_MAX_SOLUTIONS,
+                                time_limit=BUDGET_TIME_LIMIT)
+                start_time = _timer()
+                solutions = solver.solve()
+                elapsed = _timer() - start_time
+                self.assertLessEqual(elapsed,
+                                     BUDGET_TIME_LIMIT + BUDGET_TOLERANCE,
+                                     msg)
+                self.assertLessEqual(len(solutions), BUDGET_MAX_SOLUTIONS,
+                                     msg)
+                for solution in solutions:
+                    self._check_solution(solution, symbols,
+                                         limits['equalities'], msg)
+                for cache in (solver._dead_ends, solver._suffix_cache,
+                              solver._feasibility_cache):
+                    self.assertLessEqual(len(cache), SOLVER_CACHE_SIZE, msg)
+
+    def _check_solution(self, solution, symbols, equalities, msg):
+        self.assertEqual(len(solution), equalities, msg)
+        for equality in solution:
+            self.assertTrue(is_equality(equality), msg)
+        self.assertEqual(
+            collections.Counter(itertools.chain.from_iterable(solution)),
+            collections.Counter(symbols),
+            msg)
+
+
+#
+# Helper functions
+
+def _generate_puzzles(limits, count):
+    random.seed(SEED)
+    symbol_generator = SymbolGenerator(budget=None)
+    return [symbol_generator.generate_puzzle(limits) for i in range(count)]
+
+
+def _brute_force(symbols):
+    # -> the solutions of a one-equality puzzle, found by checking every
+    #    arrangement of the symbols which could be built on the board
+    #    (no two operators next to each other, a sign only at the
+    #    beginning)
+    solutions = set()
+    for arrangement in set(itertools.permutations(symbols)):
+        if any(not a.isdigit() and not b.isdigit()
+               for a, b in zip(arrangement, arrangement[1:])):
+            continue
+        if (not arrangement[0].isdigit() and
+              arrangement[0] not in ADDITIVE_OPS):
+            continue
+        if is_equality(arrangement):
+            solutions.add((arrangement,))
+    return sorted(solutions)
+
+
+_timer = timeit.default_timer
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,996 @@
+# -*- coding: utf-8 -*-
+
+"""
+ArithmeBricks -- the Kivy user interface
+
+Copyright (c) 2014 Jan Kaliszewski (zuo). All rights reserved.
+
+Licensed under GPL-3 (see the *LICENSE* file for details).
+
+Importing this module imports Kivy (and the UI classes) -- so it is
+imported only by the entry point (*main.py*) and by the tools that
+drive the UI (such as *replay.py*); the game logic itself lives in
+Kivy-free modules (*engine.py*, *expressions.py*, *board.py*,
+*hints.py*...).
+"""
+
+from __future__ import division, unicode_literals
+
+import functools
+import gc
+import itertools
+import math
+import operator
+import os
+import random
+import timeit
+
+# (for measuring the startup phases, the imports included)
+_start_time = timeit.default_timer()
+
+import kivy
+kivy.require('1.8.0')
+
+from kivy.config import Config
+
+from kivy.app import App
+from kivy.animation import Animation
+from kivy.clock import Clock
+from kivy.lang import Builder
+from kivy.logger import Logger
+from kivy.properties import (
+    AliasProperty,
+    BooleanProperty,
+    NumericProperty,
+    ListProperty,
+    ObjectProperty,
+    OptionProperty,
+    ReferenceListProperty,
+)
+from kivy.uix.behaviors import DragBehavior
+from kivy.uix.label import Label
+from kivy.uix.popup import Popup
+from kivy.uix.widget import Widget
+from kivy.utils import platform
+from kivy.vector import Vector
+
+from audio import SoundPool
+import board
+from board import ChainModel, SlotLayout, SpatialGrid
+from engine import (
+    DIFFICULTY_LEVEL_LIMITS,
+    GeneratorStats,
+    SymbolGenerator,
+    is_large_board,
+)
+from glyphs import GlyphAtlas
+from hints import BudgetedSearch, HintEngine
+from latency import LATENCY_TRACE_FILENAME, LatencyHud, LatencyRecorder
+from history import (
+    DEFAULT_BLOOM_ERROR_RATE,
+    PUZZLE_HISTORY_FILENAME,
+    PuzzleHistory,
+)
+from motion import MotionDriver
+from prefetch import PuzzlePrefetcher
+from puzzlebank import PUZZLE_BANK_FILENAME, PuzzleBank
+from startup import STARTUP_LOG_FILENAME, StartupTimer, load_kv_rules
+
+startup_timer = StartupTimer(_start_time)
+startup_timer.mark('imports')
+
+
+#
+# Constants
+
+SYMBOL_TO_BRICK_TEXT = {
+    '==': '=',
+    '+': '+',
+    '-': '\u2212',
+    '*': '\xd7',
+    '/': '\xf7',
+}
+BRICK_TEXT_TO_SYMBOL = {
+    text: symbol for symbol, text in SYMBOL_TO_BRICK_TEXT.items()}
+
+KV_FILENAME = 'arithmebricks.kv'
+
+# (the upper limit on the time of handling one touch event -- snapping
+# and the finish check included -- on any board, the largest ones too;
+# checked by `replay.py`)
+MAX_TOUCH_EVENT_SECONDS = 1 / 60
+
+# (when a game is finished, the bricks are switched to the 'final' state
+# -- each starting its own animation -- at most that many per frame, so
+# that on large boards it does not take several frames' time at once)
+FINAL_STATE_BRICKS_PER_FRAME = 40
+
+SOUND_FILENAME_PATTERN = 'sounds/arithmebricks-{0}_Seq01.wav'
+SOUND_ID_TO_SYMBOL = {
+    'eq': '==',
+    'add': '+',
+    'sub': '-',
+    'mul': '*',
+    'div': '/',
+}
+
+# (the sounds played when a game starts -- see the .kv file -- are
+# loaded first; the rest of them are loaded after them, one per frame)
+PRIORITY_SOUND_SYMBOLS = '0134'
+
+# (played, mixed into one sound, when a game is finished)
+FINISH_SOUND_SYMBOLS = ['=='] + list('*/-+0123456789')
+FINISH_SOUND_INTERVAL = 0.1
+FINISH_SOUND_VOLUME = 0.1
+
+# (if this environment variable is set to a non-empty value, all sounds
+# are loaded before the first frame is shown -- as it used to be done)
+EAGER_SOUND_LOADING_ENV_VAR = 'ARITHMEBRICKS_EAGER_SOUNDS'
+
+# (if this environment variable is set to a non-empty value, the kv
+# file is always parsed, i.e., the cache of parsed kv rules is not used)
+NO_KV_CACHE_ENV_VAR = 'ARITHMEBRICKS_NO_KV_CACHE'
+
+# (if this environment variable is set to a non-empty value, the latency
+# instrumentation is on from the start; anyway, it can be toggled with
+# the F12 key -- when it is turned off or the game is closed, the trace
+# is written to the `LATENCY_TRACE_FILENAME` file in the user data dir)
+LATENCY_ENV_VAR = 'ARITHMEBRICKS_LATENCY'
+LATENCY_TOGGLE_KEY = 293  # (F12)
+
+# (if this environment variable is set, puzzle generator statistics are
+# dumped, at exit, to the file it specifies)
+GENERATOR_STATS_ENV_VAR = 'ARITHMEBRICKS_GENERATOR_STATS'
+
+HELP_TEXT = (
+    'Drag and drop the bricks (digits and operators) '
+    'to form valid equalities (e.g. [i]2+10=15-3[/i]).\n'
+    'All given bricks must be used. '
+    'There is always at least one valid solution.\n'
+    'Stuck? Press [i]Hint[/i] to see which bricks to put together '
+    '(or which one to take away).'
+)
+
+
+#
+# UI classes
+
+class ArithmeBricksApp(App):
+
+    def load_kv(self, filename=None):
+        if filename is None:
+            filename = os.path.join(self.directory, KV_FILENAME)
+        if not os.path.exists(filename):
+            return False
+        with startup_timer.phase('kv rules'):
+            if os.environ.get(NO_KV_CACHE_ENV_VAR):
+                Builder.load_file(filename)
+            elif load_kv_rules(filename, self.user_data_dir):
+                startup_timer.note('kv rules', 'cached')
+        return True
+
+    def build(self):
+        self.icon = 'icon.png'
+        with startup_timer.phase('sounds'):
+            self.load_sounds(lazily=not os.environ.get(
+                EAGER_SOUND_LOADING_ENV_VAR))
+        with startup_timer.phase('game'):
+            game = ArithmeBricksGame()
+        # (remembering the puzzles dealt in the past sessions as well)
+        game.symbol_generator.puzzle_history = PuzzleHistory.open(
+            os.path.join(self.user_data_dir, PUZZLE_HISTORY_FILENAME),
+            bloom_error_rate=DEFAULT_BLOOM_ERROR_RATE)
+        Clock.schedule_once(lambda dt: game.show_title(), 1)
+        Clock.schedule_once(self.on_first_frame, 0)
+        self.latency_recorder = LatencyRecorder()
+        self.latency_hud = LatencyHud(self.latency_recorder)
+        if os.environ.get(LATENCY_ENV_VAR):
+            self.toggle_latency_instrumentation()
+        # (imported here, as importing it creates the window)
+        from kivy.core.window import Window
+        Window.bind(on_key_down=self.on_key_down)
+        return game
+
+    def on_first_frame(self, dt):
+        startup_timer.mark('first frame')
+        Logger.info('ArithmeBricks: startup: {0}'.format(
+            startup_timer.format_report()))
+        startup_timer.write_log(
+            os.path.join(self.user_data_dir, STARTUP_LOG_FILENAME))
+        # (mixing in the background)
+        self.sound_pool.prepare_sequence(FINISH_SOUND_SYMBOLS,
+                                         FINISH_SOUND_INTERVAL,
+                                         FINISH_SOUND_VOLUME)
+
+    def on_stop(self):
+        game = self.root
+        game.puzzle_prefetcher.stop()
+        self.sound_pool.stop()
+        if game.symbol_generator.puzzle_history is not None:
+            game.symbol_generator.puzzle_history.close()
+        stats_filename = os.environ.get(GENERATOR_STATS_ENV_VAR)
+        if stats_filename:
+            game.get_generator_stats().dump(stats_filename)
+        if self.latency_recorder.enabled:
+            self.toggle_latency_instrumentation()
+
+    def on_key_down(self, window, key, *args):
+        if key == LATENCY_TOGGLE_KEY:
+            self.toggle_latency_instrumentation()
+            return True
+        return False
+
+    def toggle_latency_instrumentation(self):
+        recorder = self.latency_recorder
+        if recorder.enabled:
+            recorder.stop()
+            self.latency_hud.hide()
+            self.export_latency_trace()
+        else:
+            recorder.start(self.get_latency_targets())
+            self.latency_hud.show()
+
+    def get_latency_targets(self):
+        # -> list of (owner, name of function/method, section name)
+        return [
+            (Brick, 'on_touch_down', 'brick touch down'),
+            (Brick, 'on_touch_up', 'brick touch up'),
+            (Brick, 'attach', 'attach'),
+            (Brick, 'update_states_after_attach', 'states after attach'),
+            (board, 'is_equality', 'equality check'),
+            (ArithmeBricksGame, 'new_game', 'new game'),
+            (MotionDriver, '_tick', 'brick motion'),
+        ]
+
+    def export_latency_trace(self):
+        if not len(self.latency_recorder):
+            return
+        filename = os.path.join(self.user_data_dir, LATENCY_TRACE_FILENAME)
+        try:
+            self.latency_recorder.export_trace(filename)
+        except (IOError, OSError) as exc:
+            Logger.warning('ArithmeBricks: cannot write latency trace: '
+                           '{0}'.format(exc))
+        else:
+            Logger.info('ArithmeBricks: latency trace written to '
+                        '{0}'.format(filename))
+
+    def load_sounds(self, lazily=False):
+        symbol_to_filename = {}
+        sound_ids = list('0123456789') + list(SOUND_ID_TO_SYMBOL)
+        for sound_id in sound_ids:
+            filename = SOUND_FILENAME_PATTERN.format(sound_id)
+            symbol = SOUND_ID_TO_SYMBOL.get(sound_id, sound_id)
+            symbol_to_filename[symbol] = filename
+        self.sound_pool = SoundPool(symbol_to_filename, self.user_data_dir)
+        if lazily:
+            # (starting after the first frame)
+            self.sound_pool.load_lazily(PRIORITY_SOUND_SYMBOLS)
+        else:
+            self.sound_pool.load()
+
+    def play_sound(self, symbol, delay=None, volume=0.15):
+        if delay is None:
+            delay = random.randint(0, 20) / 50
+        self.sound_pool.play(symbol, delay, volume)
+
+    def play_finish_sounds(self, delay=0):
+        # (mixed into one sound, if possible)
+        self.sound_pool.play_sequence(FINISH_SOUND_SYMBOLS,
+                                      delay,
+                                      FINISH_SOUND_INTERVAL,
+                                      FINISH_SOUND_VOLUME)
+
+
+class ArithmeBricksGame(Widget):
+
+    difficulty_level_limits = DIFFICULTY_LEVEL_LIMITS
+
+    playing = BooleanProperty(False)
+    finished = BooleanProperty(False)
+
+    # NOTE: values of properties without defaults
+    # shall be set in the .kv file
+    limits = ObjectProperty()
+    width_brick_ratio = NumericProperty()
+    min_width_brick_ratio = NumericProperty()
+    brick_width = NumericProperty()
+    brick_height = NumericProperty()
+    panel_height = NumericProperty()
+    aux_text_size = NumericProperty()
+
+    title_lines = ListProperty()
+
+    def __init__(self, *args, **kwargs):
+        # (these must exist before the .kv rules set property values)
+        self.puzzle_prefetcher = PuzzlePrefetcher(self.difficulty_level_limits)
+        self.snap_index = SpatialGrid()   # (by bricks' `target_pos`)
+        self.touch_index = SpatialGrid()  # (by bricks' actual `pos`)
+        self.brick_mover = MotionDriver()  # (moves bricks to `target_pos`)
+        self._brick_layers = {}
+        self._brick_layer_counter = itertools.count()
+        self.brick_slots = None
+        self.chains = ChainModel()
+        self.hint_engine = None
+        self._hint_search = None
+        self._hint_chains = None
+        self._bricks_to_finalize = []
+        super(ArithmeBricksGame, self).__init__(*args, **kwargs)
+        self.symbol_generator = SymbolGenerator()
+        self.puzzle_bank = PuzzleBank.open(PUZZLE_BANK_FILENAME)
+        self.puzzle_prefetcher.start()
+
+    def on_limits(self, instance, limits):
+        self.puzzle_prefetcher.set_level(
+            self.difficulty_level_limits.index(limits))
+
+    def on_brick_width(self, instance, value):
+        self.update_index_cell_size()
+
+    def on_brick_height(self, instance, value):
+        self.update_index_cell_size()
+
+    def update_index_cell_size(self):
+        for index in (self.snap_index, self.touch_index):
+            index.set_cell_size(self.brick_width, self.brick_height)
+
+    # event dispatch
+    # (instead of dispatching each touch to every brick, only
+    # the bricks found with the spatial index are involved)
+
+    def on_touch_down(self, touch):
+        for brick in self.iter_bricks_at(*touch.pos):
+            if brick.dispatch('on_touch_down', touch):
+                return True
+        return self._dispatch_to_non_bricks('on_touch_down', touch)
+
+    def on_touch_move(self, touch):
+        for brick in self._iter_grabbing_bricks(touch):
+            if brick.dispatch('on_touch_move', touch):
+                return True
+        return self._dispatch_to_non_bricks('on_touch_move', touch)
+
+    def on_touch_up(self, touch):
+        for brick in self._iter_grabbing_bricks(touch):
+            if brick.dispatch('on_touch_up', touch):
+                return True
+        return self._dispatch_to_non_bricks('on_touch_up', touch)
+
+    def _iter_grabbing_bricks(self, touch):
+        for widget_ref in touch.grab_list[:]:
+            widget = widget_ref()
+            if isinstance(widget, Brick) and widget.parent is self:
+                yield widget
+
+    def _dispatch_to_non_bricks(self, event_type, touch):
+        for child in self.children[:]:
+            if (not isinstance(child, Brick) and
+                  child.dispatch(event_type, touch)):
+                return True
+        return False
+
+    # brick (spatial) bookkeeping
+
+    def add_widget(self, widget, *args, **kwargs):
+        super(ArithmeBricksGame, self).add_widget(widget, *args, **kwargs)
+        if isinstance(widget, Brick):
+            self._brick_layers[widget] = next(self._brick_layer_counter)
+            self.snap_index.move(widget, *widget.target_pos)
+            self.touch_index.move(widget, *widget.pos)
+            self.chains.add(widget)
+            widget.bind(target_pos=self._on_brick_target_pos,
+                        pos=self._on_brick_pos)
+
+    def remove_widget(self, widget, *args, **kwargs):
+        if isinstance(widget, Brick):
+            widget.unbind(target_pos=self._on_brick_target_pos,
+                          pos=self._on_brick_pos)
+            self.snap_index.remove(widget)
+            self.touch_index.remove(widget)
+            self.chains.remove(widget)
+            self.brick_mover.stop(widget)
+            del self._brick_layers[widget]
+        super(ArithmeBricksGame, self).remove_widget(widget, *args, **kwargs)
+
+    def _on_brick_target_pos(self, brick, target_pos):
+        self.snap_index.move(brick, *target_pos)
+        self.brick_mover.move(brick, target_pos)
+
+    def _on_brick_pos(self, brick, pos):
+        self.touch_index.move(brick, *pos)
+
+    def iter_bricks_near(self, x, y, radius):
+        # (bricks whose `target_pos` *may* be within
+        # the given distance from the given point)
+        return self.snap_index.iter_near(x, y, radius, radius)
+
+    def iter_bricks_at(self, x, y):
+        # (bricks that collide with the given point, topmost first)
+        half_width = self.brick_width / 2
+        half_height = self.brick_height / 2
+        bricks = [
+            brick
+            for brick in self.touch_index.iter_near(x - half_width,
+                                                    y - half_height,
+                                                    half_width,
+                                                    half_height)
+            if brick.collide_point(x, y)]
+        bricks.sort(key=self._brick_layers.__getitem__, reverse=True)
+        return bricks
+
+    def get_generator_stats(self):
+        stats = GeneratorStats()
+        stats.update(self.symbol_generator.stats)
+        stats.update(self.puzzle_prefetcher.symbol_generator.stats)
+        return stats
+
+    def new_game(self):
+        self.playing = self.finished = False
+        self.clear_bricks()
+        self.provide_bricks()
+        self.playing = True
+
+    def clear_bricks(self):
+        self.cancel_hint()
+        if self.hint_engine is not None:
+            self.hint_engine.cancel()
+            self.hint_engine = None
+        Clock.unschedule(self._finalize_next_bricks)
+        del self._bricks_to_finalize[:]
+        self.brick_mover.stop_all()
+        for brick in list(self.iter_all_bricks()):
+            # (border color animations)
+            Animation.cancel_all(brick)
+            self.remove_widget(brick)
+
+    def provide_bricks(self, symbols=None):
+        # -> list of the new bricks (`symbols` -- to use instead of
+        #    dealing a new puzzle, e.g. when replaying a recorded game)
+        limits = self.limits
+        self.width_brick_ratio = max(
+            self.min_width_brick_ratio,
+            limits['max_symbols_per_equality']) + limits['equalities'] - 1
+        if symbols is None:
+            symbols = list(self.deal_symbols(limits))
+        self.hint_engine = HintEngine(symbols, limits['equalities'])
+        self.reset_brick_slots(len(symbols))
+        bricks = [self.add_new_brick(symbol) for symbol in symbols]
+        settle_garbage(freeze=is_large_board(limits))
+        return bricks
+
+    def deal_symbols(self, limits):
+        # prefer a precomputed puzzle (from the bank, if it is available
+        # and not used up yet, or from the prefetch queue) to generating
+        # a new one right now
+        reject = self.symbol_generator.repeated_too_soon
+        if self.puzzle_bank is not None:
+            symbols = self.puzzle_bank.draw(limits, reject=reject)
+            if symbols is not None:
+                return symbols
+        symbols = self.puzzle_prefetcher.take(
+            self.difficulty_level_limits.index(limits),
+            reject=reject)
+        if symbols is not None:
+            return symbols
+        symbols = self.symbol_generator(limits)
+        if self.symbol_generator.over_budget:
+            Logger.warning('ArithmeBricks: puzzle generation budget used '
+                           'up (level {0})'.format(
+                               self.difficulty_level_limits.index(limits)
+                               + 1))
+        return symbols
+
+    def add_new_brick(self, symbol):
+        target_pos = self.new_pos()
+        if symbol in SYMBOL_TO_BRICK_TEXT:
+            if symbol == '==':
+                brick = EqualityBrick()
+            else:
+                brick = OperatorBrick()
+            brick.text = SYMBOL_TO_BRICK_TEXT[symbol]
+        else:
+            assert symbol in '0123456789'
+            brick = DigitBrick()
+            brick.text = symbol
+        self.add_widget(brick)
+        brick.pos = self.center
+        brick.target_pos = target_pos
+        return brick
+
+    def reset_brick_slots(self, min_count=0):
+        # (covering the area that is free of the panel -- the same as
+        # the area in which random positions were chosen historically)
+        x = 5
+        y = 5 + int(self.brick_height)
+        self.brick_slots = SlotLayout(
+            x, y,
+            self.width - 5 - x,
+            self.height - y,
+            self.brick_width,
+            self.brick_height,
+            min_count=min_count)
+
+    def new_pos(self):
+        pos = None
+        if self.brick_slots is not None:
+            pos = self.brick_slots.take()
+        if pos is None:
+            # there is no room for non-overlapping placement
+            x = random.randint(5, self.width - 5 - int(self.brick_width))
+            y = random.randint(5 + int(self.brick_height),
+                               self.height - int(self.brick_height))
+            pos = x, y
+        return pos
+
+    def iter_all_bricks(self):
+        return (obj for obj in self.children
+                if isinstance(obj, Brick))
+
+    def finish_game(self):
+        self.cancel_hint()
+        if self.hint_engine is not None:
+            self.hint_engine.cancel()
+        if self.playing:
+            self.finished = True
+        self.playing = False
+
+    def finalize_bricks(self):
+        self._bricks_to_finalize[:] = self.iter_all_bricks()
+        if self._finalize_next_bricks() is not False:
+            Clock.schedule_interval(self._finalize_next_bricks, 0)
+
+    def _finalize_next_bricks(self, *args):
+        bricks = self._bricks_to_finalize
+        for brick in bricks[-FINAL_STATE_BRICKS_PER_FRAME:]:
+            brick.state = 'final'
+        del bricks[-FINAL_STATE_BRICKS_PER_FRAME:]
+        if not bricks:
+            return False
+
+    # hints
+    # (the search is spread over frames, each getting a small time budget,
+    # so that the game stays responsive)
+
+    def show_hint(self):
+        if self.playing and self.hint_engine is not None:
+            self.cancel_hint()
+            self._start_hint_search()
+            Clock.schedule_interval(self._continue_hint_search, 0)
+
+    def cancel_hint(self):
+        Clock.unschedule(self._continue_hint_search)
+        self._hint_search = self._hint_chains = None
+
+    def _start_hint_search(self):
+        self._hint_chains = list(self.chains.iter_chains())
+        self._hint_search = BudgetedSearch(
+            self.hint_engine.search(self._hint_chains))
+
+    def _continue_hint_search(self, dt):
+        # (if the player has moved some bricks in the meantime the search
+        # starts again -- the solutions found so far are not lost as they
+        # are kept by the hint engine)
+        chains = self.chains
+        if not all(chain.bricks[0] in chains and
+                   chains.get_chain(chain.bricks[0]) is chain
+                   for chain in self._hint_chains):
+            self._start_hint_search()
+        if not self._hint_search.run_slice():
+            return True
+        hint = self._hint_search.result
+        self._hint_search = self._hint_chains = None
+        if hint is not None:
+            hint.brick.flash_hint()
+            if hint.neighbour is not None:
+                hint.neighbour.flash_hint()
+        return False
+
+    def popup_help(self):
+        HelpPopup().open()
+
+    def popup_quit(self):
+        QuitPopup().open()
+
+    def popup_new_game(self):
+        def on_dismiss(popup):
+            if popup.user_decision:
+                self.new_game()
+        NewGamePopup(on_dismiss=on_dismiss).open()
+
+    def show_title(self):
+        self.reset_brick_slots(sum(len(line_text.replace(' ', ''))
+                                   for line_text in self.title_lines))
+        mid_row = len(self.title_lines) / 2
+        for row, line_text in enumerate(self.title_lines):
+            Clock.schedule_once(
+                functools.partial(
+                    self.show_title_row,
+                    mid_row,
+                    row,
+                    line_text,
+                ),
+                row * 0.3)
+
+    def show_title_row(self, mid_row, row, line_text, dt):
+        if self.playing:
+            return
+        mid_col = len(line_text) / 2
+        for col, char in enumerate(line_text):
+            if char == ' ':
+                continue
+            pos = self.new_pos()
+            brick = TitleBrick()
+            brick.text = char
+            self.add_widget(brick)
+            brick.pos = pos
+            brick.target_pos = (
+                self.center_x + (col - mid_col) * self.brick_width,
+                self.center_y - (row - mid_row) * self.brick_height -
+                    self.brick_height / 2)
+
+
+class Brick(DragBehavior, Label):
+
+    # NOTE: values of properties without defaults
+    # shall be set in the .kv file
+    background_color = ListProperty()
+    border_color = ListProperty()
+
+    # (declaring the following class-wide constants as properties makes it
+    # easier to specify/inherit/overridde their values just in the .kv file)
+    detached_border_color = ListProperty()
+    move_border_color = ListProperty()
+    attached_border_color = ListProperty()
+    equal_border_color = ListProperty()
+    final_border_color = ListProperty()
+    hint_border_color = ListProperty()
+
+    max_snap_x_distance = NumericProperty()
+    max_snap_y_distance = NumericProperty()
+    max_double_attach_x_distance = NumericProperty()
+    max_double_attach_y_distance = NumericProperty()
+
+    target_x = NumericProperty(0)
+    target_y = NumericProperty(0)
+    target_pos = ReferenceListProperty(target_x, target_y)
+
+    # (shared by all bricks: each glyph is rendered once per font size)
+    glyph_atlas = GlyphAtlas()
+
+    def texture_update(self, *largs):
+        # (overriding the Label's method, which renders a texture per
+        # widget)
+        texture = self.glyph_atlas.get_texture(self.text,
+                                               self.font_size,
+                                               self.font_name,
+                                               self.bold)
+        self.texture = texture
+        self.texture_size = list(texture.size) if texture else [0, 0]
+
+    def get_target_right(self):
+        return self.target_x + self.width
+    def set_target_right(self, value):
+        self.target_x = value - self.width
+    target_right = AliasProperty(
+        get_target_right, set_target_right, bind=('target_x', 'width'))
+
+    target_right_pos = ReferenceListProperty(target_right, target_y)
+
+    state = OptionProperty('detached', options=[
+        'detached',
+        'move',
+        'attached',
+        'equal',
+        'final',
+    ])
+
+    left_attached_brick = None
+    right_attached_brick = None
+
+    @property
+    def symbol(self):
+        return self.text
+
+    # event dispatch
+
+    def on_touch_down(self, touch):
+        if self.state != 'final' and super(Brick, self).on_touch_down(touch):
+            # (from now on it is moved by the user)
+            self.parent.brick_mover.stop(self)
+            self.update_states_after_detach(self.detach())
+            self.state = 'move'
+            return True
+        return False
+
+    def on_touch_up(self, touch):
+        if self.state != 'final' and super(Brick, self).on_touch_up(touch):
+            self.target_pos = self.pos
+            assert self.state == 'move'
+            chain = self.attach()
+            if chain is not None:
+                self.update_states_after_attach(chain)
+            else:
+                self.state = 'detached'
+            return True
+        return False
+
+    # detaching
+
+    def detach(self):
+        # -> chains that remained on the left and on the right
+        left_brick = self.left_attached_brick
+        if left_brick is not None:
+            left_brick.right_attached_brick = None
+            self.left_attached_brick = None
+        right_brick = self.right_attached_brick
+        if right_brick is not None:
+            right_brick.left_attached_brick = None
+            self.right_attached_brick = None
+        return self.parent.chains.detach(self)
+
+    def update_states_after_detach(self, remaining_chains):
+        for chain in remaining_chains:
+            if len(chain) == 1:
+                state = 'detached'
+            elif chain.is_equal:
+                state = 'equal'
+            else:
+                state = 'attached'
+            for brick in chain.bricks:
+                brick.state = state
+
+    # attaching
+
+    def attach(self):
+        # -> the resulting chain (or None if not attached)
+        (left_brick,
+         right_brick,
+         target_pos) = self.get_left_right_bricks_and_target_pos()
+        if left_brick is not None:
+            left_brick.right_attached_brick = self.proxy_ref
+            self.left_attached_brick = left_brick.proxy_ref
+        if right_brick is not None:
+            right_brick.left_attached_brick = self.proxy_ref
+            self.right_attached_brick = right_brick.proxy_ref
+        if target_pos is not None:
+            self.target_pos = target_pos
+        if left_brick is None and right_brick is None:
+            return None
+        return self.parent.chains.attach(self, left_brick, right_brick)
+
+    def get_left_right_bricks_and_target_pos(self):
+        left_brick = self.choose_left_brick()
+        right_brick = self.choose_right_brick()
+        if right_brick is not None:
+            target_pos_by_right = (right_brick.target_x - self.width,
+                                   right_brick.target_y)
+            if left_brick is not None:
+                target_pos_by_left = tuple(left_brick.target_right_pos)
+                distance_from_left = (Vector(self.target_pos)
+                                      .distance(left_brick.target_right_pos))
+                distance_from_right = (Vector(self.target_right_pos)
+                                       .distance(right_brick.target_pos))
+                if self.can_attach_to_both(
+                        left_brick, right_brick,
+                        target_pos_by_left, target_pos_by_right,
+                        distance_from_left, distance_from_right):
+                    # (halfway between; not with `kivy.utils.interpolate()`
+                    # which in newer Kivy versions is deprecated -- and
+                    # then inspects the call stack on each call)
+                    target_pos = tuple(
+                        (by_left + by_right) / 2
+                        for by_left, by_right in zip(target_pos_by_left,
+                                                     target_pos_by_right))
+                elif self.should_attach_to_left(
+                        left_brick, right_brick,
+                        distance_from_left, distance_from_right):
+                    target_pos = target_pos_by_left
+                    right_brick = None
+                else:
+                    target_pos = target_pos_by_right
+                    left_brick = None
+            else:
+                target_pos = target_pos_by_right
+        elif left_brick is not None:
+            target_pos = left_brick.target_right_pos
+        else:
+            target_pos = None
+        return left_brick, right_brick, target_pos
+
+    def choose_left_brick(self):
+        _distance = Vector(self.target_pos).distance
+        bricks_and_distances = [
+            (brick,
+             _distance(brick.target_right_pos),
+             abs(self.target_x - brick.target_right))
+            for brick in self.iter_bricks_near(self.target_x - self.width,
+                                               self.target_y)
+            if brick.right_attached_brick is None]
+        return self.get_attachable_brick(bricks_and_distances)
+
+    def choose_right_brick(self):
+        _distance = Vector(self.target_right_pos).distance
+        bricks_and_distances = [
+            (brick,
+             _distance(brick.target_pos),
+             abs(self.target_right - brick.target_x))
+            for brick in self.iter_bricks_near(self.target_right,
+                                               self.target_y)
+            if brick.left_attached_brick is None]
+        return self.get_attachable_brick(bricks_and_distances)
+
+    def get_attachable_brick(self, bricks_and_distances):
+        bricks_and_distances.sort(key=operator.itemgetter(1))
+        for brick, _, x_distance in bricks_and_distances:
+            if brick == self:
+                continue
+            # (for checking snap limits, using x and y separately
+            # plays better than using the real x*y distance)
+            y_distance = abs(self.target_y - brick.target_y)
+            if (x_distance > self.max_snap_x_distance or
+                  y_distance > self.max_snap_y_distance):
+                return None
+            if self.can_be_attached_to(brick):
+                return brick
+
+    def can_be_attached_to(self, brick):
+        return brick.state != 'move'
+
+    def can_attach_to_both(self, left_brick, right_brick,
+                           target_pos_by_left, target_pos_by_right,
+                           distance_from_left, distance_from_right):
+        return (Vector(target_pos_by_left).distance(target_pos_by_right) <
+                self.width / 3) or (
+                    (distance_from_right / 3.5 <=
+                     distance_from_left <=
+                     3.5 * distance_from_right) and
+                    # (for checking snap limits, using x and y separately
+                    # plays better than using the real x*y distance)
+                    (abs(self.target_x - left_brick.target_right) <=
+                     self.max_double_attach_x_distance) and
+                    (abs(self.target_y - left_brick.target_y) <=
+                     self.max_double_attach_y_distance) and
+                    (abs(self.target_right - right_brick.target_x) <=
+                     self.max_double_attach_x_distance) and
+                    (abs(self.target_y - right_brick.target_y) <=
+                     self.max_double_attach_y_distance))
+
+    def should_attach_to_left(self, left_brick, right_brick,
+                              distance_from_left, distance_from_right):
+        # (for choosing the side, comparing y distances often
+        # seems to play better than comparing real x*y distances)
+        from_left = abs(self.target_y - left_brick.target_y)
+        from_right = abs(self.target_y - right_brick.target_y)
+        if (from_left < self.height / 4 and
+            from_right < self.height / 4) or (
+                from_right / 1.4 <=
+                from_left <=
+                1.4 * from_right):
+            # y distances are too small or too similar to be
+            # conclusive => let's compare real x*y distances
+            from_left = distance_from_left
+            from_right = distance_from_right
+        if from_left <= from_right:
+            return True
+        else:
+            assert from_left > from_right
+            return False
+
+    def update_states_after_attach(self, chain):
+        if chain.is_equal:
+            for brick in chain.bricks:
+                brick.state = 'equal'
+            if self.parent.chains.all_equal:
+                self.parent.finalize_bricks()
+                self.parent.finish_game()
+        else:
+            for brick in chain.bricks:
+                brick.state = 'attached'
+
+    # hints
+
+    def flash_hint(self, blinks=3):
+        state_border_color = getattr(self, self.state + '_border_color')
+        anim = None
+        for _ in range(blinks):
+            blink = (Animation(border_color=self.hint_border_color,
+                               duration=0.2, t='in_out_quad') +
+                     Animation(border_color=state_border_color,
+                               duration=0.2, t='in_out_quad'))
+            anim = blink if anim is None else anim + blink
+        anim.start(self)
+
+    # commons
+
+    def iter_all_bricks(self):
+        return self.parent.iter_all_bricks()
+
+    def iter_bricks_near(self, x, y):
+        # (bricks whose `target_pos` may be within the snap limits from
+        # the given point; any farther brick would make
+        # get_attachable_brick() return None before it is reached
+        # anyway, as the candidates are sorted by distance)
+        radius = math.hypot(self.max_snap_x_distance,
+                            self.max_snap_y_distance)
+        return self.parent.iter_bricks_near(x, y, radius)
+
+
+class DigitBrick(Brick):
+    pass
+
+
+class OperatorBrick(Brick):
+
+    @property
+    def symbol(self):
+        return BRICK_TEXT_TO_SYMBOL[self.text]
+
+    def can_be_attached_to(self, obj):
+        return (super(OperatorBrick, self).can_be_attached_to(obj) and
+                isinstance(obj, DigitBrick))
+
+
+class EqualityBrick(OperatorBrick):
+    pass
+
+
+class TitleBrick(Brick):
+
+    def on_touch_down(self, touch):
+        return False
+
+    def on_touch_up(self, touch):
+        return False
+
+
+class HelpPopup(Popup):
+    help_text = HELP_TEXT
+
+
+class QuitPopup(Popup):
+    pass
+
+
+class NewGamePopup(Popup):
+    user_decision = BooleanProperty(False)
+
+
+#
+# Helper functions
+
+def config_tweaks():
+    mouse_opt_str = Config.getdefault('input', 'mouse', None)
+    if mouse_opt_str:
+        mouse_options = mouse_opt_str.split(',')
+
+        # disable mouse-based multitouch emulation
+        if 'disable_multitouch' not in mouse_options:
+            mouse_options.append('disable_multitouch')
+
+        # on linux: disable mouse when another multitouch device is used
+        # (see: http://kivy.org/docs/api-kivy.input.providers.mouse.html)
+        if platform == 'linux' and 'disable_on_activity' not in mouse_options:
+            mouse_options.append('disable_on_activity')
+
+        Config.set('input', 'mouse', ', '.join(mouse_options))
+
+
+def settle_garbage(freeze):
+    # (on large boards, with that many widgets, a full garbage collection
+    # in the middle of a game would take several frames -- so one is
+    # made at its start, when a short pause is not noticed, and then, if
+    # possible (Python >= 3.7), all the objects that are left are moved
+    # to the permanent generation, not to be examined by the collections
+    # during the game)
+    if hasattr(gc, 'unfreeze'):
+        gc.unfreeze()
+    if freeze:
+        gc.collect()
+        if hasattr(gc, 'freeze'):
+            gc.freeze()
+
+
+def run():
+    with startup_timer.phase('config'):
+        config_tweaks()
+    ArithmeBricksApp().run()